@@ -0,0 +1,17 @@
+"""ASGI entry point: `uvicorn asgi:application --workers 2`.
+
+asgiref and uvicorn are in requirements.txt; any other ASGI server can
+serve `application` too.
+
+The Flask app stays WSGI; asgiref runs each request on its thread pool,
+so the event loop keeps accepting connections while requests wait on
+Google Sheets. Within a request, Sheets calls still run one after the
+other, except where `utils.fanout.gather` overlaps independent reads
+(startup, and the catalog and buyer's profile loads at checkout), the
+same as under gunicorn.
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from main import app
+
+application = WsgiToAsgi(app)
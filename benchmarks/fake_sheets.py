@@ -0,0 +1,245 @@
+"""In-process stand-in for the gspread client used by the benchmarks.
+
+Implements the subset of the gspread API that `utils/sheets.py` calls,
+keeps every sheet in memory, and simulates the parts of Google Sheets
+that matter for performance: a fixed latency per API call and the
+per-minute request quota (exceeding it raises a 429 `APIError`, just
+like the real service). Every call is counted so a benchmark can report
+Sheets API calls per request.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from gspread.exceptions import APIError, SpreadsheetNotFound
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from utils.storage import BOOK_FIELDS, ORDER_FIELDS, USER_FIELDS
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _QuotaResponse:
+    """Just enough of a `requests.Response` for `APIError` to parse"""
+
+    status_code = 429
+    text = 'Quota exceeded for quota metric "Read requests"'
+
+    def json(self):
+        return {'error': {'code': 429, 'message': self.text, 'status': 'RESOURCE_EXHAUSTED'}}
+
+
+class FakeSheetsService:
+    """Shared call counter, latency and quota for every fake sheet"""
+
+    def __init__(self, latency_ms=0, quota_per_minute=None):
+        self.latency = latency_ms / 1000.0
+        self.quota_per_minute = quota_per_minute
+        self.calls = {}
+        self.throttled = 0
+        self.window = []
+        self.lock = threading.Lock()
+
+    def call(self, method):
+        with self.lock:
+            now = time.monotonic()
+            if self.quota_per_minute:
+                self.window = [t for t in self.window if now - t < 60]
+                if len(self.window) >= self.quota_per_minute:
+                    self.throttled += 1
+                    raise APIError(_QuotaResponse())
+                self.window.append(now)
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.calls)
+
+
+class FakeWorksheet:
+    def __init__(self, service, rows):
+        self.service = service
+        self.rows = [[str(v) for v in row] for row in rows]
+        self.updated_at = _now()
+        self.lock = threading.Lock()
+
+    def _cell(self, row, col):
+        if row <= len(self.rows) and col <= len(self.rows[row - 1]):
+            return self.rows[row - 1][col - 1]
+        return ''
+
+    def _set(self, row, col, value):
+        self.updated_at = _now()
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append('')
+        cells[col - 1] = str(value)
+
+    def _updated_range(self, first, last):
+        width = max(len(self.rows[0]), 1) if self.rows else 1
+        return f"Sheet1!A{first}:{rowcol_to_a1(last, width)}"
+
+    def get_all_values(self, **kwargs):
+        self.service.call('get_all_values')
+        with self.lock:
+            return [list(row) for row in self.rows]
+
+    def get_all_records(self, **kwargs):
+        self.service.call('get_all_records')
+        with self.lock:
+            if not self.rows:
+                return []
+            header = self.rows[0]
+            records = []
+            for row in self.rows[1:]:
+                record = {}
+                for i, name in enumerate(header):
+                    value = row[i] if i < len(row) else ''
+                    # gspread converts numeric-looking cells by default
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        try:
+                            value = float(value)
+                        except ValueError:
+                            pass
+                    record[name] = value
+                records.append(record)
+            return records
+
+    def get(self, range_name, **kwargs):
+        self.service.call('get')
+        with self.lock:
+            return self._read_range(range_name)
+
+    def _read_range(self, range_name):
+        start, _, end = range_name.partition(':')
+        r1, c1 = a1_to_rowcol(start)
+        if not end:
+            r2, c2 = r1, c1
+        elif end[-1].isdigit():
+            r2, c2 = a1_to_rowcol(end)
+        else:
+            # Open-ended range like 'A5:L' runs to the last row
+            r2, c2 = len(self.rows), a1_to_rowcol(end + '1')[1]
+        values = [[self._cell(r, c) for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+        # Like the API, drop trailing empty cells and rows
+        values = [self._trim(row) for row in values]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _trim(self, row):
+        while row and row[-1] == '':
+            row = row[:-1]
+        return row
+
+    def batch_get(self, ranges, **kwargs):
+        self.service.call('batch_get')
+        with self.lock:
+            return [self._read_range(r) for r in ranges]
+
+    def update_cell(self, row, col, value):
+        self.service.call('update_cell')
+        with self.lock:
+            self._set(row, col, value)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self.service.call('update')
+        with self.lock:
+            self._write_range(range_name or 'A1', values or [])
+
+    def _write_range(self, range_name, values):
+        r1, c1 = a1_to_rowcol(range_name.split(':')[0])
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(r1 + i, c1 + j, value)
+
+    def batch_update(self, data, **kwargs):
+        self.service.call('batch_update')
+        with self.lock:
+            for entry in data:
+                self._write_range(entry['range'], entry['values'])
+
+    def append_row(self, values, **kwargs):
+        self.service.call('append_row')
+        with self.lock:
+            self.rows.append([str(v) for v in values])
+            self.updated_at = _now()
+            n = len(self.rows)
+            return {'updates': {'updatedRange': self._updated_range(n, n)}}
+
+    def append_rows(self, values, **kwargs):
+        self.service.call('append_rows')
+        with self.lock:
+            first = len(self.rows) + 1
+            self.updated_at = _now()
+            self.rows.extend([str(v) for v in row] for row in values)
+            return {'updates': {'updatedRange': self._updated_range(first, len(self.rows))}}
+
+
+class FakeSpreadsheet:
+    def __init__(self, service, rows):
+        self.service = service
+        self.sheet1 = FakeWorksheet(service, rows)
+
+    def get_lastUpdateTime(self):
+        self.service.call('get_lastUpdateTime')
+        return self.sheet1.updated_at
+
+
+class FakeClient:
+    """Drop-in for `gspread.Client`: `open(name).sheet1`"""
+
+    def __init__(self, service, spreadsheets):
+        self.service = service
+        self.spreadsheets = spreadsheets
+
+    def open(self, name):
+        self.service.call('open')
+        if name not in self.spreadsheets:
+            raise SpreadsheetNotFound(name)
+        return self.spreadsheets[name]
+
+
+def seed_books(n, stock=1000000):
+    """Header plus `n` available books with plenty of stock"""
+    categories = ['Fiction', 'Science', 'History', 'Poetry', 'Children', 'Business']
+    conditions = ['New', 'Like New', 'Good', 'Fair']
+    words = ['river', 'night', 'garden', 'empire', 'silent', 'winter', 'code', 'ocean',
+             'shadow', 'light', 'mountain', 'machine', 'letters', 'journey', 'stone']
+    rows = [list(BOOK_FIELDS)]
+    for i in range(1, n + 1):
+        title = ' '.join(words[(i * k) % len(words)] for k in (1, 3, 7)).title()
+        rows.append([
+            str(i), f"{title} {i}", f"Author {i % 500}", f"₹{100 + i % 900}",
+            conditions[i % len(conditions)], f"978{i:010d}", f"A book about {title.lower()}",
+            categories[i % len(categories)], 'Available', str(stock),
+            f"2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}", ''
+        ])
+    return rows
+
+
+SHEET_NAMES = ('SWAPLY_Books', 'SWAPLY_Users', 'SWAPLY_Orders')
+
+
+def make_client(books=100, latency_ms=0, quota_per_minute=None):
+    """A fake client holding `books` books and empty users/orders sheets"""
+    service = FakeSheetsService(latency_ms, quota_per_minute)
+    books_name, users_name, orders_name = SHEET_NAMES
+    spreadsheets = {
+        books_name: FakeSpreadsheet(service, seed_books(books)),
+        users_name: FakeSpreadsheet(service, [list(USER_FIELDS)]),
+        orders_name: FakeSpreadsheet(service, [list(ORDER_FIELDS)]),
+    }
+    return FakeClient(service, spreadsheets)
@@ -0,0 +1,84 @@
+"""Measure the heap used by the parsed catalog.
+
+    python benchmarks/memory.py --books 50000
+
+Parses a seeded books sheet with `GoogleSheetsDB._parse_books` (compact
+`BookRecord`s) and compares it with the same books held as one dict per
+book, the layout the catalog used before. Rows go through a JSON round
+trip first so, as with the real API response, no strings are shared
+between rows to begin with.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_sheets import seed_books
+from utils.listings import parse_price
+from utils.sheets import GoogleSheetsDB
+
+
+def parse_as_dicts(all_values):
+    """The catalog's previous layout: one dict per book"""
+    headers = all_values[0]
+    books = []
+    for row in all_values[1:]:
+        book = {header: row[i] if i < len(row) else '' for i, header in enumerate(headers)}
+        books.append({
+            'id': str(book.get('id', '')).strip(),
+            'title': book.get('title', 'Unknown Book'),
+            'author': book.get('author', 'Unknown Author'),
+            'price': parse_price(book.get('price', '0')) or 0.0,
+            'condition': book.get('condition', 'Good'),
+            'isbn': book.get('isbn', ''),
+            'description': book.get('description', ''),
+            'category': book.get('category', ''),
+            'status': book.get('status', 'Available'),
+            'stock_quantity': int(book.get('stock_quantity', '1')),
+            'timestamp': book.get('timestamp', ''),
+            'image_url': book.get('image_url', '').strip()
+        })
+    return books
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Compare catalog memory layouts')
+    parser.add_argument('--books', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    db = GoogleSheetsDB()
+    print(f"{'books':>7} {'dicts MB':>10} {'records MB':>11} {'bytes/book':>21} {'saved':>7}")
+    for n in args.books:
+        payload = json.dumps(seed_books(n))
+
+        def as_dicts():
+            return parse_as_dicts(json.loads(payload))
+
+        def as_records():
+            return db._parse_books(json.loads(payload))
+
+        dicts, dict_size = measure(as_dicts)
+        del dicts
+        records, record_size = measure(as_records)
+        del records
+
+        print(f"{n:>7} {dict_size / 1e6:>10.1f} {record_size / 1e6:>11.1f} "
+              f"{dict_size // n:>10} -> {record_size // n:>7} {1 - record_size / dict_size:>7.0%}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,203 @@
+"""Benchmark the main routes against a fake Google Sheets backend.
+
+    python benchmarks/run.py --books 100 1000 10000 100000 \\
+        --requests 500 --concurrency 8 --latency-ms 80
+
+For each catalog size the fake client (see `fake_sheets.py`) is seeded
+and attached to `db`, then every route is driven in turn by
+`--concurrency` threads, each with its own logged-in Flask test client.
+Reports p50/p99 latency, throughput and Sheets API calls per request so
+storage and caching changes can be compared against a baseline
+(`--json` saves the numbers for that).
+
+The storage settings are read from the usual `SWAPLY_*` environment
+variables, e.g. `SWAPLY_WRITE_BEHIND=1 python benchmarks/run.py ...`.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app logs every Sheets connection step; keep the report readable
+os.environ.setdefault('SWAPLY_LOG_LEVEL', 'WARNING')
+# Start from empty carts and queues, and keep the files the app creates out of the tree
+_scratch = tempfile.mkdtemp(prefix='swaply-bench-')
+os.environ.setdefault('SWAPLY_STATE_DB', os.path.join(_scratch, 'swaply_state.db'))
+os.environ.setdefault('SWAPLY_QUEUE_PATH', os.path.join(_scratch, 'swaply_queue.db'))
+os.environ.setdefault('SWAPLY_LOCK_DIR', os.path.join(_scratch, 'locks'))
+os.environ.setdefault('SWAPLY_IMAGE_DIR', os.path.join(_scratch, 'images'))
+os.environ.setdefault('SWAPLY_STATIC_BUILD', os.path.join(_scratch, 'static'))
+
+import main
+from utils.sheets import db
+
+from benchmarks.fake_sheets import SHEET_NAMES, make_client
+
+ROUTES = ['/', '/books', '/api/get-book', '/api/add-to-cart', '/api/place-order-from-cart']
+
+ADDRESS = {
+    'full_name': 'Bench User',
+    'phone_number': '9999999999',
+    'address_line1': '1 Test Street',
+    'address_city': 'Pune',
+    'address_state': 'MH',
+    'address_zip': '411001',
+    'payment_method': 'cod'
+}
+
+
+def attach(books, latency_ms, quota):
+    """Seed a fake Sheets client with `books` books and point `db` at it"""
+    client = make_client(books, latency_ms, quota)
+    # Budget Sheets calls to the simulated quota (unlimited without one),
+    # which the fake shares between reads and writes
+    sheets = db.sync_target if db.name == 'sqlite' else db
+    if sheets is not None:
+        sheets.sheets_guard.set_rate(quota and quota // 2, quota and quota // 2)
+    if db.name == 'sqlite':
+        if db.sync_target is not None:
+            db.sync_target.attach_client(client)
+        sheet = client.spreadsheets[SHEET_NAMES[0]].sheet1
+        header = sheet.rows[0]
+        db.import_books([dict(zip(header, row), price=float(row[3].lstrip('₹')),
+                              stock_quantity=int(row[9])) for row in sheet.rows[1:]],
+                        overwrite_stock=True)
+    else:
+        db.attach_client(client)
+    return client
+
+
+def make_clients(n):
+    clients = []
+    for i in range(n):
+        client = main.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = f"bench-user-{i}"
+            session['user_email'] = f"bench{i}@example.com"
+            session['user_name'] = f"Bench {i}"
+        clients.append((client, f"bench-user-{i}"))
+    return clients
+
+
+def make_request(route, client, user_id, book_ids, rng):
+    """Issue one request for `route`; returns the response status code"""
+    if route == '/api/get-book':
+        return client.get(f"/api/get-book/{rng.choice(book_ids)}").status_code
+    if route == '/api/add-to-cart':
+        return client.post(route, json={'book_id': rng.choice(book_ids)}).status_code
+    if route == '/api/place-order-from-cart':
+        # Filling the cart goes straight to the cart store so only the checkout is timed
+        for book_id in rng.sample(book_ids, min(3, len(book_ids))):
+            main.carts.add(user_id, book_id)
+        return client.post(route, json=ADDRESS).status_code
+    return client.get(route).status_code
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[int(round(p / 100.0 * (len(ordered) - 1)))]
+
+
+def run_route(route, clients, book_ids, requests, sheets, seed):
+    latencies = []
+    errors = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def worker(index):
+        client, user_id = clients[index]
+        rng = random.Random(seed + index)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                status = make_request(route, client, user_id, book_ids, rng)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors[0] += 1
+
+    calls_before = sheets.total_calls()
+    throttled_before = sheets.throttled
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        'route': route,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'sheets_calls_per_request': round((sheets.total_calls() - calls_before) / max(len(latencies), 1), 3),
+        'throttled': sheets.throttled - throttled_before
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Benchmark routes against a fake Google Sheets backend')
+    parser.add_argument('--books', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='catalog sizes to benchmark')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients')
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated latency per Sheets call')
+    parser.add_argument('--quota', type=int, default=None,
+                        help='Sheets calls allowed per minute before 429s (default: unlimited)')
+    parser.add_argument('--routes', nargs='+', default=ROUTES, choices=ROUTES)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log output")
+    args = parser.parse_args()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    results = []
+    print(f"storage={db.name}  requests/route={args.requests}  concurrency={args.concurrency}  "
+          f"latency={args.latency_ms}ms  quota={args.quota or 'unlimited'}/min")
+    print(f"{'books':>7} {'route':<28} {'reqs':>5} {'errs':>5} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>8} {'calls/req':>10} {'429s':>5}")
+
+    for books in args.books:
+        client = attach(books, args.latency_ms, args.quota)
+        clients = make_clients(args.concurrency)
+        book_ids = [str(i) for i in range(1, books + 1)]
+
+        for route in args.routes:
+            result = run_route(route, clients, book_ids, args.requests, client.service, args.seed)
+            result['books'] = books
+            results.append(result)
+            print(f"{books:>7} {route:<28} {result['requests']:>5} {result['errors']:>5} "
+                  f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['throughput_rps']:>8.1f} "
+                  f"{result['sheets_calls_per_request']:>10.3f} {result['throttled']:>5}")
+
+        for _, user_id in clients:
+            main.carts.clear(user_id)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'config': vars(args), 'storage': db.name, 'results': results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main_cli()
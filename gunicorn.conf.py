@@ -0,0 +1,13 @@
+"""gunicorn settings; `gunicorn main:app` picks this file up automatically."""
+import os
+
+bind = os.getenv('SWAPLY_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('SWAPLY_THREADS', '4'))
+
+# One worker refreshes the catalog from Google Sheets and the others read
+# its snapshot, instead of every worker polling Sheets on its own
+os.environ.setdefault('SWAPLY_SHARED_CATALOG', 'swaply_catalog.snapshot')
+
+# Restart with the catalog, users and orders parsed last time
+os.environ.setdefault('SWAPLY_SNAPSHOT', 'swaply_state.snapshot')
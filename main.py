@@ -1,39 +1,193 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, send_file, abort
+from flask.json.provider import DefaultJSONProvider
 import os
+import logging
 from datetime import datetime
 import secrets
+import hmac
+import io
+
+# Configure logging before the storage layer starts logging its connection
+logging.basicConfig(level=os.getenv('SWAPLY_LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
 from utils.sheets import db
+from utils.storage import is_transient_failure
+from utils.catalog import BookRecord
+from utils.metrics import metrics
+from utils.search import BookSearchIndex
+from utils.feed import LatestBooksFeed
+from utils.response_cache import ResponseCache
+from utils.listings import validate_listing, iter_listings
+from utils.carts import create_cart_store
+from utils.ids import new_id
+from utils.fanout import gather
+from utils.idempotency import create_idempotency_store
+from utils.images import ImageStore
+from utils.static_assets import ResponseCompressor, StaticAssets
+from functools import partial, wraps
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes catalog records as plain objects"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, BookRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = CatalogJSONProvider(app)
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', 'your-google-client-id')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET', 'your-google-client-secret')
 
+BOOKS_PAGE_SIZE = 24
+BOOKS_MAX_PAGE_SIZE = 100
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+
+# Bulk imports are written to storage this many listings at a time
+IMPORT_CHUNK_SIZE = int(os.getenv('SWAPLY_IMPORT_CHUNK', '500'))
+IMPORT_MAX_ERRORS = 100
+IMPORT_TOKEN = os.getenv('SWAPLY_IMPORT_TOKEN')
+
+book_search = BookSearchIndex(db)
+latest_feed = LatestBooksFeed(db)
+response_cache = ResponseCache(db, int(os.getenv('SWAPLY_RESPONSE_CACHE_SIZE', '512')))
+# Per-user state every worker process must see (carts, idempotency keys); '' keeps it in memory,
+# which is only right for a single-process server
+STATE_DB = os.getenv('SWAPLY_STATE_DB', 'swaply_state.db')
+carts = create_cart_store(db, STATE_DB)
+# Responses to checkouts retried with the same Idempotency-Key header
+idempotency = create_idempotency_store(
+    db, STATE_DB, max_entries=int(os.getenv('SWAPLY_IDEMPOTENCY_SIZE', '10000')),
+    ttl=int(os.getenv('SWAPLY_IDEMPOTENCY_TTL', '86400')))
+
+# Uploaded book images and their resized variants
+images = ImageStore(os.getenv('SWAPLY_IMAGE_DIR', 'uploads/images'),
+                    max_bytes=int(os.getenv('SWAPLY_IMAGE_MAX_BYTES', str(8 * 1024 * 1024))),
+                    workers=int(os.getenv('SWAPLY_IMAGE_WORKERS', '2')))
+app.jinja_env.globals.update(image_srcset=images.srcset, image_widths=images.variant_widths())
+
+# Uploads and their variants never change under a URL
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Fingerprinted, precompressed static files; compressed HTML and JSON responses
+static_assets = StaticAssets(app, os.getenv('SWAPLY_STATIC_BUILD', 'build/static'))
+compressor = ResponseCompressor(app, min_size=int(os.getenv('SWAPLY_COMPRESS_MIN_SIZE', '1024')))
+
+logger = logging.getLogger(__name__)
+
+# Connect to storage in the background; /readyz reports when it is warm
+db.start()
+
 def generate_user_id():
-    return f"user_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    return new_id('user_')
+
+# Seconds a client should wait before retrying a write refused with 503
+WRITE_RETRY_AFTER = 5
+
+def retry_later(error):
+    """503 for a write that failed for now but may succeed when retried"""
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(WRITE_RETRY_AFTER)
+    return response
+
+def requires_writable_storage(view):
+    """Refuse writes with 503 while storage can't keep them (see `accepts_writes`)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not db.accepts_writes():
+            return retry_later('The store is reconnecting. Please try again in a few seconds.')
+        return view(*args, **kwargs)
+    return wrapper
+
+def cart_items(user_id):
+    """The user's cart joined with current catalog details"""
+    items = []
+    for book_id, quantity in carts.get(user_id).items():
+        book = db.get_book_by_id(book_id)
+        if not book:
+            continue
+        items.append({
+            'book_id': book_id,
+            'title': book.get('title'),
+            'author': book.get('author'),
+            'price': float(book.get('price', 0)),
+            'condition': book.get('condition'),
+            'image_url': book.get('image_url', ''),
+            'quantity': quantity
+        })
+    return items
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed, sheets_calls = metrics.end_request(request.method, route, response.status_code)
+    logger.debug('%s %s %s %.1fms sheets_calls=%d', request.method, route,
+                 response.status_code, elapsed * 1000, sheets_calls)
+    return response
+
+def storage_gauges():
+    """Current storage state and cache counters as /metrics gauges"""
+    stats = db.get_cache_stats()
+    gauges = [('swaply_storage_info', 'Active storage backend and mode',
+               {'backend': db.name, 'mode': stats.get('storage', db.name)}, 1)]
+    for key in ('books', 'hits', 'misses', 'revalidations', 'hit_rate'):
+        if key in stats:
+            gauges.append((f'swaply_catalog_{key}', f"Book catalog {key.replace('_', ' ')}", {}, stats[key]))
+    for key, value in response_cache.stats().items():
+        gauges.append((f'swaply_response_cache_{key}', f"Response cache {key.replace('_', ' ')}", {}, value))
+    queue = stats.get('write_behind')
+    if queue:
+        gauges.append(('swaply_write_behind_depth', 'Sheets mutations waiting to be flushed', {}, queue['depth']))
+        gauges.append(('swaply_write_behind_lag_seconds', 'Age of the oldest queued mutation', {},
+                       queue['flush_lag_seconds']))
+        gauges.append(('swaply_write_behind_failures', 'Failed write-behind flushes', {}, queue['failures']))
+    gauges.append(('swaply_compressed_responses', 'Responses compressed on the fly', {},
+                   compressor.stats()['compressed']))
+    gauges.append(('swaply_image_variants_pending', 'Uploaded images waiting for their variants', {},
+                   images.stats()['pending']))
+    client = stats.get('sheets_client')
+    if client:
+        gauges.append(('swaply_sheets_circuit_open', 'Google Sheets calls are being refused', {},
+                       int(client['circuit'] != 'closed')))
+        gauges.append(('swaply_sheets_retries', 'Sheets calls retried after a transient error', {},
+                       client['retries']))
+        gauges.append(('swaply_sheets_rejected', 'Sheets calls refused by the breaker or quota budget', {},
+                       client['rejected']))
+    return gauges
 
 # Routes
 @app.route('/')
+@response_cache.cached
 def index():
     try:
-        available_books = db.get_available_books()
-        latest_books = available_books[-3:] if len(available_books) >= 3 else available_books
-        latest_books.reverse()
-        return render_template('index.html', latest_books=latest_books)
+        return render_template('index.html', latest_books=latest_feed.latest())
     except Exception as e:
-        print(f"❌ Error in index route: {e}")
+        logger.error('❌ Error in index route: %s', e)
+        response_cache.skip()
         return render_template('index.html', latest_books=[])
 
 @app.route('/books')
+@response_cache.cached
 def books():
     try:
-        available_books = db.get_available_books()
-        return render_template('search.html', books=available_books)
+        page = book_search.search(limit=BOOKS_PAGE_SIZE)
+        return render_template('search.html', books=page['books'],
+                               total_books=page['total'], next_cursor=page['next_cursor'])
     except Exception as e:
-        print(f"❌ Error in books route: {e}")
-        return render_template('search.html', books=[])
+        logger.error('❌ Error in books route: %s', e)
+        response_cache.skip()
+        return render_template('search.html', books=[], total_books=0, next_cursor=None)
 
 @app.route('/checkout')
 def checkout():
@@ -47,6 +201,10 @@ def cart_page():
         return redirect(url_for('login'))
     return render_template('cart.html')
 
+@app.route('/sell')
+def sell():
+    return render_template('sell.html')
+
 @app.route('/login')
 def login():
     return render_template('login.html', google_client_id=GOOGLE_CLIENT_ID)
@@ -96,6 +254,7 @@ def api_google_login():
                 session['user_email'] = email
                 session['user_name'] = name
                 session['user_picture'] = payload.get('picture', '')
+                session.pop('cart', None)  # carts live server-side now
                 
                 return jsonify({
                     'success': True, 
@@ -111,11 +270,11 @@ def api_google_login():
                 return jsonify({'success': False, 'error': 'Invalid token format'})
                 
         except Exception as e:
-            print(f"❌ JWT decode error: {e}")
+            logger.error('❌ JWT decode error: %s', e)
             return jsonify({'success': False, 'error': 'Invalid authentication token'})
         
     except Exception as e:
-        print(f"❌ Google login error: {e}")
+        logger.error('❌ Google login error: %s', e)
         return jsonify({'success': False, 'error': 'Authentication failed'})
 
 @app.route('/api/user')
@@ -150,41 +309,20 @@ def add_to_cart():
         if not book_id:
             return jsonify({'success': False, 'error': 'Book ID required'}), 400
         
-        if 'cart' not in session:
-            session['cart'] = []
-        
-        cart = session['cart']
-        existing_item = next((item for item in cart if item['book_id'] == book_id), None)
-        
-        if existing_item:
-            existing_item['quantity'] += 1
-        else:
-            book = db.get_book_by_id(book_id)
-            if not book:
-                return jsonify({'success': False, 'error': 'Book not found'}), 404
-            
-            cart_item = {
-                'book_id': book_id,
-                'title': book.get('title'),
-                'author': book.get('author'),
-                'price': float(book.get('price', 0)),
-                'condition': book.get('condition'),
-                'image_url': book.get('image_url', ''),
-                'quantity': 1
-            }
-            cart.append(cart_item)
+        book_id = str(book_id)
+        if not db.get_book_by_id(book_id):
+            return jsonify({'success': False, 'error': 'Book not found'}), 404
         
-        session['cart'] = cart
-        session.modified = True
+        cart_count = carts.add(session['user_id'], book_id)
         
         return jsonify({
             'success': True, 
             'message': 'Book added to cart!',
-            'cart_count': len(cart)
+            'cart_count': cart_count
         })
         
     except Exception as e:
-        print(f"❌ Error adding to cart: {e}")
+        logger.error('❌ Error adding to cart: %s', e)
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
 @app.route('/api/get-cart')
@@ -193,11 +331,11 @@ def get_cart():
         return jsonify({'error': 'Please login first'}), 401
     
     try:
-        cart = session.get('cart', [])
-        total = sum(item['price'] * item['quantity'] for item in cart)
-        return jsonify({'items': cart, 'total': total, 'count': len(cart)})
+        items = cart_items(session['user_id'])
+        total = sum(item['price'] * item['quantity'] for item in items)
+        return jsonify({'items': items, 'total': total, 'count': len(items)})
     except Exception as e:
-        print(f"❌ Error getting cart: {e}")
+        logger.error('❌ Error getting cart: %s', e)
         return jsonify({'items': [], 'total': 0, 'count': 0})
 
 @app.route('/api/update-cart-item', methods=['POST'])
@@ -213,25 +351,16 @@ def update_cart_item():
         if not book_id or quantity is None:
             return jsonify({'success': False, 'error': 'Book ID and quantity required'}), 400
         
-        cart = session.get('cart', [])
-        item = next((item for item in cart if item['book_id'] == book_id), None)
-        
-        if item:
-            if quantity <= 0:
-                cart.remove(item)
-            else:
-                item['quantity'] = quantity
+        if carts.set_quantity(session['user_id'], str(book_id), quantity):
+            items = cart_items(session['user_id'])
+            total = sum(item['price'] * item['quantity'] for item in items)
             
-            session['cart'] = cart
-            session.modified = True
-            total = sum(item['price'] * item['quantity'] for item in cart)
-            
-            return jsonify({'success': True, 'cart_count': len(cart), 'total': total})
+            return jsonify({'success': True, 'cart_count': len(items), 'total': total})
         else:
             return jsonify({'success': False, 'error': 'Item not found in cart'}), 404
             
     except Exception as e:
-        print(f"❌ Error updating cart: {e}")
+        logger.error('❌ Error updating cart: %s', e)
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
 @app.route('/api/remove-from-cart', methods=['POST'])
@@ -246,15 +375,13 @@ def remove_from_cart():
         if not book_id:
             return jsonify({'success': False, 'error': 'Book ID required'}), 400
         
-        cart = session.get('cart', [])
-        cart = [item for item in cart if item['book_id'] != book_id]
-        session['cart'] = cart
-        session.modified = True
+        carts.remove(session['user_id'], str(book_id))
         
-        return jsonify({'success': True, 'message': 'Item removed from cart', 'cart_count': len(cart)})
+        return jsonify({'success': True, 'message': 'Item removed from cart',
+                        'cart_count': len(carts.get(session['user_id']))})
             
     except Exception as e:
-        print(f"❌ Error removing from cart: {e}")
+        logger.error('❌ Error removing from cart: %s', e)
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
 @app.route('/api/clear-cart', methods=['POST'])
@@ -263,8 +390,7 @@ def clear_cart():
         return jsonify({'success': False, 'error': 'Please login first'}), 401
     
     try:
-        session['cart'] = []
-        session.modified = True
+        carts.clear(session['user_id'])
         
         return jsonify({
             'success': True, 
@@ -272,11 +398,13 @@ def clear_cart():
         })
         
     except Exception as e:
-        print(f"❌ Error clearing cart: {e}")
+        logger.error('❌ Error clearing cart: %s', e)
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
 # Order APIs
 @app.route('/api/place-order', methods=['POST'])
+@idempotency.idempotent
+@requires_writable_storage
 def place_order():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Please login first'}), 401
@@ -296,7 +424,9 @@ def place_order():
         if not all([book_id, full_name, phone_number, address_line1, address_city, address_state, address_zip, payment_method]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        book = db.get_book_by_id(book_id)
+        # The buyer's profile is loaded for saving the address after the order
+        book, _ = gather(partial(db.get_book_by_id, book_id),
+                         partial(db.get_user_info, session['user_email']))
         if not book:
             return jsonify({'success': False, 'error': 'Book not found'}), 404
         
@@ -306,7 +436,7 @@ def place_order():
         if book.get('stock_quantity', 0) <= 0:
             return jsonify({'success': False, 'error': 'Book is out of stock'}), 400
         
-        order_id = f"ORD_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        order_id = new_id('ORD_')
         
         order_data = {
             'order_id': order_id,
@@ -328,13 +458,6 @@ def place_order():
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        success = db.add_order(order_data)
-        
-        if not success:
-            return jsonify({'success': False, 'error': 'Failed to save order'}), 500
-        
-        db.decrease_book_stock(book_id, quantity=1)
-        
         user_data = {
             'user_id': session['user_id'],
             'email': session['user_email'],
@@ -348,10 +471,19 @@ def place_order():
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
-        db.save_user_info(user_data)
         
-        session['cart'] = []
-        session.modified = True
+        placed, failed = db.place_orders([order_data])
+        
+        if not placed:
+            reason = failed[0][1] if failed else 'could not be saved'
+            if is_transient_failure(reason):
+                # A 5xx isn't kept by the idempotency store, so a retry runs again
+                return retry_later('Your order could not be placed right now. Please try again.')
+            return jsonify({'success': False, 'error': 'Book is no longer available'}), 409
+        
+        # Only an address that was ordered to is kept
+        db.save_user_info(user_data)
+        carts.clear(session['user_id'])
         
         return jsonify({
             'success': True, 
@@ -360,10 +492,12 @@ def place_order():
         })
         
     except Exception as e:
-        print(f"❌ Error placing order: {e}")
+        logger.error('❌ Error placing order: %s', e)
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
 @app.route('/api/place-order-from-cart', methods=['POST'])
+@idempotency.idempotent
+@requires_writable_storage
 def place_order_from_cart():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Please login first'}), 401
@@ -376,23 +510,27 @@ def place_order_from_cart():
         if missing:
             return jsonify({'success': False, 'error': f'Missing: {", ".join(missing)}'}), 400
         
-        cart = session.get('cart', [])
+        cart = carts.get(session['user_id'])
         
         if not cart:
             return jsonify({'success': False, 'error': 'Cart is empty'}), 400
         
         orders_placed = []
+        pending_orders = []
         failed_books = []
+        # One id per checkout; each book's order row adds its book id
+        checkout_id = new_id('ORD_')
+        # The catalog and the buyer's profile are separate sheets: load them together
+        books, _ = gather(lambda: {book_id: db.get_book_by_id(book_id) for book_id in cart if book_id},
+                          partial(db.get_user_info, session['user_email']))
         
-        for cart_item in cart:
-            book_id = cart_item.get('book_id')
-            quantity = cart_item.get('quantity', 1)
+        for book_id, quantity in cart.items():
             
             if not book_id:
                 failed_books.append("Invalid book ID")
                 continue
             
-            book = db.get_book_by_id(book_id)
+            book = books[book_id]
             if not book:
                 failed_books.append(f"Book {book_id} not found")
                 continue
@@ -405,7 +543,7 @@ def place_order_from_cart():
                 failed_books.append(f"{book.get('title')} - only {book.get('stock_quantity', 0)} in stock")
                 continue
             
-            order_id = f"ORD_{datetime.now().strftime('%Y%m%d%H%M%S')}_{book_id}"
+            order_id = f"{checkout_id}_{book_id}"
             total_price = float(book.get('price', 0)) * quantity
             
             order_data = {
@@ -427,16 +565,7 @@ def place_order_from_cart():
                 'status': 'Pending',
                 'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
-            
-            if db.add_order(order_data):
-                db.decrease_book_stock(book_id, quantity=quantity)
-                orders_placed.append({
-                    'order_id': order_id,
-                    'book_title': book.get('title'),
-                    'total': total_price
-                })
-            else:
-                failed_books.append(f"Failed to order {book.get('title')}")
+            pending_orders.append(order_data)
         
         user_data = {
             'user_id': session['user_id'],
@@ -451,11 +580,25 @@ def place_order_from_cart():
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
-        db.save_user_info(user_data)
+        
+        if pending_orders:
+            placed, failed = db.place_orders(pending_orders)
+            orders_placed = [{
+                'order_id': o['order_id'],
+                'book_title': o['book_title'],
+                'total': o['total_price']
+            } for o in placed]
+            failed_books.extend(f"{o['book_title']} - {reason}" for o, reason in failed)
+            if not placed and any(is_transient_failure(reason) for _, reason in failed):
+                return retry_later('Your order could not be placed right now. Please try again.')
         
         if orders_placed:
-            session['cart'] = []
-            session.modified = True
+            db.save_user_info(user_data)
+            # Books that failed only for now stay in the cart to be ordered again
+            retry = {o['book_id'] for o, reason in failed if is_transient_failure(reason)}
+            for book_id in cart:
+                if book_id not in retry:
+                    carts.remove(session['user_id'], book_id)
         
         if failed_books:
             return jsonify({
@@ -472,7 +615,7 @@ def place_order_from_cart():
             })
         
     except Exception as e:
-        print(f"❌ Error placing cart order: {e}")
+        logger.error('❌ Error placing cart order: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/get-orders')
@@ -481,10 +624,18 @@ def get_orders():
         return jsonify({'error': 'Please login first'}), 401
     
     try:
-        user_orders = db.get_user_orders(session['user_email'])
-        return jsonify(user_orders)
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            return jsonify(db.get_user_orders(session['user_email']))
+        
+        limit = request.args.get('limit', ORDERS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, ORDERS_MAX_PAGE_SIZE))
+        orders, next_cursor = db.get_user_orders_page(
+            session['user_email'], limit=limit, cursor=request.args.get('cursor'))
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Error getting orders: {e}")
+        logger.error('❌ Error getting orders: %s', e)
         return jsonify([])
 
 @app.route('/api/get-user-address')
@@ -496,10 +647,36 @@ def get_user_address():
         user_info = db.get_user_info(session['user_email'])
         return jsonify(user_info or {})
     except Exception as e:
-        print(f"❌ Error getting user address: {e}")
+        logger.error('❌ Error getting user address: %s', e)
         return jsonify({})
 
+@app.route('/api/books')
+def api_books():
+    try:
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        limit = request.args.get('limit', BOOKS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, BOOKS_MAX_PAGE_SIZE))
+        
+        page = book_search.search(
+            query=request.args.get('q', ''),
+            category=request.args.get('category'),
+            condition=request.args.get('condition'),
+            min_price=min_price,
+            max_price=max_price,
+            sort=request.args.get('sort', 'recent'),
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error('❌ Error searching books: %s', e)
+        return jsonify({'error': 'Server error'}), 500
+
 @app.route('/api/get-book/<book_id>')
+@response_cache.cached_book
 def get_book(book_id):
     try:
         book = db.get_book_by_id(book_id)
@@ -510,9 +687,143 @@ def get_book(book_id):
             return jsonify({'error': 'Book not found'}), 404
             
     except Exception as e:
-        print(f"❌ Error getting book: {e}")
+        logger.error('❌ Error getting book: %s', e)
         return jsonify({'error': 'Server error'}), 500
 
+# Listing APIs
+@app.route('/api/add-book', methods=['POST'])
+@requires_writable_storage
+def add_book():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    
+    try:
+        book = validate_listing(request.json or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        if not db.add_book(book):
+            return jsonify({'success': False, 'error': 'Failed to list book'}), 500
+        
+        return jsonify({
+            'success': True,
+            'message': 'Book listed successfully!',
+            'book_id': book['id']
+        })
+        
+    except Exception as e:
+        logger.error('❌ Error adding book: %s', e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+@app.route('/api/import-books', methods=['POST'])
+@requires_writable_storage
+def import_books():
+    """Bulk listing import from a partner CSV or JSON Lines file.
+
+    The body (or a multipart `file` field) is parsed as it streams in and
+    written in chunks of IMPORT_CHUNK_SIZE; invalid rows are skipped and
+    reported by line number.
+    """
+    auth = request.headers.get('Authorization', '')
+    if not IMPORT_TOKEN or not hmac.compare_digest(auth, f"Bearer {IMPORT_TOKEN}"):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    fmt = request.args.get('format') or ('jsonl' if 'json' in request.mimetype else 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'error': f"Unsupported format '{fmt}'"}), 400
+    
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'success': False, 'error': 'File required'}), 400
+        source = upload.stream
+    else:
+        source = io.BufferedReader(request.stream)
+    
+    imported = 0
+    failed = 0
+    errors = []
+    chunk = []
+    try:
+        for line, book, error in iter_listings(source, fmt):
+            if error:
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({'line': line, 'error': error})
+                continue
+            
+            chunk.append(book)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                if not db.add_books(chunk):
+                    raise RuntimeError(f"storage rejected a chunk after {imported} books")
+                imported += len(chunk)
+                chunk = []
+        
+        if chunk:
+            if not db.add_books(chunk):
+                raise RuntimeError(f"storage rejected a chunk after {imported} books")
+            imported += len(chunk)
+            
+    except Exception as e:
+        logger.error('❌ Error importing books: %s', e)
+        return jsonify({'success': False, 'error': 'Import failed', 'imported': imported,
+                        'failed': failed, 'errors': errors}), 500
+    
+    return jsonify({'success': True, 'imported': imported, 'failed': failed, 'errors': errors})
+
+@app.route('/api/upload-image', methods=['POST'])
+def upload_image():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    
+    upload = request.files.get('image')
+    if upload is None:
+        return jsonify({'success': False, 'error': 'No image uploaded'}), 400
+    
+    try:
+        image_url = images.save(upload.stream)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error('❌ Error saving image: %s', e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    
+    return jsonify({'success': True, 'image_url': image_url})
+
+@app.route('/images/<digest>')
+@app.route('/images/<digest>/<variant>')
+def serve_image(digest, variant=None):
+    found = images.variant(digest, variant) if variant else None
+    immutable = found is not None or variant is None
+    if found is None:
+        # Variant not generated yet (or no Pillow): stand in with the original
+        found = images.original(digest)
+    if found is None:
+        abort(404)
+    
+    path, mimetype = found
+    response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE if immutable else 0)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    status = db.readiness()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(storage_gauges()), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     print("\n" + "="*50)
     print("🚀 SWAPLY SERVER STARTING")
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep files the app creates on import out of the working tree
+_scratch = tempfile.mkdtemp(prefix='swaply-tests-')
+os.environ.setdefault('SWAPLY_STATE_DB', os.path.join(_scratch, 'swaply_state.db'))
+os.environ.setdefault('SWAPLY_IMAGE_DIR', os.path.join(_scratch, 'images'))
+os.environ.setdefault('SWAPLY_STATIC_BUILD', os.path.join(_scratch, 'static'))
+os.environ.setdefault('SWAPLY_LOCK_DIR', os.path.join(_scratch, 'locks'))
+
+from benchmarks.fake_sheets import make_client
+from utils.sheets import GoogleSheetsDB
+from utils.storage import ORDER_FIELDS
+
+
+@pytest.fixture
+def sheets_db(monkeypatch):
+    """Factory for a GoogleSheetsDB attached to an in-memory fake Sheets client"""
+    def make(books=50, catalog_ttl=60, attach=True, **env):
+        monkeypatch.setenv('SWAPLY_CATALOG_TTL', str(catalog_ttl))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        db = GoogleSheetsDB()
+        # No quota budget: the fake client has none either
+        db.sheets_guard.set_rate(None, None)
+        client = make_client(books)
+        if attach:
+            assert db.attach_client(client)
+        return db, client
+    return make
+
+
+def another_worker(client):
+    """A second GoogleSheetsDB on the same spreadsheets, as another gunicorn worker"""
+    db = GoogleSheetsDB()
+    db.sheets_guard.set_rate(None, None)
+    assert db.attach_client(client)
+    return db
+
+
+def make_order(order_id, book_id, email='reader@example.com', quantity=1):
+    order = dict.fromkeys(ORDER_FIELDS, '')
+    order.update(order_id=order_id, user_id='user-1', user_email=email, book_id=str(book_id),
+                 book_title=f'Book {book_id}', quantity=quantity, total_price=100.0,
+                 status='Pending', created_at='2026-01-01 10:00:00')
+    return order
+
+
+ADDRESS = {
+    'full_name': 'Test Reader',
+    'phone_number': '9999999999',
+    'address_line1': '1 Test Street',
+    'address_city': 'Pune',
+    'address_state': 'MH',
+    'address_zip': '411001',
+    'payment_method': 'cod'
+}
+
+
+@pytest.fixture
+def app_client(sheets_db, monkeypatch):
+    import main
+
+    db, sheets = sheets_db(books=10)
+    monkeypatch.setattr(main, 'db', db)
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'user-1'
+        session['user_email'] = 'reader@example.com'
+    return client, db, sheets.spreadsheets['SWAPLY_Orders'].sheet1
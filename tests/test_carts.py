@@ -0,0 +1,22 @@
+from utils.carts import MemoryCartStore, SQLiteCartStore, create_cart_store
+
+
+def test_sheets_deployments_share_carts_between_workers(sheets_db, tmp_path):
+    db, _ = sheets_db(books=5, attach=False)
+    path = str(tmp_path / 'state.db')
+    # Two gunicorn workers, each with its own store on the same file
+    first, second = create_cart_store(db, path), create_cart_store(db, path)
+
+    first.add('user-1', '3')
+    second.add('user-1', '3')
+    second.add('user-1', '4', quantity=2)
+
+    assert isinstance(first, SQLiteCartStore)
+    assert first.get('user-1') == {'3': 2, '4': 2}
+    first.clear('user-1')
+    assert second.get('user-1') == {}
+
+
+def test_memory_carts_only_without_a_state_file(sheets_db):
+    db, _ = sheets_db(books=5, attach=False)
+    assert isinstance(create_cart_store(db, ''), MemoryCartStore)
@@ -0,0 +1,66 @@
+import threading
+
+from utils.feed import LatestBooksFeed
+from utils.search import BookSearchIndex
+
+
+def run_concurrently(*loops, seconds=1.5):
+    """Run each loop in its own thread; True if all of them finished"""
+    stop = threading.Event()
+    errors = []
+
+    def target(loop):
+        try:
+            while not stop.is_set():
+                loop()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(loop,), daemon=True) for loop in loops]
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+    assert not errors
+    return not any(thread.is_alive() for thread in threads)
+
+
+def test_listeners_run_after_the_catalog_lock_is_released(sheets_db):
+    db, _ = sheets_db(books=5)
+    held = []
+    db.add_book_listener(lambda event, books, version: held.append(db.catalog.lock._is_owned()))
+
+    db.catalog.update_book('1', stock_quantity=3)
+    db.catalog.invalidate()
+    db.get_all_books()
+
+    assert held == [False, False]
+
+
+def test_search_and_stock_updates_do_not_deadlock(sheets_db):
+    # TTL 0: every catalog_version() goes through the catalog lock
+    db, _ = sheets_db(books=50, catalog_ttl=0)
+    search = BookSearchIndex(db)
+    stock = iter(range(10 ** 9))
+
+    finished = run_concurrently(
+        lambda: search.search('river'),
+        lambda: db.catalog.update_book(str(next(stock) % 50 + 1), stock_quantity=next(stock) % 5),
+    )
+
+    assert finished, 'search and catalog updates deadlocked'
+
+
+def test_feed_and_stock_updates_do_not_deadlock(sheets_db):
+    db, _ = sheets_db(books=50, catalog_ttl=0)
+    feed = LatestBooksFeed(db)
+    stock = iter(range(10 ** 9))
+
+    finished = run_concurrently(
+        feed.latest,
+        lambda: db.catalog.update_book(str(next(stock) % 50 + 1), stock_quantity=next(stock) % 5),
+    )
+
+    assert finished, 'feed and catalog updates deadlocked'
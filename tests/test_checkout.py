@@ -0,0 +1,22 @@
+from conftest import ADDRESS
+
+
+def test_address_is_saved_with_a_placed_order(app_client):
+    client, db, _ = app_client
+
+    response = client.post('/api/place-order', json=dict(ADDRESS, book_id='2'))
+
+    assert response.status_code == 200
+    assert db.get_user_info('reader@example.com')['address_line1'] == '1 Test Street'
+
+
+def test_address_is_not_saved_when_the_order_fails(app_client):
+    client, db, _ = app_client
+    books_sheet = db.books_sheet
+    status_column = books_sheet.get_all_values()[0].index('status') + 1
+    books_sheet.update_cell(3, status_column, 'Sold Out')
+
+    response = client.post('/api/place-order', json=dict(ADDRESS, book_id='2'))
+
+    assert response.status_code == 409
+    assert not db.get_user_info('reader@example.com')
@@ -0,0 +1,83 @@
+from benchmarks.fake_sheets import make_client
+from utils.delta_sync import DeltaSync
+
+
+def synced(books=10, **options):
+    sheet = make_client(books).spreadsheets['SWAPLY_Books'].sheet1
+    sync = DeltaSync(**options)
+    sync.reset(sheet.get_all_values())
+    return sync, sheet
+
+
+def test_nothing_to_fetch_before_a_full_read():
+    sheet = make_client(3).spreadsheets['SWAPLY_Books'].sheet1
+    assert DeltaSync().fetch(sheet) is None
+
+
+def test_appended_and_edited_rows_are_fetched_in_one_call():
+    sync, sheet = synced(books=10)
+    sheet.append_row(['11', 'New book'] + [''] * (len(sheet.rows[0]) - 2))
+    sheet.update_cell(4, 2, 'Retitled')
+    calls = sheet.service.total_calls()
+
+    appended, changed = sync.fetch(sheet)
+
+    assert sheet.service.total_calls() == calls + 1
+    assert [(row, values[:2]) for row, values in appended] == [(12, ['11', 'New book'])]
+    assert [(row, values[1]) for row, values in changed] == [(4, 'Retitled')]
+    # Both are now known
+    assert sync.fetch(sheet) == ([], [])
+
+
+def test_edits_outside_the_sample_are_found_on_a_later_sync():
+    sync, sheet = synced(books=10, sample_size=4)
+    sheet.update_cell(9, 2, 'Retitled')
+
+    found = []
+    for _ in range(3):
+        _, changed = sync.fetch(sheet)
+        found += [row for row, _ in changed]
+    assert found == [9]
+
+
+def test_structural_changes_need_a_full_read():
+    sync, sheet = synced(books=10)
+    # Columns moved: every parsed row would change meaning
+    sheet.rows[0][1:3] = sheet.rows[0][2:0:-1]
+    assert sync.fetch(sheet) is None
+
+    sync, sheet = synced(books=10)
+    # A deleted row moves the ones below it up
+    del sheet.rows[3]
+    assert sync.fetch(sheet) is None
+
+
+def test_a_full_read_is_forced_every_few_syncs():
+    sync, sheet = synced(books=5, full_every=2)
+    assert sync.fetch(sheet) is not None
+    assert sync.fetch(sheet) is not None
+    assert sync.fetch(sheet) is None
+
+    sync.reset(sheet.get_all_values())
+    assert sync.fetch(sheet) == ([], [])
+
+
+def test_restored_state_resumes_delta_syncs():
+    sync, sheet = synced(books=5)
+    restored = DeltaSync()
+    restored.restore(sync.state())
+    sheet.update_cell(3, 2, 'Retitled')
+
+    _, changed = restored.fetch(sheet)
+    assert [row for row, _ in changed] == [3]
+
+
+def test_catalog_refresh_applies_sheet_edits_without_a_full_read(sheets_db):
+    db, client = sheets_db(books=20, catalog_ttl=0)
+    sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    db.get_all_books()
+    sheet.update_cell(6, sheet.rows[0].index('title') + 1, 'Retitled')
+    full_reads = client.service.snapshot().get('get_all_values', 0)
+
+    assert db.get_book_by_id(sheet.rows[5][0])['title'] == 'Retitled'
+    assert client.service.snapshot().get('get_all_values', 0) == full_reads
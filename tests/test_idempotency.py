@@ -0,0 +1,74 @@
+from conftest import ADDRESS
+from utils.idempotency import SQLiteIdempotencyStore, create_idempotency_store
+
+
+def test_retried_checkout_is_replayed_not_placed_twice(app_client):
+    client, db, orders_sheet = app_client
+    body = dict(ADDRESS, book_id='2')
+    headers = {'Idempotency-Key': 'attempt-1'}
+
+    first = client.post('/api/place-order', json=body, headers=headers)
+    retry = client.post('/api/place-order', json=body, headers=headers)
+
+    assert first.status_code == 200 and first.json['success']
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.data == first.data
+    assert len(orders_sheet.rows) == 2  # header + one order
+    assert db.get_book_by_id('2')['stock_quantity'] == 999999
+
+
+def test_key_reused_for_another_checkout_is_refused(app_client):
+    client, _, orders_sheet = app_client
+    headers = {'Idempotency-Key': 'attempt-2'}
+
+    client.post('/api/place-order', json=dict(ADDRESS, book_id='2'), headers=headers)
+    other = client.post('/api/place-order', json=dict(ADDRESS, book_id='3'), headers=headers)
+
+    assert other.status_code == 422
+    assert len(orders_sheet.rows) == 2
+
+
+def test_sheets_deployments_share_keys_between_workers(sheets_db, tmp_path):
+    db, _ = sheets_db(books=5, attach=False)
+    path = str(tmp_path / 'state.db')
+    first, second = create_idempotency_store(db, path), create_idempotency_store(db, path)
+    scope = ('user-1', '/api/place-order', 'attempt-3')
+
+    assert isinstance(first, SQLiteIdempotencyStore)
+    assert first.claim(scope) == ('new', None)
+    assert second.claim(scope) == ('busy', None)
+    first.complete(scope, {'fingerprint': 'f', 'status': 200,
+                           'content_type': 'application/json', 'body': b'{}'})
+    state, entry = second.claim(scope)
+    assert state == 'done' and entry['status'] == 200
+
+
+def test_transient_checkout_failure_is_503_and_can_be_retried(app_client, monkeypatch):
+    client, db, orders_sheet = app_client
+    body = dict(ADDRESS, book_id='2')
+    headers = {'Idempotency-Key': 'attempt-4'}
+    # The stock re-read fails once, as on a Sheets timeout
+    current_stock = db._current_stock
+    monkeypatch.setattr(db, '_current_stock', lambda wanted: None)
+
+    failed = client.post('/api/place-order', json=body, headers=headers)
+    monkeypatch.setattr(db, '_current_stock', current_stock)
+    retried = client.post('/api/place-order', json=body, headers=headers)
+
+    assert failed.status_code == 503 and failed.headers['Retry-After']
+    assert retried.status_code == 200 and 'Idempotent-Replayed' not in retried.headers
+    assert len(orders_sheet.rows) == 2
+
+
+def test_book_sold_elsewhere_is_a_final_409(app_client):
+    client, db, _ = app_client
+    books_sheet = db.books_sheet
+    # Sold out in the sheet while this worker's cache still lists it
+    status_column = books_sheet.get_all_values()[0].index('status') + 1
+    books_sheet.update_cell(5, status_column, 'Sold Out')
+
+    response = client.post('/api/place-order', json=dict(ADDRESS, book_id='4'))
+
+    assert response.status_code == 409
+    assert db.get_book_by_id('4')['status'] == 'Sold Out'
@@ -0,0 +1,123 @@
+import io
+import os
+import struct
+import time
+import zlib
+
+import pytest
+
+from utils import images as images_module
+from utils.images import ImageStore
+
+
+def png_bytes(width=4, height=2):
+    """A real RGB PNG, built without Pillow"""
+    def chunk(kind, body):
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+    rows = b''.join(b'\x00' + b'\x80\x40\x20' * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path), widths=(160, 320), max_bytes=64 * 1024)
+
+
+def wait_for_variants(store):
+    deadline = time.monotonic() + 10
+    while store.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not store.pending
+
+
+def test_save_stores_an_image_once_under_its_hash(store):
+    url = store.save(io.BytesIO(png_bytes()))
+
+    assert url.startswith('/images/')
+    assert store.save(io.BytesIO(png_bytes())) == url
+    path, mimetype = store.original(url.rsplit('/', 1)[1])
+    assert mimetype == 'image/png'
+    with open(path, 'rb') as f:
+        assert f.read() == png_bytes()
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'<svg xmlns="http://www.w3.org/2000/svg"></svg>',
+    # Magic bytes followed by anything else
+    b'\x89PNG\r\n\x1a\n' + b'<html><script>alert(1)</script></html>',
+    b'\xff\xd8\xff' + b'garbage' * 10,
+    png_bytes()[:40],
+    b'\x89PNG\r\n\x1a\n' + b'\x00' * (64 * 1024),
+])
+def test_save_refuses_what_is_not_a_whole_image(store, data):
+    with pytest.raises(ValueError):
+        store.save(io.BytesIO(data))
+    assert os.listdir(os.path.join(store.root, 'originals')) == []
+
+
+def test_variant_names_outside_the_configured_widths_are_not_served(store):
+    digest = store.save(io.BytesIO(png_bytes())).rsplit('/', 1)[1]
+
+    assert store.variant(digest, '640.webp') is None
+    assert store.variant(digest, '320.png') is None
+    assert store.variant('../../etc', '320.jpg') is None
+
+
+def test_variants_are_generated_in_the_background(store):
+    pytest.importorskip('PIL')
+    from PIL import Image
+
+    digest = store.save(io.BytesIO(png_bytes(width=480, height=240))).rsplit('/', 1)[1]
+    wait_for_variants(store)
+
+    path, mimetype = store.variant(digest, '320.webp')
+    assert mimetype == 'image/webp'
+    with Image.open(path) as image:
+        assert image.size == (320, 160)
+    path, mimetype = store.variant(digest, '160.jpg')
+    assert mimetype == 'image/jpeg'
+    with Image.open(path) as image:
+        assert (image.format, image.size) == ('JPEG', (160, 80))
+    assert store.stats()['generated'] == 1
+
+
+def test_srcset_lists_the_variants_of_local_images(store):
+    pytest.importorskip('PIL')
+    url = store.save(io.BytesIO(png_bytes()))
+
+    assert store.srcset(url, 'webp') == f'{url}/160.webp 160w, {url}/320.webp 320w'
+    assert store.srcset('https://example.com/cover.jpg', 'webp') == ''
+    assert store.srcset('', 'jpg') == ''
+
+
+def test_without_pillow_only_originals_are_served(store, monkeypatch):
+    monkeypatch.setattr(images_module, 'Image', None)
+    url = store.save(io.BytesIO(png_bytes()))
+
+    assert store.srcset(url, 'webp') == ''
+    assert store.variant(url.rsplit('/', 1)[1], '320.webp') is None
+    assert store.variant_widths() == []
+    with pytest.raises(ValueError):
+        store.save(io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'not really a png'))
+
+
+def test_uploaded_images_are_served_with_immutable_caching(app_client):
+    client, _, _ = app_client
+
+    response = client.post('/api/upload-image', data={'image': (io.BytesIO(png_bytes()), 'cover.png')})
+    assert response.status_code == 200
+    url = response.json['image_url']
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.cache_control.immutable
+    response.close()
+
+    response = client.post('/api/upload-image',
+                           data={'image': (io.BytesIO(b'\x89PNG\r\n\x1a\nfake'), 'cover.png')})
+    assert response.status_code == 400
@@ -0,0 +1,93 @@
+import io
+import threading
+
+import pytest
+
+from conftest import another_worker
+from utils.listings import iter_listings, normalize_isbn, validate_listing
+
+
+def new_listing(n):
+    return {'title': f'Listing {n}', 'author': 'Someone', 'price': 150.0, 'condition': 'Good',
+            'status': 'Available', 'stock_quantity': 1}
+
+
+def test_workers_listing_at_once_get_distinct_ids(sheets_db):
+    first, client = sheets_db(books=10)
+    second = another_worker(client)
+    listed = []
+
+    def list_books(db, worker):
+        for n in range(20):
+            book = new_listing(f'{worker}-{n}')
+            assert db.add_books([book])
+            listed.append(book['id'])
+
+    threads = [threading.Thread(target=list_books, args=(db, i)) for i, db in enumerate((first, second))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(listed)) == 40
+    sheet_ids = [row[0] for row in client.spreadsheets['SWAPLY_Books'].sheet1.rows[1:]]
+    assert len(sheet_ids) == len(set(sheet_ids)) == 50
+
+
+@pytest.mark.parametrize('value, isbn', [
+    ('978-0-306-40615-7', '9780306406157'),
+    ('0-306-40615-2', '9780306406157'),
+    ('080442957X', '9780804429573'),
+    ('080442957x', '9780804429573'),
+    (' ', ''),
+    (None, ''),
+])
+def test_isbns_are_normalized_to_isbn13(value, isbn):
+    assert normalize_isbn(value) == isbn
+
+
+@pytest.mark.parametrize('value', ['978-0-306-40615-8', '0-306-40615-3', '12345', '97803064061570', 'X123456789'])
+def test_bad_isbns_are_rejected(value):
+    with pytest.raises(ValueError):
+        normalize_isbn(value)
+
+
+def test_listing_time_is_set_by_the_server():
+    book = validate_listing(dict(new_listing(1), timestamp='2999-01-01T00:00:00'))
+
+    assert not book['timestamp'].startswith('2999')
+
+
+def test_csv_import_reports_bad_rows_and_keeps_going():
+    data = ('title,author,price,condition,isbn\n'
+            'Dune,Frank Herbert,"₹1,250",like new,0-306-40615-2\n'
+            ',Nobody,100,Good,\n'
+            'Emma,Jane Austen,abc,Good,\n'
+            'Ulysses,James Joyce,300,Fair,\n').encode('utf-8-sig')
+
+    rows = list(iter_listings(io.BytesIO(data), 'csv'))
+
+    assert [(line, error) for line, book, error in rows if error] == [
+        (3, 'Title is required'), (4, 'Price must be a positive number')]
+    books = [book for _, book, error in rows if book]
+    assert [(b['title'], b['price'], b['condition'], b['isbn']) for b in books] == [
+        ('Dune', 1250.0, 'Like New', '9780306406157'), ('Ulysses', 300.0, 'Fair', '')]
+
+
+def test_jsonl_import_skips_blank_lines_and_reports_bad_json():
+    data = (b'{"title": "Dune", "author": "Frank Herbert", "price": 250}\n'
+            b'\n'
+            b'{"title": "Emma", "author": \n'
+            b'["not", "an", "object"]\n')
+
+    rows = list(iter_listings(io.BytesIO(data), 'jsonl'))
+
+    assert [line for line, _, _ in rows] == [1, 3, 4]
+    assert rows[0][1]['title'] == 'Dune'
+    assert rows[1][1] is None and rows[1][2]
+    assert rows[2][2] == 'Listing must be an object'
+
+
+def test_unknown_import_format_is_refused():
+    with pytest.raises(ValueError):
+        list(iter_listings(io.BytesIO(b''), 'xlsx'))
@@ -0,0 +1,33 @@
+import json
+
+from benchmarks.fake_sheets import seed_books
+from utils.metrics import SIZE_SAMPLE, _payload_size
+
+
+class CountingRows(list):
+    """A sheet's rows that count how many of them are looked at"""
+
+    reads = 0
+
+    def __getitem__(self, index):
+        CountingRows.reads += 1
+        return list.__getitem__(self, index)
+
+    def __iter__(self):
+        CountingRows.reads += len(self)
+        return list.__iter__(self)
+
+
+def test_payload_size_is_close_to_the_json_size():
+    for rows in (seed_books(10), seed_books(5000)):
+        actual = len(json.dumps(rows))
+        assert abs(_payload_size(rows) - actual) / actual < 0.1
+
+
+def test_whole_sheet_reads_are_sized_from_a_sample():
+    rows = CountingRows(seed_books(20000))
+    CountingRows.reads = 0
+
+    _payload_size(rows)
+
+    assert CountingRows.reads == SIZE_SAMPLE
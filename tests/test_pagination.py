@@ -0,0 +1,113 @@
+import pytest
+
+from conftest import another_worker, make_order
+from utils.order_index import UserOrderIndex
+from utils.search import BookSearchIndex, encode_cursor
+
+
+def walk(fetch):
+    """Follow next cursors from the first page; the ids of every page"""
+    pages, cursor = [], None
+    while True:
+        items, cursor = fetch(cursor)
+        pages.append(items)
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize('sort', ['recent', 'price_asc', 'price_desc'])
+def test_book_cursors_visit_every_book_once_in_order(sheets_db, sort):
+    db, _ = sheets_db(books=95)
+    search = BookSearchIndex(db)
+
+    def fetch(cursor):
+        page = search.search(sort=sort, limit=20, cursor=cursor)
+        return [book['id'] for book in page['books']], page['next_cursor']
+
+    pages = walk(fetch)
+    ids = [book_id for page in pages for book_id in page]
+    everything = search.search(sort=sort, limit=1000)
+
+    assert [len(page) for page in pages] == [20, 20, 20, 20, 15]
+    assert ids == [book['id'] for book in everything['books']]
+    assert len(set(ids)) == 95 == everything['total']
+
+
+def test_book_cursor_survives_a_new_listing(sheets_db):
+    db, _ = sheets_db(books=30)
+    search = BookSearchIndex(db)
+    first = search.search(limit=10)
+
+    db.add_books([{'title': 'Brand new', 'author': 'Someone', 'price': 120.0,
+                   'condition': 'New', 'status': 'Available', 'stock_quantity': 1,
+                   'timestamp': '2999-01-01T00:00:00'}])
+    rest = search.search(limit=100, cursor=first['next_cursor'])
+
+    seen = [book['id'] for book in first['books'] + rest['books']]
+    assert len(seen) == len(set(seen)) == 30
+
+
+def test_bad_book_cursor_is_rejected(sheets_db):
+    db, _ = sheets_db(books=5)
+    with pytest.raises(ValueError):
+        BookSearchIndex(db).search(cursor='not-a-cursor!')
+
+
+def test_book_cursors_mean_the_same_in_every_worker(sheets_db):
+    db, client = sheets_db(books=30, attach=False)
+    sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    price = sheet.rows[0].index('price')
+    for row in sheet.rows[1:]:
+        # All tied, so only the tiebreaker orders them
+        row[price] = '200'
+    assert db.attach_client(client)
+    other = BookSearchIndex(another_worker(client))
+
+    first = BookSearchIndex(db).search(sort='price_asc', limit=10)
+    rest = other.search(sort='price_asc', limit=100, cursor=first['next_cursor'])
+
+    seen = [book['id'] for book in first['books'] + rest['books']]
+    assert seen == sorted(seen, key=str)
+    assert len(set(seen)) == 30
+
+
+def test_cursor_from_another_sort_is_a_bad_request(app_client):
+    client, _, _ = app_client
+    page = client.get('/api/books?sort=price_asc&limit=2').json
+
+    response = client.get(f"/api/books?sort=recent&cursor={page['next_cursor']}")
+    assert response.status_code == 400
+    for cursor in (encode_cursor([1, 2, 3]), encode_cursor(['x', 7]), encode_cursor([True, 'x'])):
+        assert client.get(f'/api/books?sort=price_asc&cursor={cursor}').status_code == 400
+
+
+def test_order_cursors_page_newest_first(sheets_db):
+    db, _ = sheets_db(books=30)
+    for n in range(1, 26):
+        order = make_order(f'ORD_{n:03d}', n)
+        order['created_at'] = f'2026-01-01 10:{n:02d}:00'
+        placed, _ = db.place_orders([order])
+        assert placed
+
+    pages = walk(lambda cursor: db.get_user_orders_page('reader@example.com', limit=10, cursor=cursor))
+    ids = [order['order_id'] for page in pages for order in page]
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert ids == [f'ORD_{n:03d}' for n in range(25, 0, -1)]
+
+
+def test_order_cursors_mean_the_same_in_every_worker():
+    # One checkout's orders share created_at; the workers saw them in different orders
+    orders = [make_order(f'ORD_{n % 4}_{n}', n) for n in range(12)]
+    first, second = UserOrderIndex(), UserOrderIndex()
+    first.load(orders)
+    second.load(reversed(orders))
+
+    page, cursor = first.get('reader@example.com', limit=5)
+    rest, _ = second.get('reader@example.com', cursor=cursor)
+
+    ids = [order['order_id'] for order in page + rest]
+    assert len(ids) == len(set(ids)) == 12
+    assert ids == sorted(ids, reverse=True)
+    with pytest.raises(ValueError):
+        first.get('reader@example.com', cursor=encode_cursor(['2026-01-01 10:00:00', 3]))
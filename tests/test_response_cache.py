@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.fixture
+def cached_client(app_client, monkeypatch):
+    """app_client with the response cache following its storage"""
+    import main
+
+    client, db, _ = app_client
+    monkeypatch.setattr(main.response_cache, 'db', db)
+    db.add_book_listener(main.response_cache._on_books_changed)
+    main.response_cache.clear()
+    return client, db
+
+
+def cache_stats():
+    import main
+    return main.response_cache.stats()
+
+
+def test_book_pages_outlive_changes_to_other_books(cached_client):
+    client, db = cached_client
+    client.get('/api/get-book/1')
+    client.get('/books')
+
+    db.update_book_status('2', 'Sold Out')
+    hits = cache_stats()['hits']
+    assert client.get('/api/get-book/1').status_code == 200
+    assert cache_stats()['hits'] == hits + 1
+
+    # Listings show every book, so they are rebuilt
+    client.get('/books')
+    assert cache_stats()['hits'] == hits + 1
+
+
+def test_book_pages_change_with_their_book(cached_client):
+    client, db = cached_client
+    before = client.get('/api/get-book/3')
+    assert before.json['status'] == 'Available'
+
+    db.update_book_status('3', 'Sold Out')
+    after = client.get('/api/get-book/3', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200
+    assert after.json['status'] == 'Sold Out'
+
+
+def test_unchanged_book_pages_revalidate(cached_client):
+    client, _ = cached_client
+    page = client.get('/api/get-book/4')
+
+    again = client.get('/api/get-book/4', headers={'If-None-Match': page.headers['ETag']})
+    assert again.status_code == 304
@@ -0,0 +1,144 @@
+import time
+
+import pytest
+from gspread.exceptions import APIError
+
+from utils.sheets_client import CircuitBreaker, SheetsGuard, SheetsUnavailable
+
+
+class ErrorResponse:
+    def __init__(self, code):
+        self.status_code = code
+        self.text = f'HTTP {code}'
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text}}
+
+
+class Flaky:
+    """Fails with the given errors, then returns 'ok'; counts its calls"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def guard(**options):
+    options.setdefault('breaker', CircuitBreaker(threshold=2, reset_timeout=0.05))
+    return SheetsGuard(reads_per_minute=None, writes_per_minute=None, base_delay=0, **options)
+
+
+def test_breaker_opens_after_threshold_failures_in_a_row():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'closed'
+
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.is_open()
+    assert not breaker.allow()
+    assert breaker.times_opened == 1
+
+
+def test_breaker_lets_one_probe_through_once_the_timeout_passes():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    # Only one probe at a time
+    assert breaker.is_open() and not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.times_opened == 1
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() and breaker.allow()
+
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.allow()
+
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_transient_read_errors_are_retried():
+    sheets = guard(retries=3)
+    call = Flaky(APIError(ErrorResponse(503)), APIError(ErrorResponse(429)))
+
+    assert sheets.call('get_all_values', call) == 'ok'
+    assert call.calls == 3
+    assert sheets.stats()['retries'] == 2 and sheets.breaker.state == 'closed'
+
+
+def test_appends_are_retried_only_on_429():
+    sheets = guard()
+    call = Flaky(APIError(ErrorResponse(429)))
+    assert sheets.call('append_rows', call) == 'ok'
+    assert call.calls == 2
+
+    # A 503 may come after the rows were written; retrying would duplicate them
+    call = Flaky(APIError(ErrorResponse(503)))
+    with pytest.raises(APIError):
+        sheets.call('append_rows', call)
+    assert call.calls == 1
+    assert sheets.stats()['failures'] == 1
+
+
+def test_client_errors_are_not_retried_and_do_not_open_the_circuit():
+    sheets = guard()
+    for _ in range(3):
+        call = Flaky(APIError(ErrorResponse(400)))
+        with pytest.raises(APIError):
+            sheets.call('batch_update', call)
+        assert call.calls == 1
+    assert sheets.breaker.state == 'closed'
+
+
+def test_failed_calls_open_the_circuit_and_later_ones_are_refused():
+    sheets = guard(retries=1)
+    for _ in range(2):
+        with pytest.raises(APIError):
+            sheets.call('get_all_values', Flaky(*[APIError(ErrorResponse(500))] * 2))
+
+    call = Flaky()
+    with pytest.raises(SheetsUnavailable):
+        sheets.call('get_all_values', call)
+    assert call.calls == 0
+    assert sheets.stats()['circuit'] == 'open' and sheets.stats()['rejected'] == 1
+
+    time.sleep(0.06)
+    assert sheets.call('get_all_values', call) == 'ok'
+    assert sheets.stats()['circuit'] == 'closed'
+
+
+def test_calls_over_budget_are_rejected_instead_of_queueing():
+    sheets = SheetsGuard(reads_per_minute=8, writes_per_minute=None, max_wait=0.01)
+    call = Flaky()
+    # The bucket's burst is a quarter of the per-minute budget
+    for _ in range(2):
+        assert sheets.call('batch_get', call) == 'ok'
+
+    with pytest.raises(SheetsUnavailable):
+        sheets.call('batch_get', call)
+    assert call.calls == 2
+    assert sheets.stats()['rejected'] == 1
+    # Writes have their own budget (none here)
+    assert sheets.call('batch_update', call) == 'ok'
@@ -0,0 +1,64 @@
+from conftest import make_order
+from utils.snapshot import LocalSnapshot
+
+
+def saved_snapshot(sheets_db, tmp_path):
+    db, client = sheets_db(books=20)
+    placed, failed = db.place_orders([make_order('ORD_1', 3)])
+    assert placed and not failed
+    path = str(tmp_path / 'state.snapshot')
+    LocalSnapshot(db, path).save()
+    return path, client
+
+
+def test_restore_is_readable_but_refuses_writes_until_connected(sheets_db, tmp_path):
+    path, client = saved_snapshot(sheets_db, tmp_path)
+    db, _ = sheets_db(attach=False, SWAPLY_SNAPSHOT=path)
+
+    db.restored = db.local_snapshot.load()
+
+    assert db.restored
+    assert len(db.get_all_books()) == 20
+    assert [o['order_id'] for o in db.get_user_orders('reader@example.com')] == ['ORD_1']
+    status = db.readiness()
+    assert status['ready'] and not status['writable']
+    assert not db.accepts_writes()
+
+    assert db.attach_client(client)
+    assert db.accepts_writes() and db.readiness()['writable']
+
+
+def test_reconnect_picks_up_changes_made_while_down(sheets_db, tmp_path):
+    path, client = saved_snapshot(sheets_db, tmp_path)
+    books_sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    orders_sheet = client.spreadsheets['SWAPLY_Orders'].sheet1
+    stock_column = books_sheet.rows[0].index('stock_quantity') + 1
+    # Another worker sold copies of book 5 and took an order after the snapshot
+    books_sheet.update_cell(6, stock_column, '7')
+    orders_sheet.append_row([make_order('ORD_2', 5)[f] for f in orders_sheet.rows[0]])
+
+    db, _ = sheets_db(attach=False, SWAPLY_SNAPSHOT=path)
+    db.restored = db.local_snapshot.load()
+    assert db.attach_client(client)
+
+    assert db.get_book_by_id('5')['stock_quantity'] == 7
+    assert {o['order_id'] for o in db.get_user_orders('reader@example.com')} == {'ORD_1', 'ORD_2'}
+
+
+def test_checkout_is_refused_with_503_while_restored_and_offline(sheets_db, tmp_path, monkeypatch):
+    import main
+
+    path, _ = saved_snapshot(sheets_db, tmp_path)
+    db, _ = sheets_db(attach=False, SWAPLY_SNAPSHOT=path)
+    db.restored = db.local_snapshot.load()
+    monkeypatch.setattr(main, 'db', db)
+
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'user-1'
+        session['user_email'] = 'reader@example.com'
+    response = client.post('/api/place-order', json={'book_id': '3'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert db.get_book_by_id('3')['stock_quantity'] == 999999
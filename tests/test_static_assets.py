@@ -0,0 +1,76 @@
+import gzip
+import os
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    import main
+    return main.app.test_client()
+
+
+def test_large_pages_are_gzipped_and_still_revalidate(client):
+    page = client.get('/books', headers={'Accept-Encoding': 'gzip'})
+
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in page.headers['Vary']
+    assert page.headers['ETag'].startswith('W/')
+    assert b'<html' in gzip.decompress(page.data)
+
+    again = client.get('/books', headers={'Accept-Encoding': 'gzip',
+                                          'If-None-Match': page.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_small_and_unaccepted_responses_are_left_alone(client):
+    assert 'Content-Encoding' not in client.get('/healthz', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/books').headers
+
+
+def test_fingerprinted_static_files_are_immutable_and_precompressed(client):
+    import main
+
+    with main.app.test_request_context():
+        url = main.url_for('static', filename='css/output.css')
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert url != '/static/css/output.css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Content-Encoding'] == 'gzip'
+    response.close()
+
+
+def test_brotli_is_preferred_when_accepted(client):
+    brotli = pytest.importorskip('brotli')
+
+    page = client.get('/books', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert page.headers['Content-Encoding'] == 'br'
+    assert b'<html' in brotli.decompress(page.data)
+
+
+def test_cached_pages_are_compressed_once(client):
+    import main
+
+    client.get('/books', headers={'Accept-Encoding': 'gzip'})
+    before = main.compressor.stats()
+    client.get('/books', headers={'Accept-Encoding': 'gzip'})
+    after = main.compressor.stats()
+
+    assert after['reused'] == before['reused'] + 1
+    assert after['compressed'] == before['compressed']
+
+
+def test_static_files_are_precompressed_with_brotli(client):
+    brotli = pytest.importorskip('brotli')
+    import main
+
+    with main.app.test_request_context():
+        url = main.url_for('static', filename='css/output.css')
+    response = client.get(url, headers={'Accept-Encoding': 'br, gzip'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    with open(os.path.join(main.app.static_folder, 'css', 'output.css'), 'rb') as f:
+        assert brotli.decompress(response.get_data()) == f.read()
+    response.close()
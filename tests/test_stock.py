@@ -0,0 +1,111 @@
+import threading
+
+from conftest import another_worker
+
+
+def sheet_stock(client, book_id):
+    sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    return int(sheet.rows[int(book_id)][sheet.rows[0].index('stock_quantity')])
+
+
+def set_stock(client, book_id, stock, *dbs):
+    sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    sheet.update_cell(int(book_id) + 1, sheet.rows[0].index('stock_quantity') + 1, str(stock))
+    for db in dbs:
+        db.catalog.update_book(book_id, stock_quantity=stock)
+
+
+def reserve_at_once(dbs, items):
+    results = [None] * len(dbs)
+
+    def reserve(i):
+        results[i] = dbs[i].reserve_stock(items)
+
+    threads = [threading.Thread(target=reserve, args=(i,)) for i in range(len(dbs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_two_workers_cannot_both_sell_the_last_copy(sheets_db):
+    first, client = sheets_db(books=5)
+    second = another_worker(client)
+    set_stock(client, '1', 1, first, second)
+    # A Sheets round trip long enough for the two checkouts to overlap
+    client.service.latency = 0.03
+
+    results = reserve_at_once([first, second], [('1', 1)])
+
+    sold = [reserved for reserved, _ in results if reserved]
+    assert sold == [{'1': 1}]
+    assert [failures for reserved, failures in results if not reserved] == [{'1': 'not available'}]
+    assert sheet_stock(client, '1') == 0
+
+
+def test_concurrent_sales_in_two_workers_all_count(sheets_db):
+    first, client = sheets_db(books=5)
+    second = another_worker(client)
+    set_stock(client, '2', 10, first, second)
+    client.service.latency = 0.01
+
+    for _ in range(3):
+        reserve_at_once([first, second], [('2', 1)])
+
+    assert sheet_stock(client, '2') == 4
+
+
+def sheet_status(client, book_id):
+    sheet = client.spreadsheets['SWAPLY_Books'].sheet1
+    return sheet.rows[int(book_id)][sheet.rows[0].index('status')]
+
+
+def pause_flushing(*dbs):
+    """Leave flushing to the test instead of the background workers"""
+    for db in dbs:
+        db.write_behind.ready = lambda: False
+
+
+def flush_all(db):
+    while db.write_behind.depth():
+        assert db.write_behind.flush()
+
+
+def test_write_behind_workers_queue_stock_changes_that_add_up(sheets_db, tmp_path):
+    first, client = sheets_db(books=5, SWAPLY_WRITE_BEHIND=1, SWAPLY_QUEUE_PATH=tmp_path / 'queue.db')
+    second = another_worker(client)
+    pause_flushing(first, second)
+    set_stock(client, '3', 5, first, second)
+
+    assert first.reserve_stock([('3', 1)]) == ({'3': 1}, {})
+    # Not flushed yet: the second worker still counts the first one's sale
+    assert second.reserve_stock([('3', 2)]) == ({'3': 2}, {})
+    assert second.reserve_stock([('3', 3)]) == ({}, {'3': 'only 2 in stock'})
+    assert sheet_stock(client, '3') == 5
+
+    flush_all(first)
+    assert sheet_stock(client, '3') == 2
+    assert first.reserve_stock([('3', 3)]) == ({}, {'3': 'only 2 in stock'})
+    assert first.get_book_by_id('3')['stock_quantity'] == 2
+
+
+def test_write_behind_flush_applies_changes_to_the_current_sheet_value(sheets_db, tmp_path):
+    db, client = sheets_db(books=5, SWAPLY_WRITE_BEHIND=1, SWAPLY_QUEUE_PATH=tmp_path / 'queue.db')
+    pause_flushing(db)
+    set_stock(client, '4', 1, db)
+
+    assert db.reserve_stock([('4', 1)]) == ({'4': 1}, {})
+    assert db.write_behind.pending('stock') == [{'book_id': '4', 'stock_delta': -1}]
+    # Restocked in the sheet by hand before the queued sale is written
+    set_stock(client, '4', 3)
+
+    flush_all(db)
+    assert sheet_stock(client, '4') == 2
+    assert sheet_status(client, '4') == 'Available'
+
+    assert db.reserve_stock([('4', 2)]) == ({'4': 2}, {})
+    assert db.release_stock({'4': 1})
+    assert db.write_behind.pending('stock') == [{'book_id': '4', 'stock_delta': -1}]
+    flush_all(db)
+    assert (sheet_stock(client, '4'), sheet_status(client, '4')) == (1, 'Available')
@@ -0,0 +1,109 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from utils.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    """Queues on one file, as in several workers; flushed only by the test"""
+    def make(handlers, **options):
+        return WriteBehindQueue(str(tmp_path / 'queue.db'), handlers, ready=lambda: False,
+                                writes_per_minute=6000, **options)
+    return make
+
+
+def test_entries_with_a_key_are_merged(make_queue):
+    queue = make_queue({})
+    queue.enqueue('user', {'email': 'a@example.com', 'name': 'A', 'phone': '1'}, key='a@example.com')
+    queue.enqueue('user', {'email': 'a@example.com', 'phone': '2'}, key='a@example.com')
+    queue.enqueue('orders', {'order_id': 'ORD_1'})
+    queue.enqueue('orders', {'order_id': 'ORD_2'})
+
+    assert queue.pending('user') == [{'email': 'a@example.com', 'name': 'A', 'phone': '2'}]
+    assert len(queue.pending('orders')) == 2
+
+
+def test_added_fields_are_summed_when_merged(make_queue):
+    first, second = make_queue({}), make_queue({})
+    first.enqueue('stock', {'book_id': '1', 'stock_delta': -1}, key='1', add=('stock_delta',))
+    second.enqueue('stock', {'book_id': '1', 'stock_delta': -2}, key='1', add=('stock_delta',))
+    second.enqueue('stock', {'book_id': '1', 'status': 'Sold Out'}, key='1')
+
+    assert first.pending('stock') == [{'book_id': '1', 'stock_delta': -3, 'status': 'Sold Out'}]
+
+
+def test_each_entry_is_flushed_once_across_workers(make_queue):
+    written = []
+    queues = [make_queue({'orders': written.extend}) for _ in range(3)]
+    for n in range(50):
+        queues[n % 3].enqueue('orders', {'order_id': n})
+
+    threads = [threading.Thread(target=lambda q=q: [q.flush() for _ in range(5)]) for q in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(order['order_id'] for order in written) == list(range(50))
+    assert queues[0].depth() == 0
+
+
+def test_newer_changes_wait_for_an_older_one_in_flight(make_queue):
+    started, finish = threading.Event(), threading.Event()
+    written = []
+
+    def slow(changes):
+        started.set()
+        finish.wait(5)
+        written.extend(changes)
+
+    first, second = make_queue({'stock': slow}), make_queue({'stock': written.extend})
+    first.enqueue('stock', {'book_id': '1', 'stock_delta': -1}, key='1', add=('stock_delta',))
+    flushing = threading.Thread(target=first.flush)
+    flushing.start()
+    started.wait(5)
+
+    # Claimed entries aren't merged into; the new one waits for the flush in flight
+    second.enqueue('stock', {'book_id': '1', 'stock_delta': -2}, key='1', add=('stock_delta',))
+    assert second.flush() and written == []
+
+    finish.set()
+    flushing.join()
+    assert second.flush()
+    assert [change['stock_delta'] for change in written] == [-1, -2]
+
+
+def test_failed_flushes_are_kept_for_a_retry(make_queue):
+    calls = []
+
+    def failing(orders):
+        calls.append(len(orders))
+        return len(calls) > 1
+
+    queue = make_queue({'orders': failing})
+    queue.enqueue('orders', {'order_id': 1})
+
+    assert not queue.flush()
+    assert queue.depth() == 1 and queue.stats()['failures'] == 1
+    assert queue.flush()
+    assert queue.depth() == 0 and calls == [1, 1]
+
+
+def test_locks_are_held_until_the_batch_is_dequeued(make_queue):
+    seen = []
+
+    @contextmanager
+    def locked(changes):
+        seen.append(('lock', queue.depth()))
+        yield
+        seen.append(('unlock', queue.depth()))
+
+    queue = make_queue({'stock': lambda changes: seen.append(('write', len(changes)))},
+                       locks={'stock': locked})
+    queue.enqueue('stock', {'book_id': '1', 'stock_delta': -1}, key='1')
+
+    assert queue.flush()
+    assert seen == [('lock', 1), ('write', 1), ('unlock', 0)]
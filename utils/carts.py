@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+import time
+
+
+class MemoryCartStore:
+    """Carts kept in process memory: user id -> {book_id: quantity}.
+
+    Only ids and quantities are stored; titles and prices are joined from
+    the catalog when the cart is read. Carts are per worker process, so
+    this is only for a single-process server (`SWAPLY_STATE_DB=''`).
+    """
+
+    def __init__(self):
+        self.carts = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            return dict(self.carts.get(user_id, {}))
+
+    def add(self, user_id, book_id, quantity=1):
+        """Add to a cart; returns the number of distinct books in it"""
+        with self.lock:
+            cart = self.carts.setdefault(user_id, {})
+            cart[book_id] = cart.get(book_id, 0) + quantity
+            return len(cart)
+
+    def set_quantity(self, user_id, book_id, quantity):
+        """Set an item's quantity (<= 0 removes it); False if not in the cart"""
+        with self.lock:
+            cart = self.carts.get(user_id, {})
+            if book_id not in cart:
+                return False
+            if quantity <= 0:
+                del cart[book_id]
+            else:
+                cart[book_id] = quantity
+            return True
+
+    def remove(self, user_id, book_id):
+        with self.lock:
+            self.carts.get(user_id, {}).pop(book_id, None)
+
+    def clear(self, user_id):
+        with self.lock:
+            self.carts.pop(user_id, None)
+
+
+class SQLiteCartStore:
+    """Carts in the SQLite database, shared by every worker process"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS carts (
+        user_id TEXT NOT NULL,
+        book_id TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        added_at REAL NOT NULL,
+        PRIMARY KEY (user_id, book_id)
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, user_id):
+        rows = self._conn().execute(
+            'SELECT book_id, quantity FROM carts WHERE user_id = ? ORDER BY added_at',
+            (user_id,)).fetchall()
+        return dict(rows)
+
+    def add(self, user_id, book_id, quantity=1):
+        conn = self._conn()
+        conn.execute(
+            'INSERT INTO carts (user_id, book_id, quantity, added_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(user_id, book_id) DO UPDATE SET quantity = quantity + excluded.quantity',
+            (user_id, book_id, quantity, time.time()))
+        return conn.execute('SELECT count(*) FROM carts WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    def set_quantity(self, user_id, book_id, quantity):
+        conn = self._conn()
+        if quantity <= 0:
+            cur = conn.execute('DELETE FROM carts WHERE user_id = ? AND book_id = ?', (user_id, book_id))
+        else:
+            cur = conn.execute('UPDATE carts SET quantity = ? WHERE user_id = ? AND book_id = ?',
+                               (quantity, user_id, book_id))
+        return cur.rowcount > 0
+
+    def remove(self, user_id, book_id):
+        self._conn().execute('DELETE FROM carts WHERE user_id = ? AND book_id = ?', (user_id, book_id))
+
+    def clear(self, user_id):
+        self._conn().execute('DELETE FROM carts WHERE user_id = ?', (user_id,))
+
+
+def create_cart_store(db, path=None):
+    """Carts shared by every worker: in the storage backend's SQLite file when
+    there is one, else in the SQLite file at `path`; in memory without one"""
+    if getattr(db, 'name', None) == 'sqlite':
+        return SQLiteCartStore(db.path)
+    if path:
+        return SQLiteCartStore(path)
+    return MemoryCartStore()
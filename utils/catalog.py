@@ -0,0 +1,299 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from utils.storage import BOOK_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Low-cardinality fields whose strings are shared between records
+INTERNED_FIELDS = ('condition', 'category', 'status')
+
+
+class BookRecord:
+    """One catalog book stored in fixed slots instead of a per-book dict.
+
+    Reads like the dicts it replaces (`get`, `[]`, `update`, `keys`), so
+    callers don't change; `to_dict()` turns it back into a plain dict at
+    the JSON boundary. Repeated values like status and condition are
+    interned so 50k books share a handful of strings.
+    """
+
+    __slots__ = tuple(BOOK_FIELDS)
+
+    def __init__(self, **fields):
+        for name in BOOK_FIELDS:
+            self._set(name, fields.get(name, ''))
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(**data)
+
+    def _set(self, name, value):
+        if name in INTERNED_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        object.__setattr__(self, name, value)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        self._set(name, value)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def update(self, fields=(), **more):
+        for name, value in dict(fields, **more).items():
+            self[name] = value
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __reduce__(self):
+        # A flat tuple of values pickles smaller and loads faster than the
+        # default per-slot state; pickle's memo keeps interned strings shared
+        return (_restore_record, tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return f"BookRecord(id={self.id!r}, title={self.title!r})"
+
+
+_SLOT_SETTERS = [getattr(BookRecord, name).__set__ for name in BOOK_FIELDS]
+
+
+def _restore_record(*values):
+    record = BookRecord.__new__(BookRecord)
+    for set_slot, value in zip(_SLOT_SETTERS, values):
+        set_slot(record, value)
+    return record
+
+
+class BookCatalog:
+    """In-process cache of the parsed books sheet.
+
+    Holds the book list produced by `GoogleSheetsDB.get_all_books()` so page
+    views don't pay a full sheet download. Entries expire after `ttl`
+    seconds; when a `version_probe` is given, an expired cache is first
+    revalidated against it and only reloaded if the source really changed.
+
+    `index` maps book id to the parsed record and `rows` maps book id to its
+    sheet row number, so lookups and single-cell writes skip the full scan.
+
+    Listeners are called after `lock` is released: they take their own
+    locks, and their owners call back into the catalog while holding them.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.books = []
+        self.index = {}
+        self.rows = {}
+        self.version = 0
+        # Version each book last changed at; books not in it changed at the last reload
+        self.revisions = {}
+        self.reloaded_version = 0
+        self.source_version = None
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.patches = 0
+        self.listeners = []
+        self.lock = threading.RLock()
+        # Changes made under `_changing()`, announced once the lock is released
+        self._pending = []
+        self._depth = 0
+
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def is_fresh(self):
+        if self.loaded_at is None:
+            return False
+        return (time.monotonic() - self.loaded_at) < self.ttl
+
+    def get(self, loader, version_probe=None, patcher=None):
+        """Return cached books, calling `loader()` when stale.
+
+        `loader` returns `(books, rows)` - the parsed list and a book id ->
+        sheet row mapping - or None on failure. When the source changed
+        and a `patcher` is given it is tried first: it updates the cached
+        books in place and returns False if only a full load will do.
+        After `invalidate()` the loader is always used.
+        """
+        with self._changing():
+            if self.is_fresh():
+                self.hits += 1
+                return self.books
+
+            current_version = None
+            if version_probe is not None:
+                try:
+                    current_version = version_probe()
+                except Exception:
+                    current_version = None
+
+            if (self.loaded_at is not None and current_version is not None
+                    and current_version == self.source_version):
+                self.loaded_at = time.monotonic()
+                self.revalidations += 1
+                self.hits += 1
+                return self.books
+
+            self.misses += 1
+            if patcher is not None and self.loaded_at is not None:
+                try:
+                    patched = patcher()
+                except Exception as e:
+                    logger.warning('⚠️  Catalog patch failed, reloading: %s', e)
+                    patched = False
+                if patched:
+                    self.source_version = current_version
+                    self.loaded_at = time.monotonic()
+                    self.patches += 1
+                    return self.books
+
+            loaded = loader()
+            if loaded is None:
+                # Loader failed - keep serving what we had
+                return self.books
+            books, rows = loaded
+            self.load(books, rows=rows, source_version=current_version)
+            return self.books
+
+    def load(self, books, rows=None, source_version=None):
+        """Replace the cached book list and rebuild the id index"""
+        with self._changing():
+            self.books = books
+            self.index = {str(book.get('id', '')).strip(): book for book in books}
+            self.rows = rows or {}
+            self.source_version = source_version
+            self.loaded_at = time.monotonic()
+            self.version += 1
+            self._reloaded()
+            self._notify('reset', None)
+
+    def add_listener(self, listener):
+        """Call `listener(event, books, version)` on changes: 'reset' after a
+        reload, 'update' with the changed records after a write-through"""
+        self.listeners.append(listener)
+
+    @contextmanager
+    def _changing(self):
+        """Hold `lock`; changes queued meanwhile are announced after the
+        outermost `_changing()` block has released it"""
+        events = []
+        try:
+            with self.lock:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        events, self._pending = self._pending, []
+        finally:
+            for event, books, version in events:
+                for listener in self.listeners:
+                    try:
+                        listener(event, books, version)
+                    except Exception as e:
+                        logger.warning('⚠️  Catalog listener failed: %s', e)
+
+    def _notify(self, event, books):
+        self._pending.append((event, books, self.version))
+
+    def reindex(self):
+        """Rebuild the id index after `books` was changed in place"""
+        with self._changing():
+            self.index = {str(book.get('id', '')).strip(): book for book in self.books}
+            self.version += 1
+            self._reloaded()
+            self._notify('reset', None)
+
+    def _reloaded(self):
+        self.revisions = {}
+        self.reloaded_version = self.version
+
+    def book_version(self, book_id):
+        """Catalog version at which `book_id` last changed"""
+        return self.revisions.get(str(book_id).strip(), self.reloaded_version)
+
+    def find(self, book_id):
+        return self.index.get(str(book_id).strip())
+
+    def row_of(self, book_id):
+        return self.rows.get(str(book_id).strip())
+
+    def update_book(self, book_id, **fields):
+        """Write-through update of a cached book; returns the book or None"""
+        with self._changing():
+            book = self.index.get(str(book_id).strip())
+            if book is None:
+                return None
+            book.update(fields)
+            self.version += 1
+            self.revisions[str(book_id).strip()] = self.version
+            self._notify('update', [book])
+            return book
+
+    def add_books(self, books, rows=None):
+        """Write-through of newly listed books; `rows` maps id -> sheet row"""
+        with self._changing():
+            books = [BookRecord.from_dict(book) for book in books]
+            for book in books:
+                book_id = str(book.get('id', '')).strip()
+                self.books.append(book)
+                self.index[book_id] = book
+                if rows and book_id in rows:
+                    self.rows[book_id] = rows[book_id]
+            self.version += 1
+            for book in books:
+                self.revisions[str(book.get('id', '')).strip()] = self.version
+            self._notify('update', list(books))
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def expire(self):
+        """Mark the books stale but keep them for revalidation or patching"""
+        with self.lock:
+            if self.loaded_at is not None:
+                self.loaded_at = time.monotonic() - self.ttl
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'books': len(self.books),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'patches': self.patches,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'age_seconds': round(time.monotonic() - self.loaded_at, 2) if self.loaded_at else None,
+                'ttl': self.ttl
+            }
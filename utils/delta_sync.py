@@ -0,0 +1,98 @@
+import zlib
+
+from gspread.utils import rowcol_to_a1
+
+
+def row_checksum(row):
+    values = [str(value) for value in row]
+    # Range reads drop trailing empty cells that full reads pad rows with
+    while values and not values[-1]:
+        values.pop()
+    return zlib.crc32('\x1f'.join(values).encode())
+
+
+class DeltaSync:
+    """What has been read from one sheet, so the next sync fetches only the difference.
+
+    After a full read (`reset`) it remembers the header, the number of rows
+    and a checksum and key (first column) per row. `fetch` then reads, in a
+    single `batch_get`, the header, every row appended since, and a
+    rotating window of `sample_size` existing rows whose checksums reveal
+    in-place edits. Anything that looks structural - a new header, rows
+    deleted or moved, or `full_every` syncs without a full read - makes
+    `fetch` return None so the caller falls back to a full reload.
+    """
+
+    def __init__(self, sample_size=200, full_every=20):
+        self.sample_size = sample_size
+        self.full_every = full_every
+        self.headers = None
+        self.row_count = 0
+        self.rows = {}
+        self.sample_at = 2
+        self.syncs = 0
+
+    def reset(self, all_values):
+        """Record a full read of the sheet (header included)"""
+        self.headers = list(all_values[0]) if all_values else None
+        self.row_count = len(all_values)
+        self.rows = {i: (row_checksum(row), row[0] if row else '')
+                     for i, row in enumerate(all_values[1:], start=2)}
+        self.syncs = 0
+
+    def invalidate(self):
+        self.headers = None
+
+    def state(self):
+        """What `restore` needs to resume delta syncs after a restart"""
+        return {'headers': self.headers, 'row_count': self.row_count,
+                'rows': dict(self.rows), 'sample_at': self.sample_at}
+
+    def restore(self, state):
+        self.headers = state['headers']
+        self.row_count = state['row_count']
+        self.rows = state['rows']
+        self.sample_at = state['sample_at']
+        self.syncs = 0
+
+    def _last_column(self):
+        return rowcol_to_a1(1, len(self.headers)).rstrip('0123456789')
+
+    def fetch(self, sheet):
+        """`(appended, changed)` lists of (row number, values), or None if a full read is needed"""
+        if self.headers is None or self.syncs >= self.full_every:
+            return None
+
+        last_column = self._last_column()
+        ranges = [f"A1:{last_column}1", f"A{self.row_count + 1}:{last_column}"]
+        sample_end = min(self.sample_at + self.sample_size - 1, self.row_count)
+        sampling = self.row_count >= 2 and self.sample_at <= sample_end
+        if sampling:
+            ranges.append(f"A{self.sample_at}:{last_column}{sample_end}")
+
+        results = sheet.batch_get(ranges)
+        header = list(results[0][0]) if results[0] else []
+        if header != self.headers:
+            return None
+
+        appended = [(self.row_count + 1 + i, list(row)) for i, row in enumerate(results[1])]
+        changed = []
+        if sampling:
+            sample = list(results[2])
+            for offset in range(sample_end - self.sample_at + 1):
+                row_index = self.sample_at + offset
+                row = list(sample[offset]) if offset < len(sample) else []
+                known = self.rows.get(row_index)
+                key = row[0] if row else ''
+                if known is not None and key != known[1]:
+                    # Rows were inserted, deleted or re-ordered
+                    return None
+                if known is None or row_checksum(row) != known[0]:
+                    changed.append((row_index, row))
+            self.sample_at = sample_end + 1 if sample_end < self.row_count else 2
+
+        for row_index, row in appended + changed:
+            self.rows[row_index] = (row_checksum(row), row[0] if row else '')
+        self.row_count += len(appended)
+        self.syncs += 1
+        return appended, changed
@@ -0,0 +1,32 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads for blocking Sheets I/O that can overlap (startup reads, checkout writes)
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('SWAPLY_IO_THREADS', '8')),
+                              thread_name_prefix='swaply-io')
+
+
+def gather(*calls):
+    """Run zero-argument callables concurrently; returns their results in order.
+
+    The first call runs on the calling thread, the rest on the shared
+    pool, each in a copy of the caller's context (so per-request metrics
+    still see their Sheets calls). Waits for every call and re-raises the
+    first exception. Don't call `gather` from inside a gathered call: the
+    pool is bounded and nested waits can starve it.
+    """
+    if not calls:
+        return []
+    futures = [executor.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    results = []
+    first_error = None
+    for wait in [calls[0]] + [future.result for future in futures]:
+        try:
+            results.append(wait())
+        except Exception as e:
+            results.append(None)
+            first_error = first_error or e
+    if first_error is not None:
+        raise first_error
+    return results
@@ -0,0 +1,89 @@
+import threading
+from collections import deque
+
+
+def _feed_key(book):
+    return (str(book.get('timestamp', '')), str(book.get('id', '')))
+
+
+def _is_available(book):
+    return (str(book.get('status', '')).lower() == 'available'
+            and book.get('stock_quantity', 0) > 0)
+
+
+class LatestBooksFeed:
+    """Newest available books, newest first, for the home page.
+
+    Keeps a bounded deque of the `depth` most recent available books
+    (by `timestamp`) so `latest()` doesn't filter the whole catalog.
+    Single-book changes from the storage backend's book listener are
+    applied in place: new listings are inserted, sold-out books dropped.
+    A catalog reload, or the deque running shorter than a page after
+    books sell out, triggers a rebuild on the next read.
+    """
+
+    def __init__(self, db, size=3, depth=24):
+        self.db = db
+        self.size = size
+        self.lock = threading.RLock()
+        self.books = deque(maxlen=max(depth, size))
+        self.version = None
+        self.dirty = True
+        # True while the deque holds every available book in the catalog
+        self.complete = False
+        db.add_book_listener(self._on_books_changed)
+
+    def _on_books_changed(self, event, books, version):
+        with self.lock:
+            if event == 'reset' or self.dirty:
+                self.dirty = True
+                return
+            for book in books:
+                self._apply(book)
+            self.version = version
+
+    def _apply(self, book):
+        book_id = str(book.get('id', '')).strip()
+        for i, existing in enumerate(self.books):
+            if str(existing.get('id', '')).strip() == book_id:
+                del self.books[i]
+                break
+
+        if _is_available(book):
+            key = _feed_key(book)
+            position = len(self.books)
+            for i, existing in enumerate(self.books):
+                if key > _feed_key(existing):
+                    position = i
+                    break
+            if len(self.books) == self.books.maxlen:
+                self.complete = False
+                if position == len(self.books):
+                    return
+                self.books.pop()
+            self.books.insert(position, book)
+
+        # Older books may be missing from the deque, so a short feed is rebuilt
+        if len(self.books) < self.size and not self.complete:
+            self.dirty = True
+
+    def rebuild(self, version=None):
+        # Read the catalog outside our lock, version first (see BookSearchIndex.rebuild)
+        if version is None:
+            version = self.db.catalog_version()
+        books = self.db.get_available_books()
+        newest = sorted(books, key=_feed_key, reverse=True)[:self.books.maxlen]
+        with self.lock:
+            self.books.clear()
+            self.books.extend(newest)
+            self.complete = len(books) <= self.books.maxlen
+            self.version = version
+            self.dirty = False
+
+    def latest(self):
+        """The `size` newest available books"""
+        version = self.db.catalog_version()
+        if self.dirty or self.version != version:
+            self.rebuild(version)
+        with self.lock:
+            return [self.books[i] for i in range(min(self.size, len(self.books)))]
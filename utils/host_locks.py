@@ -0,0 +1,45 @@
+import os
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover this process (threads)
+    fcntl = None
+
+
+class HostLocks:
+    """Exclusive locks shared by every worker process on this host.
+
+    Keys (book ids) hash onto `stripes` lock files in `path`, each taken
+    with `flock`. flock locks belong to an open file, not a process, so
+    two threads of one worker exclude each other just like two workers.
+    `held()` takes the stripes in sorted order, so callers locking
+    several keys at once can't deadlock.
+    """
+
+    def __init__(self, path, stripes=64):
+        self.path = path
+        self.stripes = stripes
+        os.makedirs(path, exist_ok=True)
+
+    def _stripe(self, key):
+        return zlib.crc32(str(key).encode()) % self.stripes
+
+    @contextmanager
+    def held(self, keys):
+        """Hold the locks covering `keys` for the body of the `with` block"""
+        if fcntl is None:
+            yield
+            return
+        files = []
+        try:
+            for stripe in sorted({self._stripe(key) for key in keys}):
+                fd = os.open(os.path.join(self.path, f'{stripe}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                files.append(fd)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            for fd in reversed(files):
+                # Closing the file releases its lock
+                os.close(fd)
@@ -0,0 +1,196 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request, session
+
+MAX_KEY_LENGTH = 255
+
+# A claim with no response after this long is from a worker that died mid-request
+ABANDONED_AFTER = 120
+
+
+class IdempotencyStore:
+    """Replays the response of a POST retried with the same `Idempotency-Key`.
+
+    The first request with a key claims it and runs; its response (2xx or
+    4xx - a 5xx means nothing was done, so a retry may run again) is kept
+    and returned to every retry. Keys are per user, and a key reused
+    with a different body is refused with 422 and doesn't run. A retry
+    that arrives while the first attempt is still running gets 409 (after
+    ABANDONED_AFTER seconds the claim is given up and the retry runs).
+    Subclasses store the entries: `claim`, `complete` and `release`.
+    """
+
+    def idempotent(self, view):
+        """Decorator for POST views that must not run twice for one client attempt"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key', '').strip()
+            if not key or 'user_id' not in session:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+
+            scope = (session['user_id'], request.path, key)
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            state, entry = self.claim(scope)
+            if state == 'busy':
+                return jsonify({'success': False,
+                                'error': 'This request is still being processed'}), 409
+            if state == 'done':
+                if entry['fingerprint'] != fingerprint:
+                    return jsonify({'success': False,
+                                    'error': 'Idempotency-Key was already used for a different request'}), 422
+                response = Response(entry['body'], status=entry['status'],
+                                    content_type=entry['content_type'])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                self.release(scope)
+                raise
+            response = make_response(response)
+            if response.status_code >= 500 or response.direct_passthrough:
+                self.release(scope)
+            else:
+                self.complete(scope, {'fingerprint': fingerprint, 'status': response.status_code,
+                                      'content_type': response.content_type,
+                                      'body': response.get_data()})
+            return response
+        return wrapper
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Recent keys in process memory (LRU, at most `max_entries`, kept `ttl` seconds).
+
+    Per worker process, so only for a single-process server
+    (`SWAPLY_STATE_DB=''`).
+    """
+
+    def __init__(self, max_entries=10000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def claim(self, scope):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(scope)
+            if entry is not None and entry['response'] is not None and now - entry['at'] < self.ttl:
+                self.entries.move_to_end(scope)
+                return 'done', entry['response']
+            if entry is not None and entry['response'] is None and now - entry['at'] < ABANDONED_AFTER:
+                return 'busy', None
+            self.entries[scope] = {'at': now, 'response': None}
+            self.entries.move_to_end(scope)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return 'new', None
+
+    def complete(self, scope, response):
+        with self.lock:
+            self.entries[scope] = {'at': time.monotonic(), 'response': response}
+
+    def release(self, scope):
+        with self.lock:
+            self.entries.pop(scope, None)
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """Keys in the SQLite database, shared by every worker process"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        user_id TEXT NOT NULL,
+        path TEXT NOT NULL,
+        key TEXT NOT NULL,
+        fingerprint TEXT,
+        status INTEGER,
+        content_type TEXT,
+        body BLOB,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (user_id, path, key)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys (created_at);
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.claims = 0
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def claim(self, scope):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT fingerprint, status, content_type, body, created_at FROM idempotency_keys '
+                'WHERE user_id = ? AND path = ? AND key = ?', scope).fetchone()
+            if row is not None and row[1] is not None and now - row[4] < self.ttl:
+                conn.execute('COMMIT')
+                return 'done', {'fingerprint': row[0], 'status': row[1],
+                                'content_type': row[2], 'body': row[3]}
+            if row is not None and row[1] is None and now - row[4] < ABANDONED_AFTER:
+                conn.execute('COMMIT')
+                return 'busy', None
+            conn.execute(
+                'INSERT OR REPLACE INTO idempotency_keys (user_id, path, key, created_at) '
+                'VALUES (?, ?, ?, ?)', scope + (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self.claims += 1
+        if self.claims % 100 == 0:
+            self._prune(now)
+        return 'new', None
+
+    def _prune(self, now):
+        conn = self._conn()
+        conn.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - self.ttl,))
+        conn.execute(
+            'DELETE FROM idempotency_keys WHERE created_at < ('
+            'SELECT created_at FROM idempotency_keys ORDER BY created_at DESC LIMIT 1 OFFSET ?)',
+            (self.max_entries - 1,))
+
+    def complete(self, scope, response):
+        self._conn().execute(
+            'UPDATE idempotency_keys SET fingerprint = ?, status = ?, content_type = ?, body = ? '
+            'WHERE user_id = ? AND path = ? AND key = ?',
+            (response['fingerprint'], response['status'], response['content_type'],
+             response['body']) + scope)
+
+    def release(self, scope):
+        self._conn().execute(
+            'DELETE FROM idempotency_keys WHERE user_id = ? AND path = ? AND key = ?', scope)
+
+
+def create_idempotency_store(db, path=None, max_entries=10000, ttl=86400):
+    """Keys shared by every worker: in the storage backend's SQLite file when
+    there is one, else in the SQLite file at `path`; in memory without one"""
+    if getattr(db, 'name', None) == 'sqlite':
+        return SQLiteIdempotencyStore(db.path, max_entries=max_entries, ttl=ttl)
+    if path:
+        return SQLiteIdempotencyStore(path, max_entries=max_entries, ttl=ttl)
+    return MemoryIdempotencyStore(max_entries=max_entries, ttl=ttl)
@@ -0,0 +1,43 @@
+import os
+import threading
+import time
+
+# Crockford base32: no I, L, O or U, so ids survive being read aloud or retyped
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+MAX_RANDOM = (1 << 80) - 1
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def new_id(prefix=''):
+    """Unique, time-sortable id (ULID layout): `prefix` + 26 base32 characters.
+
+    The first 10 characters are the millisecond timestamp, so ids sort by
+    creation time; the other 16 are 80 random bits, which keeps ids from
+    different workers and hosts apart. Within one millisecond a process
+    increments the random part instead of drawing a new one, so its own
+    ids stay in order.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        # Never step back, even if the wall clock does
+        ms = max(int(time.time() * 1000), _last_ms)
+        if ms == _last_ms and _last_random < MAX_RANDOM:
+            random_bits = _last_random + 1
+        else:
+            if ms == _last_ms:
+                # Random part used up within this millisecond: borrow the next one
+                ms += 1
+            random_bits = int.from_bytes(os.urandom(10), 'big')
+        _last_ms, _last_random = ms, random_bits
+    return prefix + _encode((ms << 80) | random_bits, 26)
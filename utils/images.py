@@ -0,0 +1,227 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Without Pillow originals are stored and served as uploaded
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Magic bytes of the formats we accept; anything else (SVG, HTML, ...) is refused
+FORMATS = [
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+]
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+PILLOW_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'gif': 'GIF', 'webp': 'WEBP'}
+
+URL_PREFIX = '/images/'
+DIGEST_LENGTH = 24
+DIGEST = re.compile(rf'[0-9a-f]{{{DIGEST_LENGTH}}}')
+LOCAL_URL = re.compile(rf'^{URL_PREFIX}({DIGEST.pattern})$')
+
+
+def sniff(head):
+    """(extension, mimetype) of an image from its first bytes, or None"""
+    for magic, ext, mimetype in FORMATS:
+        if head.startswith(magic):
+            return ext, mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+def looks_complete(data, ext):
+    """Whether `data` is framed like a whole `ext` file: header and trailer, not just magic bytes"""
+    if ext == 'png':
+        return data[12:16] == b'IHDR' and data.endswith(b'IEND\xaeB`\x82')
+    if ext == 'jpg':
+        return data.rstrip(b'\x00').endswith(b'\xff\xd9')
+    if ext == 'gif':
+        return data.endswith(b';')
+    if ext == 'webp':
+        return int.from_bytes(data[4:8], 'little') + 8 == len(data)
+    return False
+
+
+class ImageStore:
+    """Uploaded book images on local disk, with resized variants for listing grids.
+
+    An upload is stored once under the hash of its bytes and gets the URL
+    `/images/<hash>`. A background pool then writes a JPEG and a WebP
+    variant per width to `/images/<hash>/<width>.<jpg|webp>`. Both URLs
+    name fixed content, so they are served with immutable caching; until a
+    variant exists its URL serves the original without long-lived caching.
+    Variants need Pillow; without it only originals are served.
+    """
+
+    def __init__(self, root, widths=(160, 320, 640), max_bytes=8 * 1024 * 1024,
+                 workers=2, quality=80):
+        self.root = root
+        self.widths = tuple(sorted(widths))
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='swaply-images')
+        self.generated = 0
+        self.failures = 0
+        os.makedirs(os.path.join(root, 'originals'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'variants'), exist_ok=True)
+
+    def save(self, stream):
+        """Store an uploaded image and queue its variants; returns its URL.
+
+        Raises ValueError for empty, oversized or non-image uploads.
+        """
+        data = stream.read(self.max_bytes + 1)
+        if not data:
+            raise ValueError('No image uploaded')
+        if len(data) > self.max_bytes:
+            raise ValueError(f'Image is larger than {self.max_bytes // (1024 * 1024)} MB')
+        kind = sniff(data[:16])
+        if kind is None:
+            raise ValueError('Image must be a JPEG, PNG, GIF or WebP file')
+        # Originals are served as their sniffed type; anything that isn't one is refused
+        if not looks_complete(data, kind[0]):
+            raise ValueError('Image file is damaged or too large to process')
+        if Image is not None:
+            self._verify(data, kind[0])
+
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        path = self._original_path(digest, kind[0])
+        if not os.path.exists(path):
+            self._write(path, data)
+        self.schedule(digest)
+        return URL_PREFIX + digest
+
+    def _verify(self, data, ext):
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if image.format != PILLOW_FORMATS[ext]:
+                    raise ValueError(image.format)
+                image.verify()
+        except Exception:
+            # Truncated/corrupt files, polyglots and decompression bombs
+            raise ValueError('Image file is damaged or too large to process')
+
+    def _original_path(self, digest, ext):
+        return os.path.join(self.root, 'originals', f'{digest}.{ext}')
+
+    def _variant_path(self, digest, width, ext):
+        return os.path.join(self.root, 'variants', digest, f'{width}.{ext}')
+
+    def _write(self, path, data):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def original(self, digest):
+        """(path, mimetype) of a stored original, or None"""
+        if not DIGEST.fullmatch(digest):
+            return None
+        for ext, mimetype in MIMETYPES.items():
+            path = self._original_path(digest, ext)
+            if os.path.exists(path):
+                return path, mimetype
+        return None
+
+    def variant(self, digest, name):
+        """(path, mimetype) of a generated variant such as '320.webp'.
+
+        None if `name` isn't a variant we make or it hasn't been generated
+        yet (generation is then queued).
+        """
+        match = re.fullmatch(r'(\d+)\.(jpg|webp)', name)
+        if (Image is None or not DIGEST.fullmatch(digest) or not match
+                or int(match.group(1)) not in self.widths):
+            return None
+        path = self._variant_path(digest, int(match.group(1)), match.group(2))
+        if os.path.exists(path):
+            return path, MIMETYPES[match.group(2)]
+        self.schedule(digest)
+        return None
+
+    def schedule(self, digest):
+        """Generate the variants of an original in the background (once)"""
+        if Image is None:
+            return
+        with self.lock:
+            if digest in self.pending:
+                return
+            self.pending.add(digest)
+        self.pool.submit(self._generate, digest)
+
+    def _generate(self, digest):
+        try:
+            found = self.original(digest)
+            if found is None:
+                return
+            os.makedirs(os.path.join(self.root, 'variants', digest), exist_ok=True)
+            with Image.open(found[0]) as image:
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA'):
+                    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+                    image = image.convert('RGBA' if has_alpha else 'RGB')
+                for width in self.widths:
+                    self._write_variants(digest, image, width)
+            self.generated += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error('❌ Could not generate image variants for %s: %s', digest, e)
+        finally:
+            with self.lock:
+                self.pending.discard(digest)
+
+    def _write_variants(self, digest, image, width):
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        else:
+            resized = image
+
+        webp_path = self._variant_path(digest, width, 'webp')
+        if not os.path.exists(webp_path):
+            self._save(resized, webp_path, 'WEBP', quality=self.quality, method=4)
+
+        jpg_path = self._variant_path(digest, width, 'jpg')
+        if not os.path.exists(jpg_path):
+            if resized.mode == 'RGBA':
+                # JPEG has no alpha; flatten onto white like the page background
+                flat = Image.new('RGB', resized.size, (255, 255, 255))
+                flat.paste(resized, mask=resized.getchannel('A'))
+                resized = flat
+            self._save(resized, jpg_path, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+
+    def _save(self, image, path, fmt, **options):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        image.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, path)
+
+    def srcset(self, url, ext):
+        """`srcset` value listing the `ext` variants of a local image URL, or ''"""
+        match = LOCAL_URL.match(str(url or ''))
+        if Image is None or not match:
+            return ''
+        return ', '.join(f'{url}/{width}.{ext} {width}w' for width in self.widths)
+
+    def variant_widths(self):
+        """Widths the front end can request (none without Pillow)"""
+        return list(self.widths) if Image is not None else []
+
+    def stats(self):
+        return {
+            'pillow': Image is not None,
+            'pending': len(self.pending),
+            'generated': self.generated,
+            'failures': self.failures
+        }
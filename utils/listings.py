@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+CONDITIONS = ['New', 'Like New', 'Good', 'Fair', 'Poor']
+
+MAX_TITLE_LENGTH = 300
+MAX_DESCRIPTION_LENGTH = 5000
+
+
+def parse_price(value):
+    """Price from a sheet cell or form field ('₹1,250.00' -> 1250.0); None if unparseable"""
+    try:
+        return float(str(value).replace('₹', '').replace(',', '').strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_isbn(value):
+    """Canonical ISBN-13 for an ISBN-10/13 in any punctuation; '' for blank.
+
+    Raises ValueError when the digits or check digit are wrong.
+    """
+    digits = re.sub(r'[^0-9Xx]', '', str(value or '')).upper()
+    if not digits:
+        return ''
+
+    if len(digits) == 10 and re.fullmatch(r'\d{9}[\dX]', digits):
+        total = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(digits))
+        if total % 11:
+            raise ValueError(f"Invalid ISBN '{value}'")
+        digits = '978' + digits[:9]
+        check = (10 - sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(digits)) % 10) % 10
+        return digits + str(check)
+
+    if len(digits) == 13 and digits.isdigit():
+        if sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(digits)) % 10:
+            raise ValueError(f"Invalid ISBN '{value}'")
+        return digits
+
+    raise ValueError(f"Invalid ISBN '{value}'")
+
+
+def validate_listing(data):
+    """Clean a submitted listing into a book dict (without an id).
+
+    Raises ValueError with a message suitable for the seller.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Listing must be an object')
+
+    title = str(data.get('title') or '').strip()
+    author = str(data.get('author') or '').strip()
+    if not title:
+        raise ValueError('Title is required')
+    if not author:
+        raise ValueError('Author is required')
+    if len(title) > MAX_TITLE_LENGTH:
+        raise ValueError('Title is too long')
+
+    price = parse_price(data.get('price'))
+    if price is None or price < 0:
+        raise ValueError('Price must be a positive number')
+
+    condition = str(data.get('condition') or 'Good').strip()
+    matches = [c for c in CONDITIONS if c.lower() == condition.lower()]
+    if not matches:
+        raise ValueError(f"Condition must be one of: {', '.join(CONDITIONS)}")
+
+    stock = data.get('stock_quantity', 1)
+    try:
+        stock = int(str(stock).strip() or 1)
+    except ValueError:
+        raise ValueError('Stock quantity must be a whole number')
+    if stock < 0:
+        raise ValueError('Stock quantity cannot be negative')
+
+    description = str(data.get('description') or '').strip()
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        raise ValueError('Description is too long')
+
+    return {
+        'title': title,
+        'author': author,
+        'price': price,
+        'condition': matches[0],
+        'isbn': normalize_isbn(data.get('isbn')),
+        'description': description,
+        'category': str(data.get('category') or '').strip(),
+        'status': str(data.get('status') or 'Available').strip(),
+        'stock_quantity': stock,
+        # Listed now; a client-sent time would let a seller pin a book atop 'recent'
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'image_url': str(data.get('image_url') or '').strip()
+    }
+
+
+def iter_listings(stream, fmt):
+    """Parse an uploaded CSV or JSON Lines file one record at a time.
+
+    `stream` is a binary file object; yields `(line, book, error)` where
+    exactly one of `book` / `error` is set, so a bad row doesn't stop the
+    import.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            try:
+                yield reader.line_num, validate_listing(record), None
+            except ValueError as e:
+                yield reader.line_num, None, str(e)
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, validate_listing(json.loads(line)), None
+            except ValueError as e:
+                # json.JSONDecodeError is a ValueError too
+                yield line_number, None, str(e)
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'")
@@ -0,0 +1,208 @@
+import contextvars
+import threading
+import time
+
+# Request latency buckets in seconds; Sheets calls per request use CALL_BUCKETS
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+CALL_BUCKETS = [0, 1, 2, 3, 5, 10, 25]
+BYTE_BUCKETS = [0, 1024, 10240, 102400, 1048576, 10485760]
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                base = _labels(self.label_names, labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{base}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{base}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Longer lists (whole-sheet reads, bulk appends) are sized from this many items
+SIZE_SAMPLE = 32
+
+
+def _payload_size(value):
+    """Approximate JSON size of a Sheets request/response body.
+
+    Long lists are estimated from an even sample of their items, so
+    metering a whole-sheet read costs the same for 100 rows as for 50k.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (list, tuple)):
+        count = len(value)
+        if count > SIZE_SAMPLE:
+            step = count / SIZE_SAMPLE
+            sampled = sum(_payload_size(value[int(i * step)]) for i in range(SIZE_SAMPLE))
+            return round(sampled * count / SIZE_SAMPLE) + count + 1
+        return sum(_payload_size(item) for item in value) + count + 1
+    if isinstance(value, dict):
+        return sum(len(str(key)) + 3 + _payload_size(item) for key, item in value.items()) + len(value) + 1
+    if isinstance(value, str):
+        return len(value) + 2
+    return len(str(value))
+
+
+class Metrics:
+    """Process-wide request and Sheets API metrics behind `/metrics`.
+
+    Sheets calls made while a request is being handled are also charged
+    to that request, which gives the calls- and bytes-per-request
+    histograms. The tally lives in a context variable, so calls that
+    `utils.fanout.gather` runs on pool threads still count; calls from
+    background threads only show up in the totals.
+    """
+
+    def __init__(self):
+        self.request_latency = Histogram(
+            'swaply_request_duration_seconds', 'Request latency by route',
+            ('method', 'route', 'status'), LATENCY_BUCKETS)
+        self.request_sheets_calls = Histogram(
+            'swaply_request_sheets_calls', 'Sheets API calls made while handling a request',
+            ('route',), CALL_BUCKETS)
+        self.request_sheets_bytes = Histogram(
+            'swaply_request_sheets_bytes', 'Approximate Sheets API bytes moved while handling a request',
+            ('route',), BYTE_BUCKETS)
+        self.sheets_calls = Counter(
+            'swaply_sheets_calls_total', 'Sheets API calls by sheet, method and outcome',
+            ('sheet', 'method', 'outcome'))
+        self.sheets_bytes = Counter(
+            'swaply_sheets_bytes_total', 'Approximate Sheets API bytes by sheet and direction',
+            ('sheet', 'direction'))
+        self.sheets_latency = Histogram(
+            'swaply_sheets_call_duration_seconds', 'Sheets API call latency by method',
+            ('method',), LATENCY_BUCKETS)
+        self._request = contextvars.ContextVar('swaply_request', default=None)
+        self._tally_lock = threading.Lock()
+
+    def begin_request(self):
+        self._request.set({'started': time.perf_counter(), 'calls': 0, 'bytes': 0})
+
+    def end_request(self, method, route, status):
+        """Record the finished request; returns (seconds, sheets calls)"""
+        tally = self._request.get()
+        if tally is None:
+            return 0.0, 0
+        elapsed = time.perf_counter() - tally['started']
+        calls, size = tally['calls'], tally['bytes']
+        self._request.set(None)
+        self.request_latency.observe((method, route, str(status)), elapsed)
+        self.request_sheets_calls.observe((route,), calls)
+        self.request_sheets_bytes.observe((route,), size)
+        return elapsed, calls
+
+    def record_sheets_call(self, sheet, method, elapsed, sent, received, ok):
+        self.sheets_calls.inc((sheet, method, 'ok' if ok else 'error'))
+        self.sheets_bytes.inc((sheet, 'sent'), sent)
+        self.sheets_bytes.inc((sheet, 'received'), received)
+        self.sheets_latency.observe((method,), elapsed)
+        tally = self._request.get()
+        if tally is not None:
+            with self._tally_lock:
+                tally['calls'] += 1
+                tally['bytes'] += sent + received
+
+    def render(self, gauges=()):
+        """Prometheus text format; `gauges` is a list of (name, help, labels dict, value)"""
+        lines = []
+        for metric in (self.request_latency, self.request_sheets_calls, self.request_sheets_bytes,
+                       self.sheets_calls, self.sheets_bytes, self.sheets_latency):
+            lines.extend(metric.render())
+        seen = set()
+        for name, help_text, labels, value in gauges:
+            if name not in seen:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            label_text = _labels(labels.keys(), labels.values())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedSheet:
+    """Wraps a gspread worksheet/spreadsheet so every API call is metered"""
+
+    def __init__(self, target, sheet_name, metrics):
+        self._target = target
+        self._sheet_name = sheet_name
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            ok = False
+            result = None
+            try:
+                result = attr(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self._metrics.record_sheets_call(
+                    self._sheet_name, name, time.perf_counter() - started,
+                    _payload_size(args) + _payload_size(kwargs) if args or kwargs else 0,
+                    _payload_size(result), ok)
+        return call
+
+
+metrics = Metrics()
@@ -0,0 +1,85 @@
+import bisect
+import threading
+import time
+from utils.search import encode_cursor, decode_cursor
+
+
+class UserOrderIndex:
+    """Orders grouped by user email, each list kept in created_at order.
+
+    Loaded once from the orders sheet (reloaded after `ttl` seconds) and
+    appended to by `add_order`, so `/api/get-orders` costs the size of the
+    user's own history instead of a scan of every order on the site.
+    Orders with the same created_at are ordered by (order_id, book_id),
+    so page cursors mean the same in every worker.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.by_email = {}
+        self.keys = set()
+        self.added = 0
+        self.loaded_at = None
+        self.lock = threading.RLock()
+
+    def is_fresh(self):
+        if self.loaded_at is None:
+            return False
+        return (time.monotonic() - self.loaded_at) < self.ttl
+
+    def load(self, orders):
+        with self.lock:
+            self.by_email = {}
+            self.keys = set()
+            for order in orders:
+                self.add(order)
+            self.loaded_at = time.monotonic()
+
+    def mark_fresh(self):
+        """Restart the TTL after new rows were added incrementally"""
+        with self.lock:
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def expire(self):
+        """Mark the index stale but keep it, so only new rows are fetched"""
+        with self.lock:
+            if self.loaded_at is not None:
+                self.loaded_at = time.monotonic() - self.ttl
+
+    def orders(self):
+        """Every indexed order, oldest first per user"""
+        with self.lock:
+            return [order for entries in self.by_email.values() for _, order in entries]
+
+    def add(self, order):
+        with self.lock:
+            # A reload can race with an append that already reached the sheet
+            key = (str(order.get('order_id', '')), str(order.get('book_id', '')))
+            if key[0]:
+                if key in self.keys:
+                    return
+                self.keys.add(key)
+            entries = self.by_email.setdefault(order.get('user_email', ''), [])
+            position = (str(order.get('created_at', '')),) + key
+            bisect.insort(entries, (position, order), key=lambda e: e[0])
+            self.added += 1
+
+    def get(self, user_email, limit=None, cursor=None):
+        """Newest-first orders and the cursor for the next page (or None)"""
+        with self.lock:
+            entries = self.by_email.get(user_email, [])
+            end = len(entries)
+            if cursor:
+                after = decode_cursor(cursor, str, str, str)
+                end = bisect.bisect_left(entries, after, key=lambda e: e[0])
+
+            start = 0 if limit is None else max(0, end - limit)
+            page = entries[start:end]
+            page.reverse()
+
+        next_cursor = encode_cursor(page[-1][0]) if start > 0 and page else None
+        return [order for _, order in page], next_cursor
@@ -0,0 +1,121 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+
+
+class ResponseCache:
+    """LRU cache of rendered catalog pages and JSON, with conditional GET.
+
+    Entries are keyed by path, query string, logged-in state (the only
+    session value the catalog templates read) and the catalog version, so
+    any change to the books makes every cached listing unreachable. Views
+    showing one book (`cached_book`) are keyed by that book's own version
+    instead and outlive changes to other books. The storage backend's book
+    listener also drops outdated entries right away. Responses
+    carry a strong ETag (hash of the body) and Last-Modified, and
+    `If-None-Match` / `If-Modified-Since` are answered with 304.
+    """
+
+    def __init__(self, db, max_entries=512):
+        self.db = db
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        db.add_book_listener(self._on_books_changed)
+
+    def _on_books_changed(self, event, books, version):
+        if event == 'reset':
+            self.clear()
+            return
+        changed = {str(book.get('id', '')).strip() for book in books}
+        with self.lock:
+            for key in [key for key in self.entries if key[3] is None or key[3] in changed]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _key(self, book_id=None):
+        if book_id is None:
+            version = self.db.catalog_version()
+        else:
+            book_id = str(book_id).strip()
+            version = self.db.book_version(book_id)
+        return (request.path, request.query_string, bool(session.get('user_id')), book_id, version)
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def cached(self, view):
+        """Decorator for GET views whose output depends only on the catalog"""
+        return self._cached(view, by_book=False)
+
+    def cached_book(self, view):
+        """Decorator for GET views whose output depends only on the `book_id` argument's book"""
+        return self._cached(view, by_book=True)
+
+    def _cached(self, view, by_book):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self._key(kwargs['book_id'] if by_book else None)
+            entry = self._get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if (response.status_code != 200 or response.direct_passthrough
+                        or g.get('skip_response_cache')):
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'content_type': response.headers.get('Content-Type'),
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'last_modified': datetime.now(timezone.utc).replace(microsecond=0)
+                }
+                self._put(key, entry)
+
+            response = Response(entry['body'], content_type=entry['content_type'])
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            response.cache_control.no_cache = True
+            if key[2]:
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+
+    def skip(self):
+        """Don't cache the response being built (e.g. a fallback after an error)"""
+        g.skip_response_cache = True
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
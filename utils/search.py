@@ -0,0 +1,211 @@
+import base64
+import bisect
+import json
+import re
+import threading
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+SEARCH_FIELDS = ['title', 'author', 'isbn', 'description', 'category']
+
+SORTS = {
+    # name: (key function, newest/highest first, type of the key's first value)
+    # The book id breaks ties, so a cursor means the same in every worker
+    'recent': (lambda book: (str(book.get('timestamp', '')), str(book.get('id', ''))), True, str),
+    'price_asc': (lambda book: (float(book.get('price', 0) or 0), str(book.get('id', ''))), False, (int, float)),
+    'price_desc': (lambda book: (float(book.get('price', 0) or 0), str(book.get('id', ''))), True, (int, float)),
+}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text or '').lower())
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Sort key from `encode_cursor`; ValueError unless its values have `types`"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    # A cursor from another sort would compare against the wrong types
+    if not (isinstance(key, list) and len(key) == len(types)
+            and all(isinstance(value, kind) and not isinstance(value, bool)
+                    for value, kind in zip(key, types))):
+        raise ValueError('Invalid cursor')
+    return tuple(key)
+
+
+class BookSearchIndex:
+    """Inverted index over the catalog backing `/api/books`.
+
+    Built from `db.get_all_books()` and kept current through the storage
+    backend's book listener: single-book changes are re-indexed in place,
+    a full catalog reload marks the index for a rebuild on the next query.
+    Query terms match word prefixes, so it works for search-as-you-type.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.books = {}
+        self.tokens = {}
+        self.postings = {}
+        self.vocab = []
+        self.version = None
+        self.dirty = True
+        db.add_book_listener(self._on_books_changed)
+
+    def _on_books_changed(self, event, books, version):
+        with self.lock:
+            if event == 'reset' or self.dirty:
+                self.dirty = True
+                return
+            for book in books:
+                self._index_book(book)
+            self.version = version
+
+    def rebuild(self, version=None):
+        # The catalog is read before taking our lock; holding it while the
+        # catalog takes its own would invert the order its listeners use.
+        # Reading the version first means a change in between only labels
+        # the index older than it is, so the next query rebuilds again.
+        if version is None:
+            version = self.db.catalog_version()
+        books = self.db.get_all_books()
+        with self.lock:
+            self.books = {}
+            self.tokens = {}
+            self.postings = {}
+            self.vocab = []
+            for book in books:
+                self._index_book(book)
+            self.version = version
+            self.dirty = False
+
+    def _ensure_current(self):
+        version = self.db.catalog_version()
+        if self.dirty or self.version != version:
+            self.rebuild(version)
+
+    def _book_tokens(self, book):
+        tokens = set()
+        for field in SEARCH_FIELDS:
+            tokens.update(tokenize(book.get(field, '')))
+        isbn = re.sub(r'[^0-9xX]', '', str(book.get('isbn', '')))
+        if isbn:
+            tokens.add(isbn.lower())
+        return tokens
+
+    def _index_book(self, book):
+        book_id = str(book.get('id', '')).strip()
+        if not book_id:
+            return
+        new_tokens = self._book_tokens(book)
+        old_tokens = self.tokens.get(book_id, set())
+
+        for token in old_tokens - new_tokens:
+            ids = self.postings.get(token)
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self.postings[token]
+                    i = bisect.bisect_left(self.vocab, token)
+                    if i < len(self.vocab) and self.vocab[i] == token:
+                        del self.vocab[i]
+        for token in new_tokens - old_tokens:
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.vocab, token)
+            self.postings[token].add(book_id)
+
+        self.books[book_id] = book
+        self.tokens[book_id] = new_tokens
+
+    def remove_book(self, book_id):
+        with self.lock:
+            book_id = str(book_id).strip()
+            for token in self.tokens.pop(book_id, set()):
+                ids = self.postings.get(token)
+                if ids is not None:
+                    ids.discard(book_id)
+                    if not ids:
+                        del self.postings[token]
+                        i = bisect.bisect_left(self.vocab, token)
+                        if i < len(self.vocab) and self.vocab[i] == token:
+                            del self.vocab[i]
+            self.books.pop(book_id, None)
+
+    def _match_prefix(self, term):
+        matched = set()
+        i = bisect.bisect_left(self.vocab, term)
+        while i < len(self.vocab) and self.vocab[i].startswith(term):
+            matched |= self.postings[self.vocab[i]]
+            i += 1
+        return matched
+
+    def search(self, query='', category=None, condition=None, min_price=None,
+               max_price=None, sort='recent', limit=24, cursor=None, available_only=True):
+        """Filter, sort and page the catalog.
+
+        Returns `{'books', 'total', 'next_cursor'}`; pass `next_cursor` back
+        as `cursor` for the following page.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort '{sort}'")
+        key_fn, descending, value_type = SORTS[sort]
+        after = decode_cursor(cursor, value_type, str) if cursor else None
+
+        self._ensure_current()
+        with self.lock:
+            terms = tokenize(query)
+            if terms:
+                candidates = None
+                for term in terms:
+                    matched = self._match_prefix(term)
+                    candidates = matched if candidates is None else candidates & matched
+                    if not candidates:
+                        break
+                candidates = candidates or set()
+            else:
+                candidates = self.books.keys()
+
+            category = category.lower() if category else None
+            condition = condition.lower() if condition else None
+            results = []
+            for book_id in candidates:
+                book = self.books[book_id]
+                if available_only and (str(book.get('status', '')).lower() != 'available'
+                                       or book.get('stock_quantity', 0) <= 0):
+                    continue
+                if category and str(book.get('category', '')).lower() != category:
+                    continue
+                if condition and str(book.get('condition', '')).lower() != condition:
+                    continue
+                price = float(book.get('price', 0) or 0)
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                results.append((key_fn(book), book))
+
+        results.sort(key=lambda item: item[0], reverse=descending)
+        total = len(results)
+
+        if after is not None:
+            if descending:
+                results = [item for item in results if item[0] < after]
+            else:
+                results = [item for item in results if item[0] > after]
+
+        page = results[:limit]
+        next_cursor = encode_cursor(page[-1][0]) if len(results) > limit else None
+        return {
+            'books': [book for _, book in page],
+            'total': total,
+            'next_cursor': next_cursor
+        }
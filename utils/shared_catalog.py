@@ -0,0 +1,157 @@
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker refreshes its own catalog
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCatalog:
+    """Catalog snapshot shared by the gunicorn workers of one host.
+
+    One worker holds an exclusive lock on `<path>.lock` and is the
+    refresher: it keeps its catalog current from Google Sheets (TTL and
+    version probe as usual) and publishes every new version to `path`
+    with an atomic rename. The other workers never poll Sheets for the
+    catalog; they `stat()` the snapshot and reload it when it changes.
+    If the refresher dies its lock is released and another worker takes
+    over.
+
+    A follower that writes to the books sheet (stock, status, new
+    listings) touches `<path>.stale` so the refresher reloads and
+    republishes straight away instead of waiting for the TTL.
+    """
+
+    def __init__(self, db, path, interval=1.0):
+        self.db = db
+        self.path = path
+        self.interval = interval
+        self.is_leader = False
+        self.published_version = None
+        self.loaded_key = None
+        self.stale_seen = None
+        self.loading = False
+        self.lock = threading.Lock()
+        self._lock_file = None
+        db.catalog.add_listener(self._on_books_changed)
+
+    def start(self):
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _try_lead(self):
+        if fcntl is None:
+            self.is_leader = True
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        self.is_leader = True
+        logger.info('✅ Refreshing the shared catalog for all workers (pid %s)', os.getpid())
+
+    def _run(self):
+        while True:
+            try:
+                if not self.is_leader:
+                    self._try_lead()
+                if self.is_leader and not self.db.using_memory_storage:
+                    self._refresh()
+            except Exception as e:
+                logger.error('❌ Shared catalog refresh failed: %s', e)
+            time.sleep(self.interval)
+
+    def _refresh(self):
+        stale = self._mtime(self.path + '.stale')
+        if stale is not None and stale != self.stale_seen:
+            self.stale_seen = stale
+            self.db.catalog.invalidate()
+        self.db.get_all_books()
+        if self.db.catalog.version != self.published_version:
+            self.publish()
+
+    def publish(self):
+        """Atomically replace the snapshot with the current catalog"""
+        catalog = self.db.catalog
+        with catalog.lock:
+            snapshot = {
+                'books': list(catalog.books),
+                'rows': dict(catalog.rows),
+                'columns': dict(self.db.books_columns),
+                'source_version': catalog.source_version,
+                'version': catalog.version
+            }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.published_version = snapshot['version']
+        logger.debug('📚 Published catalog snapshot (%s books)', len(snapshot['books']))
+
+    def follows(self):
+        """True when this worker should serve the catalog from the snapshot"""
+        return not self.is_leader and self.sync()
+
+    def sync(self):
+        """Load the snapshot if it changed; False if there isn't one yet"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key == self.loaded_key:
+            return True
+
+        with self.lock:
+            if key == self.loaded_key:
+                return True
+            try:
+                with open(self.path, 'rb') as f:
+                    snapshot = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                logger.warning('⚠️  Could not read the catalog snapshot: %s', e)
+                return self.loaded_key is not None
+            self.loading = True
+            try:
+                self.db.books_columns = snapshot['columns']
+                self.db.catalog.load(snapshot['books'], snapshot['rows'],
+                                     source_version=snapshot['source_version'])
+            finally:
+                self.loading = False
+            self.loaded_key = key
+        return True
+
+    def _on_books_changed(self, event, books, version):
+        if event == 'update' and not self.is_leader and not self.loading:
+            self.request_refresh()
+
+    def request_refresh(self):
+        """Ask the refresher to reload from Sheets and republish"""
+        try:
+            with open(self.path + '.stale', 'a'):
+                pass
+            os.utime(self.path + '.stale')
+        except OSError as e:
+            logger.warning('⚠️  Could not flag the catalog snapshot as stale: %s', e)
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def stats(self):
+        return {
+            'role': 'leader' if self.is_leader else 'follower',
+            'path': self.path,
+            'published_version': self.published_version
+        }
@@ -1,452 +1,1005 @@
+import logging
 import gspread
+from gspread.utils import numericise_all, rowcol_to_a1
 import os
+import re
 from datetime import datetime
 import json
 import threading
 import time
+from contextlib import contextmanager
+from functools import partial
+from utils.catalog import BookCatalog, BookRecord
+from utils.order_index import UserOrderIndex
+from utils.user_index import UserProfileIndex
+from utils.storage import StorageBackend, BOOK_FIELDS, USER_FIELDS, ORDER_FIELDS
+from utils.write_behind import WriteBehindQueue
+from utils.metrics import InstrumentedSheet, metrics
+from utils.listings import parse_price
+from utils.shared_catalog import SharedCatalog
+from utils.snapshot import LocalSnapshot
+from utils.delta_sync import DeltaSync
+from utils.fanout import gather
+from utils.host_locks import HostLocks
+from utils.ids import new_id
+from utils.sheets_client import GuardedSheet, SheetsGuard, CircuitBreaker, configure_session
+
+logger = logging.getLogger(__name__)
+
+
+def queued_stock(stock, status, change):
+    """(stock, status) once a queued write-behind stock change is applied.
+
+    Checkouts queue stock as a `stock_delta`, so changes queued by
+    several workers add up instead of overwriting each other; the status
+    follows the stock the way `reserve_stock` / `release_stock` set it.
+    """
+    stock = int(change.get('stock_quantity', stock))
+    status = change.get('status', status)
+    delta = change.get('stock_delta', 0)
+    if delta:
+        stock = max(0, stock + delta)
+        if delta < 0 and stock == 0 and status.lower() == 'available':
+            status = 'Sold Out'
+        elif delta > 0 and status == 'Sold Out':
+            status = 'Available'
+    return stock, status
+
+
+class GoogleSheetsDB(StorageBackend):
+    name = 'sheets'
 
-class GoogleSheetsDB:
     def __init__(self):
         self.books_sheet_name = 'SWAPLY_Books'
         self.users_sheet_name = 'SWAPLY_Users'
         self.orders_sheet_name = 'SWAPLY_Orders'
         self.client = None
+        self.books_spreadsheet = None
         self.books_sheet = None
         self.users_sheet = None
         self.orders_sheet = None
         self.using_memory_storage = True
         self.connection_attempted = False
+        # idle -> connecting -> ready (Sheets warm) or memory (fallback)
+        self.state = 'idle'
+        self.ready_event = threading.Event()
+        self._start_lock = threading.Lock()
+        self.catalog = BookCatalog(ttl=int(os.getenv('SWAPLY_CATALOG_TTL', '60')))
+        self.books_columns = {}
+        self.order_index = UserOrderIndex(ttl=int(os.getenv('SWAPLY_ORDERS_TTL', '300')))
+        self.user_index = UserProfileIndex(ttl=int(os.getenv('SWAPLY_USERS_TTL', '300')))
+        # Row counts and checksums for fetching only changed rows on refresh
+        full_every = int(os.getenv('SWAPLY_FULL_SYNC_EVERY', '20'))
+        sample_size = int(os.getenv('SWAPLY_SYNC_SAMPLE', '200'))
+        self.books_sync = DeltaSync(sample_size=sample_size, full_every=full_every)
+        self.orders_sync = DeltaSync(full_every=full_every)
+        self._book_locks = {}
+        self._book_locks_guard = threading.Lock()
+        # Other workers on this host write the same stock cells
+        self.host_locks = HostLocks(os.getenv('SWAPLY_LOCK_DIR', 'swaply_locks'))
+        self.write_behind = None
+        self.shared_catalog = None
+        self.local_snapshot = None
+        self.restored = False
+        # Quota-aware retries and a circuit breaker around every Sheets call
+        self.sheets_guard = SheetsGuard(
+            reads_per_minute=int(os.getenv('SWAPLY_SHEETS_READS_PER_MIN', '60')),
+            writes_per_minute=int(os.getenv('SWAPLY_SHEETS_WRITES_PER_MIN', '60')),
+            retries=int(os.getenv('SWAPLY_SHEETS_RETRIES', '3')),
+            breaker=CircuitBreaker(
+                threshold=int(os.getenv('SWAPLY_BREAKER_THRESHOLD', '5')),
+                reset_timeout=float(os.getenv('SWAPLY_BREAKER_RESET', '30'))))
         
         # Initialize empty storage
         self._init_memory_storage()
         
-        # Try to connect in background (non-blocking)
-        self._connect_to_sheets_async()
+        # Keep the parsed sheets on disk so a restart is served straight away
+        if os.getenv('SWAPLY_SNAPSHOT'):
+            self.local_snapshot = LocalSnapshot(
+                self, os.getenv('SWAPLY_SNAPSHOT'),
+                interval=float(os.getenv('SWAPLY_SNAPSHOT_INTERVAL', '60')))
+        
+        # Let one gunicorn worker refresh the catalog for all of them
+        if os.getenv('SWAPLY_SHARED_CATALOG'):
+            self.shared_catalog = SharedCatalog(self, os.getenv('SWAPLY_SHARED_CATALOG'))
+        
+        # Queue Sheets writes instead of blocking requests on them
+        if os.getenv('SWAPLY_WRITE_BEHIND', '0') == '1':
+            self.write_behind = WriteBehindQueue(
+                os.getenv('SWAPLY_QUEUE_PATH', 'swaply_queue.db'),
+                {'orders': self._flush_orders, 'stock': self._flush_stock, 'user': self._flush_users},
+                ready=lambda: not self.using_memory_storage,
+                # A stock flush reads the cells it adds to; hold their locks
+                locks={'stock': lambda changes: self._locked_books({c['book_id'] for c in changes})},
+                writes_per_minute=int(os.getenv('SWAPLY_SHEETS_WRITES_PER_MIN', '60')))
+    
+    def start(self, wait=False, timeout=None):
+        """Begin connecting to Google Sheets in the background.
+
+        Safe to call more than once. Until the connection and warm-up
+        finish, requests are served from memory storage (seeded from the
+        local snapshot when there is one); with `wait=True`
+        this blocks until then (or `timeout` seconds).
+        """
+        with self._start_lock:
+            if self.state == 'idle':
+                self.state = 'connecting'
+                if self.local_snapshot:
+                    self.restored = self.local_snapshot.load()
+                    self.local_snapshot.start()
+                self._connect_to_sheets_async()
+                if self.shared_catalog:
+                    self.shared_catalog.start()
+        if wait:
+            self.ready_event.wait(timeout)
+        return self
+    
+    def readiness(self):
+        require_sheets = os.getenv('SWAPLY_REQUIRE_SHEETS', '0') == '1'
+        return {
+            'ready': self.state == 'ready' or (
+                not require_sheets and (self.state == 'memory' or self.restored)),
+            'writable': self.accepts_writes(),
+            'state': self.state,
+            'storage': 'memory' if self.using_memory_storage else 'sheets',
+            'sheets_circuit': self.sheets_guard.breaker.state
+        }
+    
+    def accepts_writes(self):
+        # Restored from the snapshot but not connected yet: anything written
+        # now would only change memory and be lost when Sheets takes over
+        return not (self.restored and self.using_memory_storage)
+    
+    def _finish_connecting(self):
+        self.connection_attempted = True
+        self.state = 'memory' if self.using_memory_storage else 'ready'
+        self.ready_event.set()
     
     def _init_memory_storage(self):
         """Initialize empty memory storage"""
-        print("🔄 Initializing memory storage...")
+        logger.info('🔄 Initializing memory storage...')
         self.books_storage = []
-        self.users_storage = []
+        self.users_storage = {}
         self.orders_storage = []
-        print("✅ Memory storage initialized (empty)")
+        self.catalog.load(self.books_storage)
+        self.order_index.load(self.orders_storage)
+        logger.info('✅ Memory storage initialized (empty)')
 
     def _connect_to_sheets_async(self):
         """Connect to Google Sheets in background thread"""
         def connect_thread():
-            print("\n" + "="*50)
-            print("🔍 Attempting to connect to Google Sheets...")
-            print("="*50)
+            logger.info('🔍 Attempting to connect to Google Sheets...')
             
             try:
                 # Check credentials file
                 if not os.path.exists('credentials.json'):
-                    print("❌ credentials.json NOT FOUND - Using memory storage")
-                    print("💡 To use Google Sheets, download credentials.json from:")
-                    print("   https://console.cloud.google.com/apis/credentials")
-                    self.connection_attempted = True
+                    logger.warning('❌ credentials.json NOT FOUND - Using memory storage')
+                    logger.info('💡 To use Google Sheets, download credentials.json from '
+                                'https://console.cloud.google.com/apis/credentials')
                     return
                 
-                print("✅ credentials.json found")
+                logger.info('✅ credentials.json found')
                 
                 # Verify credentials file
                 try:
                     with open('credentials.json', 'r') as f:
                         creds = json.load(f)
                         if 'type' not in creds or creds['type'] != 'service_account':
-                            print("❌ Invalid credentials.json - Using memory storage")
-                            self.connection_attempted = True
+                            logger.error('❌ Invalid credentials.json - Using memory storage')
                             return
-                    print("✅ credentials.json is valid")
+                    logger.info('✅ credentials.json is valid')
                 except json.JSONDecodeError:
-                    print("❌ credentials.json is not valid JSON - Using memory storage")
-                    self.connection_attempted = True
+                    logger.error('❌ credentials.json is not valid JSON - Using memory storage')
                     return
                 
                 # Create API client with timeout
                 try:
                     import gspread
                     self.client = gspread.service_account(filename='credentials.json')
-                    print("✅ Google Sheets API client created")
+                    configure_session(self.client,
+                                      pool_size=int(os.getenv('SWAPLY_SHEETS_POOL', '20')),
+                                      timeout=float(os.getenv('SWAPLY_SHEETS_TIMEOUT', '20')))
+                    logger.info('✅ Google Sheets API client created')
                 except Exception as e:
-                    print(f"❌ Failed to create API client: {e}")
-                    print("💡 Using memory storage")
-                    self.connection_attempted = True
+                    logger.error('❌ Failed to create API client: %s', e)
+                    logger.info('💡 Using memory storage')
                     return
                 
-                # Connect to each sheet with timeout handling
-                sheets_config = [
-                    (self.books_sheet_name, 'books_sheet'),
-                    (self.users_sheet_name, 'users_sheet'), 
-                    (self.orders_sheet_name, 'orders_sheet')
-                ]
-                
-                all_connected = True
-                
-                for sheet_name, attr_name in sheets_config:
-                    try:
-                        print(f"🔍 Connecting to '{sheet_name}'...")
-                        # Add timeout for sheet connection
-                        spreadsheet = self.client.open(sheet_name)
-                        setattr(self, attr_name, spreadsheet.sheet1)
-                        
-                        # Test read access quickly
-                        try:
-                            records = getattr(self, attr_name).get_all_records()
-                            print(f"✅ Connected to '{sheet_name}' ({len(records)} records)")
-                        except Exception as e:
-                            print(f"⚠️  Connected but read test failed for '{sheet_name}': {e}")
-                            all_connected = False
-                        
-                    except gspread.SpreadsheetNotFound:
-                        print(f"❌ Sheet '{sheet_name}' NOT FOUND")
-                        print(f"💡 Please create: {sheet_name} and share with service account")
-                        all_connected = False
-                    except gspread.exceptions.APIError as e:
-                        print(f"❌ API Error for '{sheet_name}': {e}")
-                        all_connected = False
-                    except Exception as e:
-                        print(f"❌ Error connecting to '{sheet_name}': {e}")
-                        all_connected = False
-                
-                if all_connected:
-                    self.using_memory_storage = False
-                    print("\n🎉 ALL GOOGLE SHEETS CONNECTED SUCCESSFULLY!")
-                    print("="*50)
-                    self.setup_headers()
-                else:
-                    print("\n⚠️  Some sheets failed - Using memory storage")
-                    print("="*50)
-                
-                self.connection_attempted = True
+                # Keep trying in the background instead of staying on memory storage
+                delay = 5
+                while not self.attach_client(self.client):
+                    logger.info('🔄 Retrying Google Sheets in %ss', delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, int(os.getenv('SWAPLY_RECONNECT_MAX', '300')))
                     
             except Exception as e:
-                print(f"❌ Unexpected error in sheet connection: {e}")
-                print("💡 Using memory storage")
-                self.connection_attempted = True
+                logger.error('❌ Unexpected error in sheet connection: %s', e)
+                logger.info('💡 Using memory storage')
+            finally:
+                self._finish_connecting()
         
         # Start connection in background thread
         thread = threading.Thread(target=connect_thread)
         thread.daemon = True
         thread.start()
+    
+    def attach_client(self, client):
+        """Open the three sheets with `client` and switch to Sheets storage.
+
+        Each sheet is read once by `warm_up()`, which also seeds the caches,
+        so the switch happens with a warm catalog. Returns True when every
+        sheet is reachable; otherwise memory storage stays in use.
+        """
+        self.client = client
+        
+        # Connect to each sheet with timeout handling
+        sheets_config = [
+            (self.books_sheet_name, 'books_sheet'),
+            (self.users_sheet_name, 'users_sheet'), 
+            (self.orders_sheet_name, 'orders_sheet')
+        ]
+        
+        def connect(sheet_name, attr_name):
+            try:
+                logger.info("🔍 Connecting to '%s'...", sheet_name)
+                spreadsheet = self.sheets_guard.call('open', self.client.open, sheet_name)
+                setattr(self, attr_name, self._guarded(spreadsheet.sheet1, sheet_name))
+                if attr_name == 'books_sheet':
+                    self.books_spreadsheet = self._guarded(spreadsheet, sheet_name)
+                return True
+                
+            except gspread.SpreadsheetNotFound:
+                logger.error("❌ Sheet '%s' NOT FOUND", sheet_name)
+                logger.info('💡 Please create: %s and share with service account', sheet_name)
+            except gspread.exceptions.APIError as e:
+                logger.error("❌ API Error for '%s': %s", sheet_name, e)
+            except Exception as e:
+                logger.error("❌ Error connecting to '%s': %s", sheet_name, e)
+            return False
+        
+        # The three opens are independent round trips, so overlap them
+        all_connected = all(gather(*[partial(connect, sheet_name, attr_name)
+                                     for sheet_name, attr_name in sheets_config]))
         
-        # Wait a bit for initial connection attempt
-        time.sleep(2)
+        if all_connected:
+            try:
+                self.warm_up()
+            except Exception as e:
+                logger.warning('⚠️  Read test failed during warm-up: %s', e)
+                all_connected = False
+        
+        if all_connected:
+            if self.using_memory_storage and (self.orders_storage or self.users_storage):
+                logger.warning('⚠️  %s orders and %s users saved while on memory storage are not in Google Sheets',
+                               len(self.orders_storage), len(self.users_storage))
+            self.using_memory_storage = False
+            logger.info('🎉 ALL GOOGLE SHEETS CONNECTED SUCCESSFULLY!')
+        else:
+            logger.warning('⚠️  Some sheets failed - Using memory storage')
+        
+        self._finish_connecting()
+        return all_connected
     
-    def setup_headers(self):
-        """Setup column headers for all sheets"""
-        if self.using_memory_storage:
-            return
+    def _guarded(self, target, sheet_name):
+        # Metered inside the guard, so every retry shows up in /metrics
+        return GuardedSheet(InstrumentedSheet(target, sheet_name, metrics), self.sheets_guard)
+    
+    def warm_up(self):
+        """Read each sheet once (concurrently), create missing headers and seed the caches"""
+        def read(sheet_name, sheet, fields, seed):
+            if sheet is self.books_sheet and self.shared_catalog and self.shared_catalog.sync():
+                logger.info("✅ Loaded '%s' from the shared catalog snapshot", sheet_name)
+                return
+            if self.restored and sheet is not self.users_sheet:
+                self._reconcile(sheet)
+                logger.info("✅ Reconciled '%s' with the local snapshot", sheet_name)
+                return
+            all_values = sheet.get_all_values()
+            if not all_values:
+                sheet.append_row(fields)
+                all_values = [list(fields)]
+                logger.info("✅ '%s' headers created", sheet_name)
+            seed(all_values)
+            logger.info("✅ Connected to '%s' (%s records)", sheet_name, len(all_values) - 1)
         
+        gather(partial(read, self.books_sheet_name, self.books_sheet, BOOK_FIELDS, self._seed_books),
+               partial(read, self.users_sheet_name, self.users_sheet, USER_FIELDS, self._seed_users),
+               partial(read, self.orders_sheet_name, self.orders_sheet, ORDER_FIELDS, self._seed_orders))
+    
+    def _reconcile(self, sheet):
+        """Bring a sheet's restored index up to date: probe, then fetch only what changed"""
+        if sheet is self.books_sheet:
+            self.catalog.expire()
+            self.catalog.get(self._load_books_from_sheet, self._books_version_probe,
+                             patcher=self._patch_books_from_sheet)
+        else:
+            self.order_index.expire()
+            self._refresh_order_index()
+    
+    def _seed_books(self, all_values):
         try:
-            # Books sheet headers
-            if self.books_sheet:
-                all_values = self.books_sheet.get_all_values()
-                if not all_values or len(all_values) == 0:
-                    headers = ['id', 'title', 'author', 'price', 'condition', 'isbn', 
-                              'description', 'category', 'status', 'stock_quantity', 'timestamp', 'image_url']
-                    self.books_sheet.append_row(headers)
-                    print("✅ Books sheet headers created")
-            
-            # Users sheet headers
-            if self.users_sheet:
-                all_values = self.users_sheet.get_all_values()
-                if not all_values or len(all_values) == 0:
-                    headers = ['user_id', 'email', 'name', 'phone', 'address_line1', 
-                              'address_line2', 'city', 'state', 'zip_code', 'created_at', 'updated_at']
-                    self.users_sheet.append_row(headers)
-                    print("✅ Users sheet headers created")
-            
-            # Orders sheet headers
-            if self.orders_sheet:
-                all_values = self.orders_sheet.get_all_values()
-                if not all_values or len(all_values) == 0:
-                    headers = ['order_id', 'user_id', 'user_email', 'book_id', 'book_title', 
-                              'quantity', 'total_price', 'full_name', 'phone', 'address_line1', 
-                              'address_line2', 'city', 'state', 'zip_code', 'payment_method', 
-                              'status', 'created_at']
-                    self.orders_sheet.append_row(headers)
-                    print("✅ Orders sheet headers created")
-                
-        except Exception as e:
-            print(f"❌ Error setting up headers: {e}")
+            source_version = self._books_version_probe()
+        except Exception:
+            source_version = None
+        books, rows = self._parse_books(all_values)
+        self.catalog.load(books, rows, source_version=source_version)
+    
+    def _seed_users(self, all_values):
+        with self.user_index.lock:
+            self.user_index.load(self._parse_users(all_values))
+    
+    def _seed_orders(self, all_values):
+        with self.order_index.lock:
+            self.order_index.load(self._parse_orders(all_values))
 
     def get_all_books(self):
         """Get all books"""
         if self.using_memory_storage:
-            print("📚 Using memory storage")
+            logger.debug('📚 Using memory storage')
             return self.books_storage
         
+        if not self.books_sheet:
+            logger.warning('❌ Books sheet not connected')
+            return []
+        
+        if self.shared_catalog and self.shared_catalog.follows():
+            return self.catalog.books
+        
+        if self.sheets_guard.is_open() and self.catalog.is_loaded():
+            # Sheets is down: serve the last good catalog until the breaker probes again
+            return self.catalog.books
+        
+        return self.catalog.get(self._load_books_from_sheet, self._books_version_probe,
+                                patcher=self._patch_books_from_sheet)
+
+    def _books_version_probe(self):
+        """Cheap change marker for the books spreadsheet (Drive metadata)"""
+        if not self.books_spreadsheet:
+            return None
+        return self.books_spreadsheet.get_lastUpdateTime()
+
+    def _load_books_from_sheet(self):
+        """Download and parse the books sheet; returns None on failure"""
         try:
-            if not self.books_sheet:
-                print("❌ Books sheet not connected")
-                return []
-            
-            all_values = self.books_sheet.get_all_values()
-            
-            if len(all_values) <= 1:
-                print("📚 No books in Google Sheet")
-                return []
-            
-            headers = all_values[0]
-            books = []
-            
-            for row_index, row in enumerate(all_values[1:], start=2):
-                if not row or len(row) < 4:
-                    continue
-                
-                # Create book dict
-                book = {}
-                for i, header in enumerate(headers):
-                    book[header] = row[i] if i < len(row) else ''
-                
-                # Parse price
-                try:
-                    price = float(str(book.get('price', '0')).replace('₹', '').replace(',', '').strip())
-                except:
-                    price = 0.0
-                
-                # Parse stock quantity
-                try:
-                    stock_qty = int(str(book.get('stock_quantity', '1')).strip())
-                except:
-                    stock_qty = 1
-                
-                # Get image URL
-                image_url = book.get('image_url', '').strip()
-
-                book_data = {
-                    'id': str(book.get('id', '')).strip(),
-                    'title': book.get('title', 'Unknown Book'),
-                    'author': book.get('author', 'Unknown Author'),
-                    'price': price,
-                    'condition': book.get('condition', 'Good'),
-                    'isbn': book.get('isbn', ''),
-                    'description': book.get('description', ''),
-                    'category': book.get('category', ''),
-                    'status': book.get('status', 'Available'),
-                    'stock_quantity': stock_qty,
-                    'timestamp': book.get('timestamp', ''),
-                    'image_url': image_url
-                }
-                
-                books.append(book_data)
-            
-            print(f"✅ Loaded {len(books)} books from Google Sheets")
-            return books
+            books, rows = self._parse_books(self.books_sheet.get_all_values())
+            logger.info('✅ Loaded %s books from Google Sheets', len(books))
+            return books, rows
             
         except Exception as e:
-            print(f"❌ Error loading books: {e}")
-            return []
+            logger.error('❌ Error loading books: %s', e)
+            return None
 
-    def get_available_books(self):
-        """Get only available books"""
-        all_books = self.get_all_books()
-        available = [book for book in all_books 
-                    if book.get('status', '').lower() == 'available' 
-                    and book.get('stock_quantity', 0) > 0]
-        print(f"📚 Available books: {len(available)}")
-        return available
-    
-    def get_book_by_id(self, book_id):
-        """Get specific book by ID"""
-        all_books = self.get_all_books()
-        book_id_str = str(book_id).strip()
+    def _parse_books(self, all_values):
+        """Parse the books sheet's values into (books, id -> row)"""
+        self.books_sync.reset(all_values)
+        if len(all_values) <= 1:
+            logger.debug('📚 No books in Google Sheet')
+            if all_values:
+                self.books_columns = {header: i + 1 for i, header in enumerate(all_values[0])}
+            return [], {}
+        
+        headers = all_values[0]
+        self.books_columns = {header: i + 1 for i, header in enumerate(headers)}
+        books = []
+        rows = {}
         
-        for book in all_books:
-            if str(book.get('id', '')).strip() == book_id_str:
-                return book
+        for row_index, row in enumerate(all_values[1:], start=2):
+            book = self._parse_book_row(row)
+            if book is not None:
+                books.append(book)
+                rows[book.id] = row_index
         
-        return None
+        self._apply_pending_stock(books)
+        return books, rows
+
+    def _parse_book_row(self, row):
+        """One books-sheet row as a BookRecord (None for a blank/short row)"""
+        if not row or len(row) < 4:
+            return None
+        
+        def cell(name, default=''):
+            # `default` stands in for a missing column, '' for a short row
+            i = self.books_columns.get(name)
+            if i is None:
+                return default
+            return row[i - 1] if i <= len(row) else ''
+        
+        # Parse stock quantity
+        try:
+            stock_qty = int(str(cell('stock_quantity', '1')).strip())
+        except ValueError:
+            stock_qty = 1
+        
+        return BookRecord(
+            id=str(cell('id')).strip(),
+            title=cell('title', 'Unknown Book'),
+            author=cell('author', 'Unknown Author'),
+            price=parse_price(cell('price', '0')) or 0.0,
+            condition=cell('condition', 'Good'),
+            isbn=cell('isbn'),
+            description=cell('description'),
+            category=cell('category'),
+            status=cell('status', 'Available'),
+            stock_quantity=stock_qty,
+            timestamp=cell('timestamp'),
+            image_url=cell('image_url').strip()
+        )
+
+    def _apply_pending_stock(self, books):
+        if self.write_behind:
+            # Queued stock changes are newer than what the sheet says
+            by_id = {book['id']: book for book in books}
+            for change in self.write_behind.pending('stock'):
+                book = by_id.get(change['book_id'])
+                if book:
+                    book['stock_quantity'], book['status'] = queued_stock(
+                        book.get('stock_quantity', 0), book.get('status', ''), change)
+
+    def _patch_books_from_sheet(self):
+        """Apply appended and edited rows to the catalog; False if a full reload is needed"""
+        delta = self.books_sync.fetch(self.books_sheet)
+        if delta is None:
+            return False
+        appended, changed = delta
+        
+        new_books = []
+        rows = {}
+        updated = []
+        for row_index, row in appended + changed:
+            book = self._parse_book_row(row)
+            if book is None:
+                continue
+            existing = self.catalog.find(book.id)
+            if existing is None:
+                new_books.append(book)
+                rows[book.id] = row_index
+            elif self.catalog.row_of(book.id) != row_index:
+                # Same id on another row - let a full reload sort it out
+                return False
+            else:
+                updated.append(book)
+        
+        self._apply_pending_stock(new_books + updated)
+        for book in updated:
+            fields = book.to_dict()
+            if fields != self.catalog.find(book.id).to_dict():
+                self.catalog.update_book(book.id, **fields)
+        if new_books:
+            self.catalog.add_books(new_books, rows)
+        if appended or changed:
+            logger.debug('📚 Patched catalog: %s new, %s re-read rows', len(appended), len(changed))
+        return True
+
+    def get_cache_stats(self):
+        """Catalog cache counters"""
+        stats = self.catalog.stats()
+        stats['storage'] = 'memory' if self.using_memory_storage else 'sheets'
+        if self.write_behind:
+            stats['write_behind'] = self.write_behind.stats()
+        if self.shared_catalog:
+            stats['shared_catalog'] = self.shared_catalog.stats()
+        if self.local_snapshot:
+            stats['local_snapshot'] = self.local_snapshot.stats()
+        stats['sheets_client'] = self.sheets_guard.stats()
+        return stats
+
+    def catalog_version(self):
+        """Current catalog version (refreshing the cache first if it expired)"""
+        self._ensure_book_index()
+        return self.catalog.version
+
+    def book_version(self, book_id):
+        self._ensure_book_index()
+        return self.catalog.book_version(book_id)
+
+    def add_book_listener(self, listener):
+        self.catalog.add_listener(listener)
+
+    def get_book_by_id(self, book_id):
+        """Get specific book by ID"""
+        self._ensure_book_index()
+        return self.catalog.find(book_id)
+
+    def _ensure_book_index(self):
+        """Make sure the catalog index covers the current book list"""
+        if self.using_memory_storage:
+            if self.catalog.books is not self.books_storage:
+                self.catalog.load(self.books_storage)
+            elif len(self.catalog.index) != len(self.books_storage):
+                self.catalog.reindex()
+        else:
+            self.get_all_books()
+
+    def _book_column(self, name, default):
+        """1-based column number of a books sheet header"""
+        return self.books_columns.get(name, default)
     
     def update_book_status(self, book_id, new_status):
         """Update book status"""
+        self._ensure_book_index()
+        if not self.catalog.find(book_id):
+            return False
+        return self._write_stock({str(book_id).strip(): {'status': new_status}})
+    
+    def add_books(self, books):
+        """Append new listings with one append_rows call.
+
+        Books without an id get a new time-sortable one (`BK_...`); other
+        workers append to the same sheet, so ids can't be counted up from
+        this process's catalog. The new rows are added to the catalog in
+        place (search, feed and caches update incrementally) instead of
+        forcing a reload of the sheet.
+        """
+        if not books:
+            return True
+        self._ensure_book_index()
+
+        for book in books:
+            if not str(book.get('id', '')).strip():
+                book['id'] = new_id('BK_')
+
         if self.using_memory_storage:
-            for book in self.books_storage:
-                if str(book.get('id')).strip() == str(book_id).strip():
-                    book['status'] = new_status
-                    return True
+            # The catalog list is books_storage itself
+            self.catalog.add_books(books)
+            return True
+
+        if not self.books_sheet:
             return False
-        
+
+        columns = sorted(self.books_columns, key=self.books_columns.get) or BOOK_FIELDS
         try:
-            if not self.books_sheet:
-                return False
+            response = self.books_sheet.append_rows(
+                [[book.get(column, '') for column in columns] for book in books])
+        except Exception as e:
+            logger.error('❌ Error adding books: %s', e)
+            return False
+
+        first_row = self._appended_row(response)
+        if first_row is None:
+            # Row numbers unknown, so stock writes need a fresh load
+            self.catalog.add_books(books)
+            self.catalog.invalidate()
+        else:
+            self.catalog.add_books(books, {book['id']: first_row + i for i, book in enumerate(books)})
+        return True
+
+    def decrease_books_stock(self, items):
+        """Decrease stock for several books with a single batch_update.
+
+        `items` is a list of (book_id, quantity) pairs. Unlike
+        `reserve_stock` this trusts the cached stock and never rejects.
+        """
+        self._ensure_book_index()
+        wanted = self._sum_quantities(items)
+        
+        with self._locked_books(wanted):
+            changes = {}
+            for book_id, quantity in wanted.items():
+                book = self.catalog.find(book_id)
+                if not book:
+                    return False
+                new_stock = max(0, book.get('stock_quantity', 1) - quantity)
+                changes[book_id] = {'stock_quantity': new_stock}
+                if new_stock == 0:
+                    changes[book_id]['status'] = 'Sold Out'
             
-            all_values = self.books_sheet.get_all_values()
-            headers = all_values[0]
-            status_col_index = headers.index('status') + 1 if 'status' in headers else 9
+            return self._write_stock(changes, {book_id: -quantity for book_id, quantity in wanted.items()})
+    
+    def reserve_stock(self, items):
+        """Compare-and-decrement stock for (book_id, quantity) pairs.
+
+        Each involved book is locked across the host's worker processes
+        (see `_locked_books`) and its stock/status cells are re-read from
+        the sheet before the decrement is written, so a checkout never
+        trusts a stale cached stock level and two workers can't both sell
+        the last copy. Returns
+        `(reserved, failures)`: book id -> quantity taken, and book id ->
+        reason for the books that could not be reserved.
+        """
+        self._ensure_book_index()
+        wanted = self._sum_quantities(items)
+        reserved = {}
+        failures = {}
+        
+        with self._locked_books(wanted):
+            current = self._current_stock(wanted)
+            if current is None:
+                return {}, {book_id: 'could not be verified' for book_id in wanted}
             
-            for row_index, row in enumerate(all_values[1:], start=2):
-                if len(row) > 0 and str(row[0]).strip() == str(book_id).strip():
-                    self.books_sheet.update_cell(row_index, status_col_index, new_status)
-                    return True
+            changes = {}
+            for book_id, quantity in wanted.items():
+                if book_id not in current:
+                    failures[book_id] = 'not found'
+                    continue
+                
+                stock, status = current[book_id]
+                if status.lower() != 'available':
+                    failures[book_id] = 'not available'
+                elif stock < quantity:
+                    failures[book_id] = f'only {stock} in stock'
+                else:
+                    reserved[book_id] = quantity
+                    changes[book_id] = {'stock_quantity': stock - quantity}
+                    if stock == quantity:
+                        changes[book_id]['status'] = 'Sold Out'
             
-            return False
-        except Exception as e:
-            print(f"❌ Error updating status: {e}")
-            return False
+            deltas = {book_id: -quantity for book_id, quantity in reserved.items()}
+            if changes and not self._write_stock(changes, deltas):
+                return {}, {book_id: 'could not be reserved' for book_id in wanted}
+        
+        return reserved, failures
     
-    def decrease_book_stock(self, book_id, quantity=1):
-        """Decrease book stock"""
+    def release_stock(self, reserved):
+        """Give back stock taken by `reserve_stock` (book id -> quantity)"""
+        if not reserved:
+            return True
+        
+        with self._locked_books(reserved):
+            current = self._current_stock(reserved)
+            if current is None:
+                return False
+            
+            changes = {}
+            for book_id, quantity in reserved.items():
+                if book_id not in current:
+                    continue
+                stock, status = current[book_id]
+                changes[book_id] = {'stock_quantity': stock + quantity}
+                if status == 'Sold Out':
+                    changes[book_id]['status'] = 'Available'
+            
+            return self._write_stock(changes, {book_id: reserved[book_id] for book_id in changes})
+    
+    @contextmanager
+    def _locked_books(self, book_ids):
+        """Hold the per-book locks for `book_ids`: this process's, taken in
+        sorted order, then the host-wide ones shared with the other workers"""
+        with self._book_locks_guard:
+            locks = [self._book_locks.setdefault(book_id, threading.Lock())
+                     for book_id in sorted(book_ids)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self.host_locks.held(book_ids):
+                yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+    
+    def _current_stock(self, book_ids):
+        """Authoritative (stock, status) per book; None if the sheet can't be read.
+
+        With write-behind enabled the stock changes still queued (by any
+        worker) are applied on top of the sheet's values.
+        """
         if self.using_memory_storage:
-            for book in self.books_storage:
-                if str(book.get('id')).strip() == str(book_id).strip():
-                    current_stock = book.get('stock_quantity', 1)
-                    new_stock = max(0, current_stock - quantity)
-                    book['stock_quantity'] = new_stock
-                    
-                    if new_stock == 0:
-                        book['status'] = 'Sold Out'
-                    return True
-            return False
+            current = {}
+            for book_id in book_ids:
+                book = self.catalog.find(book_id)
+                if book:
+                    current[book_id] = (book.get('stock_quantity', 0), book.get('status', ''))
+            return current
         
+        current = self._read_stock(book_ids)
+        if current is None:
+            return None
+        if self.write_behind:
+            for change in self.write_behind.pending('stock'):
+                if change['book_id'] in current:
+                    current[change['book_id']] = queued_stock(*current[change['book_id']], change)
+        for book_id, (stock, status) in current.items():
+            # Let the cache converge on what the sheet says
+            self.catalog.update_book(book_id, stock_quantity=stock, status=status)
+        return current
+    
+    def _read_stock(self, book_ids):
+        """(stock, status) per book from the sheet's cells; None if they can't be read"""
         try:
             if not self.books_sheet:
-                return False
+                return None
             
-            all_values = self.books_sheet.get_all_values()
-            headers = all_values[0]
+            stock_col = self._book_column('stock_quantity', 10)
+            status_col = self._book_column('status', 9)
+            located = [(book_id, self.catalog.row_of(book_id)) for book_id in book_ids]
+            located = [(book_id, row_index) for book_id, row_index in located if row_index]
+            if not located:
+                return {}
             
-            stock_col_index = headers.index('stock_quantity') + 1 if 'stock_quantity' in headers else 10
-            status_col_index = headers.index('status') + 1 if 'status' in headers else 9
+            ranges = []
+            for book_id, row_index in located:
+                ranges.append(rowcol_to_a1(row_index, stock_col))
+                ranges.append(rowcol_to_a1(row_index, status_col))
+            values = self.books_sheet.batch_get(ranges)
             
-            for row_index, row in enumerate(all_values[1:], start=2):
-                if len(row) > 0 and str(row[0]).strip() == str(book_id).strip():
-                    try:
-                        current_stock = int(row[stock_col_index - 1]) if len(row) >= stock_col_index else 1
-                    except:
-                        current_stock = 1
-                    
-                    new_stock = max(0, current_stock - quantity)
-                    
-                    self.books_sheet.update_cell(row_index, stock_col_index, new_stock)
-                    
-                    if new_stock == 0:
-                        self.books_sheet.update_cell(row_index, status_col_index, 'Sold Out')
-                    
-                    return True
-            
-            return False
+            current = {}
+            for i, (book_id, row_index) in enumerate(located):
+                stock_cell = values[2 * i]
+                status_cell = values[2 * i + 1]
+                try:
+                    stock = int(str(stock_cell[0][0]).strip())
+                except (IndexError, ValueError):
+                    stock = 1
+                status = str(status_cell[0][0]).strip() if status_cell and status_cell[0] else 'Available'
+                current[book_id] = (stock, status)
+            return current
         except Exception as e:
-            print(f"❌ Error decreasing stock: {e}")
-            return False
+            logger.error('❌ Error reading stock: %s', e)
+            return None
+    
+    def _write_stock(self, changes, deltas=None):
+        """Write stock/status changes (book id -> fields) in one batch_update.
+
+        `deltas` (book id -> stock change) is what write-behind queues for
+        those books instead of the absolute fields: another worker may
+        queue changes to the same book before the flush.
+        """
+        if not changes:
+            return True
+        
+        if self.write_behind and not self.using_memory_storage:
+            for book_id, fields in changes.items():
+                self.catalog.update_book(book_id, **fields)
+                if deltas and book_id in deltas:
+                    self.write_behind.enqueue('stock', {'book_id': book_id, 'stock_delta': deltas[book_id]},
+                                              key=book_id, add=('stock_delta',))
+                else:
+                    self.write_behind.enqueue('stock', dict(fields, book_id=book_id), key=book_id)
+            return True
+        
+        if not self.using_memory_storage:
+            try:
+                if not self.books_sheet:
+                    return False
+                
+                data, missing = self._stock_cell_updates(changes)
+                if missing:
+                    return False
+                
+                self.books_sheet.batch_update(data, raw=False)
+            except Exception as e:
+                logger.error('❌ Error writing stock: %s', e)
+                return False
+        
+        for book_id, fields in changes.items():
+            self.catalog.update_book(book_id, **fields)
+        return True
+    
+    def _stock_cell_updates(self, changes):
+        """batch_update payload for stock/status changes, plus ids with no known row"""
+        stock_col = self._book_column('stock_quantity', 10)
+        status_col = self._book_column('status', 9)
+        data = []
+        missing = []
+        for book_id, fields in changes.items():
+            row_index = self.catalog.row_of(book_id)
+            if not row_index:
+                missing.append(book_id)
+                continue
+            if 'stock_quantity' in fields:
+                data.append({'range': rowcol_to_a1(row_index, stock_col),
+                             'values': [[fields['stock_quantity']]]})
+            if 'status' in fields:
+                data.append({'range': rowcol_to_a1(row_index, status_col),
+                             'values': [[fields['status']]]})
+        return data, missing
     
     def save_user_info(self, user_data):
         """Save or update user information"""
+        user_email = user_data.get('email')
+        existing = self.get_user_info(user_email)
+        if existing:
+            if self._same_profile(existing, user_data):
+                return True
+            user_data = dict(user_data, created_at=existing.get('created_at') or user_data.get('created_at', ''))
+        
         if self.using_memory_storage:
-            self.users_storage = [u for u in self.users_storage 
-                                 if u.get('email') != user_data.get('email')]
-            self.users_storage.append(user_data)
+            self.users_storage[user_email] = user_data
             return True
         
+        if self.write_behind:
+            self.user_index.put(user_data)
+            self.write_behind.enqueue('user', user_data, key=user_email)
+            return True
+        
+        return self._write_user_to_sheet(user_data)
+    
+    def _write_user_to_sheet(self, user_data):
+        """Overwrite the user's row in the users sheet, or append one"""
         try:
             if not self.users_sheet:
                 return False
             
-            all_values = self.users_sheet.get_all_values()
-            user_email = user_data.get('email')
-            user_exists = False
-            row_index = None
-            
-            for i, row in enumerate(all_values[1:], start=2):
-                if len(row) > 1 and row[1] == user_email:
-                    user_exists = True
-                    row_index = i
-                    break
+            self._ensure_user_index()
+            row_data = [user_data.get(field, '') for field in USER_FIELDS]
+            row_index = self.user_index.row_of(user_data.get('email'))
             
-            row_data = [
-                user_data.get('user_id', ''),
-                user_data.get('email', ''),
-                user_data.get('name', ''),
-                user_data.get('phone', ''),
-                user_data.get('address_line1', ''),
-                user_data.get('address_line2', ''),
-                user_data.get('city', ''),
-                user_data.get('state', ''),
-                user_data.get('zip_code', ''),
-                user_data.get('created_at', ''),
-                user_data.get('updated_at', '')
-            ]
-            
-            if user_exists and row_index:
-                self.users_sheet.update(f'A{row_index}:K{row_index}', [row_data])
+            if row_index:
+                self.users_sheet.update(
+                    range_name=f'A{row_index}:{rowcol_to_a1(row_index, len(USER_FIELDS))}',
+                    values=[row_data])
             else:
-                self.users_sheet.append_row(row_data)
+                response = self.users_sheet.append_row(row_data)
+                row_index = self._appended_row(response)
+                if not row_index:
+                    # Can't tell where it landed; find it on the next read
+                    self.user_index.invalidate()
             
+            self.user_index.put(user_data, row_index)
             return True
             
         except Exception as e:
-            print(f"❌ Error saving user: {e}")
+            logger.error('❌ Error saving user: %s', e)
             return False
     
+    def _appended_row(self, response):
+        """Row number written by append_row, from the API's updatedRange"""
+        try:
+            updated_range = response['updates']['updatedRange']
+            match = re.search(r'[A-Z]+(\d+)', updated_range.split('!')[-1])
+            return int(match.group(1)) if match else None
+        except (KeyError, TypeError):
+            return None
+    
+    def _ensure_user_index(self):
+        """(Re)load the email -> (profile, row) index when stale"""
+        if self.user_index.is_fresh() or self._serving_stale(self.user_index):
+            return
+        
+        with self.user_index.lock:
+            if self.user_index.is_fresh():
+                return
+            self.user_index.load(self._parse_users(self.users_sheet.get_all_values()))
+    
+    def _serving_stale(self, index):
+        """True when `index` has data and Sheets is down, so it should be used as is"""
+        return index.loaded_at is not None and self.sheets_guard.is_open()
+    
+    def _parse_users(self, all_values):
+        """(profile, row) pairs from the users sheet plus queued saves"""
+        headers = all_values[0] if all_values else USER_FIELDS
+        entries = []
+        for row_index, row in enumerate(all_values[1:], start=2):
+            profile = {header: row[i] if i < len(row) else '' for i, header in enumerate(headers)}
+            entries.append((profile, row_index))
+        if self.write_behind:
+            # Queued saves are newer than the sheet; keep their rows
+            rows = {p.get('email'): r for p, r in entries}
+            entries += [(p, rows.get(p.get('email'))) for p in self.write_behind.pending('user')]
+        return entries
+    
     def get_user_info(self, user_email):
         """Get user information by email"""
         if self.using_memory_storage:
-            return next((u for u in self.users_storage if u.get('email') == user_email), None)
+            # Profiles restored from the local snapshot back up memory storage
+            return self.users_storage.get(user_email) or self.user_index.get(user_email)
         
         try:
             if not self.users_sheet:
                 return None
             
-            records = self.users_sheet.get_all_records()
-            return next((r for r in records if r.get('email') == user_email), None)
+            self._ensure_user_index()
+            return self.user_index.get(user_email)
         except Exception as e:
-            print(f"❌ Error getting user: {e}")
+            logger.error('❌ Error getting user: %s', e)
             return None
     
-    def add_order(self, order_data):
-        """Add a new order"""
-        if self.using_memory_storage:
-            self.orders_storage.append(order_data)
+    def _order_row(self, order_data):
+        """Orders sheet row for an order dict"""
+        return [order_data.get(field, '') for field in ORDER_FIELDS]
+    
+    def add_orders(self, orders):
+        """Add several orders with a single append"""
+        if not orders:
             return True
         
-        try:
-            if not self.orders_sheet:
+        if self.using_memory_storage:
+            self.orders_storage.extend(orders)
+        elif self.write_behind:
+            for order in orders:
+                self.write_behind.enqueue('orders', order)
+        else:
+            try:
+                if not self.orders_sheet:
+                    return False
+                
+                self.orders_sheet.append_rows([self._order_row(o) for o in orders])
+            except Exception as e:
+                logger.error('❌ Error adding order: %s', e)
                 return False
-            
-            row_data = [
-                order_data.get('order_id', ''),
-                order_data.get('user_id', ''),
-                order_data.get('user_email', ''),
-                order_data.get('book_id', ''),
-                order_data.get('book_title', ''),
-                order_data.get('quantity', ''),
-                order_data.get('total_price', ''),
-                order_data.get('full_name', ''),
-                order_data.get('phone', ''),
-                order_data.get('address_line1', ''),
-                order_data.get('address_line2', ''),
-                order_data.get('city', ''),
-                order_data.get('state', ''),
-                order_data.get('zip_code', ''),
-                order_data.get('payment_method', ''),
-                order_data.get('status', ''),
-                order_data.get('created_at', '')
-            ]
-            
-            self.orders_sheet.append_row(row_data)
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error adding order: {e}")
-            return False
+        
+        for order in orders:
+            self.order_index.add(order)
+        return True
     
-    def get_user_orders(self, user_email):
-        """Get orders by user email"""
-        if self.using_memory_storage:
-            orders = [o for o in self.orders_storage if o.get('user_email') == user_email]
-            return sorted(orders, key=lambda x: x.get('created_at', ''), reverse=True)
+    def get_user_orders_page(self, user_email, limit=None, cursor=None):
+        """Newest-first orders for a user plus the cursor of the next page"""
+        self._ensure_order_index()
+        return self.order_index.get(user_email, limit=limit, cursor=cursor)
+    
+    def _ensure_order_index(self):
+        """(Re)load the per-user order index from the orders sheet when stale"""
+        if (self.using_memory_storage or self.order_index.is_fresh()
+                or self._serving_stale(self.order_index)):
+            return
         
-        try:
-            if not self.orders_sheet:
-                return []
+        with self.order_index.lock:
+            if self.order_index.is_fresh():
+                return
+            try:
+                if not self.orders_sheet:
+                    return
+                self._refresh_order_index()
+            except Exception as e:
+                logger.error('❌ Error getting orders: %s', e)
+    
+    def _refresh_order_index(self):
+        with self.order_index.lock:
+            # Orders are append-only in practice: fetch just the new rows
+            delta = self.orders_sync.fetch(self.orders_sheet) if self.order_index.loaded_at else None
+            if delta is not None and not delta[1]:
+                for _, row in delta[0]:
+                    self.order_index.add(self._order_record(self.orders_sync.headers, row))
+                self.order_index.mark_fresh()
+                return
             
-            records = self.orders_sheet.get_all_records()
-            user_orders = [r for r in records if r.get('user_email') == user_email]
-            return sorted(user_orders, key=lambda x: x.get('created_at', ''), reverse=True)
-        except Exception as e:
-            print(f"❌ Error getting orders: {e}")
-            return []
+            self.order_index.load(self._parse_orders(self.orders_sheet.get_all_values()))
+    
+    def _parse_orders(self, all_values):
+        """Order records (numbers parsed like get_all_records) plus queued orders"""
+        self.orders_sync.reset(all_values)
+        records = []
+        if all_values:
+            headers = all_values[0]
+            records = [self._order_record(headers, row) for row in all_values[1:]]
+        if self.write_behind:
+            records += self.write_behind.pending('orders')
+        return records
+    
+    def _order_record(self, headers, row):
+        row = list(row) + [''] * (len(headers) - len(row))
+        return dict(zip(headers, numericise_all(row[:len(headers)])))
+    
+    # Write-behind flush handlers (called from the queue worker)
+    def _flush_orders(self, orders):
+        if not self.orders_sheet:
+            return False
+        self.orders_sheet.append_rows([self._order_row(o) for o in orders])
+        return True
+    
+    def _flush_stock(self, changes):
+        """Apply queued stock changes to the sheet's current values (the books are locked)"""
+        if not self.books_sheet:
+            return False
+        self._ensure_book_index()
+        current = self._read_stock({change['book_id'] for change in changes})
+        if current is None:
+            return False
+        for change in changes:
+            if change['book_id'] not in current:
+                logger.warning('⚠️  Dropping queued stock change for unknown book %s', change['book_id'])
+                continue
+            current[change['book_id']] = queued_stock(*current[change['book_id']], change)
+        data, _ = self._stock_cell_updates(
+            {book_id: {'stock_quantity': stock, 'status': status}
+             for book_id, (stock, status) in current.items()})
+        if data:
+            self.books_sheet.batch_update(data, raw=False)
+        return True
+    
+    def _flush_users(self, users):
+        return all(self._write_user_to_sheet(user_data) for user_data in users)
+
+
+def create_db():
+    """Build the storage backend selected by SWAPLY_STORAGE (sheets or sqlite)"""
+    backend = os.getenv('SWAPLY_STORAGE', 'sheets').lower()
+    
+    if backend == 'sqlite':
+        from utils.sqlite_store import SQLiteStorage
+        sync_target = GoogleSheetsDB() if os.getenv('SWAPLY_SHEETS_SYNC', '0') == '1' else None
+        return SQLiteStorage(os.getenv('SWAPLY_SQLITE_PATH', 'swaply.db'), sync_target=sync_target)
+    
+    return GoogleSheetsDB()
 
 # Global instance - this will now start without blocking
-db = GoogleSheetsDB()
\ No newline at end of file
+db = create_db()
\ No newline at end of file
@@ -0,0 +1,225 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from google.auth.exceptions import TransportError
+from gspread.exceptions import APIError
+from requests.adapters import HTTPAdapter
+
+from utils.write_behind import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: quota (429) and Google-side hiccups
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+# Calls that add rows; retrying one that reached Sheets would duplicate rows
+NON_IDEMPOTENT = {'append_row', 'append_rows', 'insert_row', 'insert_rows', 'add_rows'}
+
+# Sheets has separate per-minute quotas for reads and writes
+WRITE_METHODS = NON_IDEMPOTENT | {'update', 'update_cell', 'update_cells', 'batch_update',
+                                  'clear', 'batch_clear', 'delete_rows'}
+
+
+class SheetsUnavailable(Exception):
+    """Sheets is not being called: the circuit is open or the quota is used up"""
+
+
+def _status(error):
+    if isinstance(error, APIError):
+        return error.code
+    return None
+
+
+def is_transient(error):
+    """True for errors a retry (or a later call) may not hit again"""
+    if isinstance(error, APIError):
+        return error.code in TRANSIENT_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, TransportError))
+
+
+def configure_session(client, pool_size=20, timeout=20):
+    """Size the client's keep-alive connection pool and set a request timeout.
+
+    gspread talks to Google through one `requests` session, whose default
+    pool keeps only 10 connections per host; with more request threads
+    than that, extra connections are closed after each call and the next
+    one pays for a new TLS handshake.
+    """
+    http_client = getattr(client, 'http_client', None)
+    if http_client is None:
+        return
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http_client.session.mount('https://', adapter)
+    if timeout:
+        http_client.set_timeout(timeout)
+
+
+class CircuitBreaker:
+    """Stops calling Sheets after `threshold` failed calls in a row.
+
+    While open, calls fail straight away with SheetsUnavailable. After
+    `reset_timeout` seconds one call is let through as a probe (half
+    open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        """True while calls are being refused (and it isn't time to probe yet)"""
+        with self.lock:
+            if self.state == 'closed':
+                return False
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.probing
+
+    def allow(self):
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half_open'
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def release(self):
+        """Give up a probe slot without a verdict (the call was never made)"""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info('✅ Google Sheets reachable again - circuit closed')
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state == 'closed':
+                    self.times_opened += 1
+                    logger.warning('⚠️  Google Sheets failing - circuit open, serving cached data for %ss',
+                                   self.reset_timeout)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class SheetsGuard:
+    """Rate limit, retry and circuit-break every call to one Sheets client.
+
+    Calls first take a token from the read or write bucket, each sized to
+    that Sheets quota, so bursts queue briefly in-process instead of
+    coming back as 429s; a caller that would wait more than `max_wait` seconds gets
+    SheetsUnavailable instead. Transient failures (429, 5xx, connection
+    errors and timeouts) are retried with full-jitter exponential backoff;
+    calls that append rows are only retried on 429, which Google returns
+    before doing any work. A call that still fails counts against the
+    circuit breaker.
+    """
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, retries=3, base_delay=0.5,
+                 max_delay=8.0, max_wait=5.0, breaker=None):
+        self.buckets = {}
+        self.set_rate(reads_per_minute, writes_per_minute)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def set_rate(self, reads_per_minute, writes_per_minute):
+        """Change the call budgets; 0 or None disables that limit"""
+        self.buckets = {kind: self._bucket(per_minute) for kind, per_minute
+                        in (('read', reads_per_minute), ('write', writes_per_minute))}
+
+    def _bucket(self, per_minute):
+        if not per_minute:
+            return None
+        # Burst plus a minute of refill must stay within the per-minute quota
+        burst = max(1, per_minute // 4)
+        return TokenBucket(max(1, per_minute - burst), burst=burst)
+
+    def is_open(self):
+        return self.breaker.is_open()
+
+    def call(self, name, fn, *args, **kwargs):
+        """Call `fn` under the guard; `name` is the gspread method (for the retry policy)"""
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise SheetsUnavailable('Google Sheets circuit is open')
+
+        bucket = self.buckets.get('write' if name in WRITE_METHODS else 'read')
+        attempt = 0
+        while True:
+            if bucket and not bucket.take(timeout=self.max_wait):
+                self.rejected += 1
+                self.breaker.release()
+                raise SheetsUnavailable('Google Sheets call budget exhausted')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # The service answered; the request itself was wrong
+                    self.breaker.record_success()
+                    raise
+                retryable = name not in NON_IDEMPOTENT or _status(e) == 429
+                if not retryable or attempt >= self.retries:
+                    self.failed += 1
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.retried += 1
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.debug('🔁 Retrying %s in %.2fs after: %s', name, delay, e)
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        return {
+            'circuit': self.breaker.state,
+            'circuit_opened': self.breaker.times_opened,
+            'retries': self.retried,
+            'failures': self.failed,
+            'rejected': self.rejected
+        }
+
+
+class GuardedSheet:
+    """Wraps a gspread worksheet/spreadsheet so every API call goes through a SheetsGuard"""
+
+    def __init__(self, target, guard):
+        self._target = target
+        self._guard = guard
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._guard.call(name, attr, *args, **kwargs)
+        return call
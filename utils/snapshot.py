@@ -0,0 +1,128 @@
+import atexit
+import logging
+import os
+import pickle
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout below changes; older files are ignored
+FORMAT = 1
+
+
+class LocalSnapshot:
+    """The parsed catalog, users and orders indexes, kept in a local file.
+
+    While the app is connected to Google Sheets a background thread saves
+    the indexes (and the delta-sync checksums) every `interval` seconds
+    when they changed, and once more at exit, as one pickle swapped in
+    with an atomic rename. On the next boot `load()` restores them before
+    the Sheets connection starts, so pages are served from the snapshot
+    right away; once connected, the storage backend reconciles it with the
+    sheets (version probe, then only the changed rows).
+    """
+
+    def __init__(self, db, path, interval=60.0):
+        self.db = db
+        self.path = path
+        self.interval = interval
+        self.saved_key = None
+        self.saved_at = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        atexit.register(self._save_if_changed)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._save_if_changed()
+            except Exception as e:
+                logger.error('❌ Saving the local snapshot failed: %s', e)
+
+    def _change_key(self):
+        db = self.db
+        return (db.catalog.version, db.catalog.source_version, db.order_index.added,
+                db.order_index.loaded_at, db.user_index.loaded_at, len(db.user_index.profiles))
+
+    def _save_if_changed(self):
+        db = self.db
+        if db.state != 'ready' or (db.shared_catalog and not db.shared_catalog.is_leader):
+            # Only a worker reading Sheets itself has something worth keeping
+            return
+        if self._change_key() != self.saved_key:
+            self.save()
+
+    def save(self):
+        """Atomically replace the snapshot file with the current indexes"""
+        db = self.db
+        with self.lock:
+            key = self._change_key()
+            with db.catalog.lock:
+                books = {
+                    'books': list(db.catalog.books),
+                    'rows': dict(db.catalog.rows),
+                    'columns': dict(db.books_columns),
+                    'source_version': db.catalog.source_version,
+                    'sync': db.books_sync.state()
+                }
+            with db.order_index.lock:
+                orders = {'records': db.order_index.orders(), 'sync': db.orders_sync.state()}
+            snapshot = {
+                'format': FORMAT,
+                'saved_at': time.time(),
+                'books': books,
+                'users': db.user_index.entries(),
+                'orders': orders
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.saved_key = key
+            self.saved_at = snapshot['saved_at']
+        logger.debug('💾 Saved local snapshot (%s books)', len(books['books']))
+
+    def load(self):
+        """Restore the indexes from the snapshot file; False if there is none"""
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            logger.warning('⚠️  Could not read the local snapshot: %s', e)
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get('format') != FORMAT:
+            logger.warning('⚠️  Ignoring local snapshot in an old format')
+            return False
+
+        db = self.db
+        books = snapshot['books']
+        db.books_columns = books['columns']
+        db.books_sync.restore(books['sync'])
+        db.books_storage = books['books']
+        db.catalog.load(db.books_storage, books['rows'], source_version=books['source_version'])
+        db.user_index.load(snapshot['users'])
+        db.orders_sync.restore(snapshot['orders']['sync'])
+        db.order_index.load(snapshot['orders']['records'])
+
+        self.loaded_at = self.saved_at = snapshot['saved_at']
+        logger.info('✅ Restored %s books, %s users and %s orders from the local snapshot in %.0fms',
+                    len(db.books_storage), len(snapshot['users']), len(snapshot['orders']['records']),
+                    (time.perf_counter() - started) * 1000)
+        return True
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'restored': self.loaded_at is not None,
+            'age_seconds': round(time.time() - self.saved_at, 1) if self.saved_at else None
+        }
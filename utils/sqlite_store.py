@@ -0,0 +1,414 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.storage import StorageBackend, BOOK_FIELDS, USER_FIELDS, ORDER_FIELDS
+from utils.search import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    author TEXT,
+    price REAL DEFAULT 0,
+    condition TEXT,
+    isbn TEXT,
+    description TEXT,
+    category TEXT,
+    status TEXT DEFAULT 'Available',
+    stock_quantity INTEGER DEFAULT 1,
+    timestamp TEXT,
+    image_url TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    user_id TEXT,
+    name TEXT,
+    phone TEXT,
+    address_line1 TEXT,
+    address_line2 TEXT,
+    city TEXT,
+    state TEXT,
+    zip_code TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT,
+    user_id TEXT,
+    user_email TEXT,
+    book_id TEXT,
+    book_title TEXT,
+    quantity INTEGER,
+    total_price REAL,
+    full_name TEXT,
+    phone TEXT,
+    address_line1 TEXT,
+    address_line2 TEXT,
+    city TEXT,
+    state TEXT,
+    zip_code TEXT,
+    payment_method TEXT,
+    status TEXT,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_email, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+
+INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_version', 0);
+"""
+
+# Fields a Sheets pull may overwrite on books we already hold; stock and
+# status are owned by this store once a book has been imported.
+CATALOG_FIELDS = [f for f in BOOK_FIELDS if f not in ('id', 'status', 'stock_quantity')]
+
+
+class SQLiteStorage(StorageBackend):
+    """Durable local storage in an embedded SQLite database (WAL mode).
+
+    Safe to share between gunicorn workers: every process opens the same
+    file and SQLite serialises writers. Stock reservation runs inside a
+    `BEGIN IMMEDIATE` transaction, so the check and the decrement are
+    atomic across processes.
+
+    When `sync_target` (a `GoogleSheetsDB`) is given, writes are mirrored
+    to it and new books are pulled from it every SWAPLY_SYNC_INTERVAL
+    seconds.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path='swaply.db', sync_target=None):
+        self.path = path
+        self.sync_target = sync_target
+        self._local = threading.local()
+        self.sync_interval = int(os.getenv('SWAPLY_SYNC_INTERVAL', '300'))
+
+        self._conn().executescript(SCHEMA)
+        logger.info('✅ SQLite storage ready (%s)', self.path)
+
+    def start(self, wait=False, timeout=None):
+        """Start the Sheets mirror, if any; SQLite itself is ready immediately"""
+        if self.sync_target is not None and self.sync_target.state == 'idle':
+            self.sync_target.start(wait=wait, timeout=timeout)
+            self._start_sync_thread()
+        return self
+
+    def readiness(self):
+        status = super().readiness()
+        if self.sync_target is not None:
+            status['sync'] = self.sync_target.readiness()
+        return status
+
+    def _conn(self):
+        """Per-thread connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding the database write lock from the start"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    # Books
+    def get_all_books(self):
+        """Get all books"""
+        rows = self._conn().execute('SELECT * FROM books ORDER BY rowid').fetchall()
+        return [dict(row) for row in rows]
+
+    def get_available_books(self):
+        """Get only available books"""
+        rows = self._conn().execute(
+            "SELECT * FROM books WHERE lower(status) = 'available' AND stock_quantity > 0 "
+            "ORDER BY rowid").fetchall()
+        return [dict(row) for row in rows]
+
+    def get_book_by_id(self, book_id):
+        """Get specific book by ID"""
+        row = self._conn().execute('SELECT * FROM books WHERE id = ?',
+                                   (str(book_id).strip(),)).fetchone()
+        return dict(row) if row else None
+
+    def import_books(self, books, overwrite_stock=False):
+        """Upsert parsed book dicts; returns how many were written"""
+        fields = BOOK_FIELDS
+        updated = CATALOG_FIELDS + (['status', 'stock_quantity'] if overwrite_stock else [])
+        sql = (f"INSERT INTO books ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) "
+               f"ON CONFLICT(id) DO UPDATE SET "
+               + ', '.join(f'{f} = excluded.{f}' for f in updated))
+        rows = [tuple(book.get(f, '') for f in fields) for book in books if book.get('id')]
+        with self._transaction() as conn:
+            conn.executemany(sql, rows)
+            version = self._bump_catalog_version(conn)
+        self._notify_books('reset', None, version)
+        return len(rows)
+
+    def add_books(self, books):
+        """Insert new listings in one transaction, assigning free numeric ids"""
+        if not books:
+            return True
+        try:
+            with self._transaction() as conn:
+                next_id = conn.execute(
+                    "SELECT coalesce(max(CAST(id AS INTEGER)), 0) + 1 FROM books "
+                    "WHERE id NOT GLOB '*[^0-9]*'").fetchone()[0]
+                for book in books:
+                    if not str(book.get('id', '')).strip():
+                        book['id'] = str(next_id)
+                        next_id += 1
+                conn.executemany(
+                    f"INSERT INTO books ({', '.join(BOOK_FIELDS)}) VALUES ({', '.join('?' * len(BOOK_FIELDS))})",
+                    [tuple(book.get(f, '') for f in BOOK_FIELDS) for book in books])
+                version = self._bump_catalog_version(conn)
+        except sqlite3.Error as e:
+            logger.error('❌ Error adding books: %s', e)
+            return False
+        self._books_changed([book['id'] for book in books], version)
+        self._mirror('add_books', books)
+        return True
+
+    def catalog_version(self):
+        return self._conn().execute(
+            "SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()[0]
+
+    def _bump_catalog_version(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'")
+        return conn.execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()[0]
+
+    def _books_changed(self, book_ids, version):
+        """Tell book listeners about committed changes"""
+        books = [self.get_book_by_id(book_id) for book_id in book_ids]
+        self._notify_books('update', [book for book in books if book], version)
+
+    def update_book_status(self, book_id, new_status):
+        """Update book status"""
+        with self._transaction() as conn:
+            cur = conn.execute('UPDATE books SET status = ? WHERE id = ?',
+                               (new_status, str(book_id).strip()))
+            version = self._bump_catalog_version(conn)
+        if cur.rowcount:
+            self._books_changed([str(book_id).strip()], version)
+            self._mirror('update_book_status', book_id, new_status)
+        return cur.rowcount > 0
+
+    def decrease_books_stock(self, items):
+        """Decrease stock for several books in one transaction"""
+        wanted = self._sum_quantities(items)
+        ids = list(wanted)
+        with self._transaction() as conn:
+            found = conn.execute(f"SELECT count(*) FROM books WHERE id IN ({', '.join('?' * len(ids))})",
+                                 ids).fetchone()[0]
+            if found != len(ids):
+                return False
+            conn.executemany(
+                "UPDATE books SET stock_quantity = max(0, stock_quantity - ?), "
+                "status = CASE WHEN stock_quantity - ? <= 0 THEN 'Sold Out' ELSE status END "
+                "WHERE id = ?", [(quantity, quantity, book_id) for book_id, quantity in wanted.items()])
+            version = self._bump_catalog_version(conn)
+        self._books_changed(ids, version)
+        self._mirror('decrease_books_stock', list(wanted.items()))
+        return True
+
+    def reserve_stock(self, items):
+        """Compare-and-decrement stock for (book_id, quantity) pairs"""
+        wanted = self._sum_quantities(items)
+        with self._transaction() as conn:
+            reserved, failures = self._reserve(conn, wanted)
+            version = self._bump_catalog_version(conn)
+        if reserved:
+            self._books_changed(reserved, version)
+            self._mirror('decrease_books_stock', list(reserved.items()))
+        return reserved, failures
+
+    def _reserve(self, conn, wanted):
+        reserved = {}
+        failures = {}
+        for book_id, quantity in wanted.items():
+            row = conn.execute('SELECT stock_quantity, status FROM books WHERE id = ?',
+                               (book_id,)).fetchone()
+            if row is None:
+                failures[book_id] = 'not found'
+            elif str(row['status']).lower() != 'available':
+                failures[book_id] = 'not available'
+            elif row['stock_quantity'] < quantity:
+                failures[book_id] = f"only {row['stock_quantity']} in stock"
+            else:
+                new_stock = row['stock_quantity'] - quantity
+                conn.execute('UPDATE books SET stock_quantity = ?, status = ? WHERE id = ?',
+                             (new_stock, 'Sold Out' if new_stock == 0 else row['status'], book_id))
+                reserved[book_id] = quantity
+        return reserved, failures
+
+    def release_stock(self, reserved):
+        """Give back stock taken by `reserve_stock` (book id -> quantity)"""
+        with self._transaction() as conn:
+            for book_id, quantity in reserved.items():
+                conn.execute(
+                    "UPDATE books SET stock_quantity = stock_quantity + ?, "
+                    "status = CASE WHEN status = 'Sold Out' THEN 'Available' ELSE status END "
+                    "WHERE id = ?", (quantity, book_id))
+            version = self._bump_catalog_version(conn)
+        self._books_changed(reserved, version)
+        return True
+
+    def place_orders(self, orders):
+        """Reserve stock and insert the orders in a single transaction"""
+        wanted = self._sum_quantities([(o.get('book_id'), o.get('quantity', 1)) for o in orders])
+        try:
+            with self._transaction() as conn:
+                reserved, failures = self._reserve(conn, wanted)
+                placed = [o for o in orders if str(o.get('book_id')).strip() in reserved]
+                self._insert_orders(conn, placed)
+                version = self._bump_catalog_version(conn)
+        except sqlite3.Error as e:
+            logger.error('❌ Error placing orders: %s', e)
+            return [], [(o, 'could not be saved') for o in orders]
+
+        failed = [(o, failures.get(str(o.get('book_id')).strip(), 'could not be reserved'))
+                  for o in orders if str(o.get('book_id')).strip() not in reserved]
+        if placed:
+            self._books_changed(reserved, version)
+            self._mirror('add_orders', placed)
+            self._mirror('decrease_books_stock', list(reserved.items()))
+        return placed, failed
+
+    # Users
+    def save_user_info(self, user_data):
+        """Save or update user information"""
+        existing = self.get_user_info(user_data.get('email'))
+        if existing and self._same_profile(existing, user_data):
+            return True
+        
+        fields = USER_FIELDS
+        updated = [f for f in fields if f not in ('email', 'created_at')]
+        sql = (f"INSERT INTO users ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) "
+               f"ON CONFLICT(email) DO UPDATE SET "
+               + ', '.join(f'{f} = excluded.{f}' for f in updated))
+        try:
+            with self._transaction() as conn:
+                conn.execute(sql, tuple(user_data.get(f, '') for f in fields))
+        except sqlite3.Error as e:
+            logger.error('❌ Error saving user: %s', e)
+            return False
+        self._mirror('save_user_info', user_data)
+        return True
+
+    def get_user_info(self, user_email):
+        """Get user information by email"""
+        row = self._conn().execute('SELECT * FROM users WHERE email = ?', (user_email,)).fetchone()
+        return dict(row) if row else None
+
+    # Orders
+    def _insert_orders(self, conn, orders):
+        conn.executemany(
+            f"INSERT INTO orders ({', '.join(ORDER_FIELDS)}) VALUES ({', '.join('?' * len(ORDER_FIELDS))})",
+            [tuple(o.get(f, '') for f in ORDER_FIELDS) for o in orders])
+
+    def add_orders(self, orders):
+        """Add several orders in one transaction"""
+        if not orders:
+            return True
+        try:
+            with self._transaction() as conn:
+                self._insert_orders(conn, orders)
+        except sqlite3.Error as e:
+            logger.error('❌ Error adding order: %s', e)
+            return False
+        self._mirror('add_orders', orders)
+        return True
+
+    def get_user_orders_page(self, user_email, limit=None, cursor=None):
+        """Newest-first orders for a user plus the cursor of the next page"""
+        sql = 'SELECT rowid AS _rowid, * FROM orders WHERE user_email = ?'
+        params = [user_email]
+        if cursor:
+            created_at, rowid = decode_cursor(cursor, str, int)
+            sql += ' AND (created_at, rowid) < (?, ?)'
+            params += [created_at, rowid]
+        sql += ' ORDER BY created_at DESC, rowid DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        rows = [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]['created_at'], rows[-1]['_rowid']])
+        for row in rows:
+            del row['_rowid']
+        return rows, next_cursor
+
+    def get_cache_stats(self):
+        conn = self._conn()
+        return {
+            'storage': self.name,
+            'path': self.path,
+            'books': conn.execute('SELECT count(*) FROM books').fetchone()[0],
+            'users': conn.execute('SELECT count(*) FROM users').fetchone()[0],
+            'orders': conn.execute('SELECT count(*) FROM orders').fetchone()[0],
+            'sync_target': self.sync_target.name if self.sync_target else None
+        }
+
+    # Sheets sync
+    def _mirror(self, method, *args):
+        """Best-effort copy of a write to the sync target"""
+        if self.sync_target is None or self.sync_target.using_memory_storage:
+            return
+        try:
+            result = getattr(self.sync_target, method)(*args)
+            if result is False:
+                logger.warning('⚠️  Sheets sync failed for %s', method)
+        except Exception as e:
+            logger.warning('⚠️  Sheets sync failed for %s: %s', method, e)
+
+    def pull_books(self):
+        """Import new books (and catalog edits) from the sync target"""
+        if self.sync_target is None or self.sync_target.using_memory_storage:
+            return 0
+        books = self.sync_target.get_all_books()
+        count = self.import_books(books)
+        logger.info('✅ Synced %s books from Google Sheets', count)
+        return count
+
+    def _start_sync_thread(self):
+        def sync_loop():
+            while not self.sync_target.connection_attempted:
+                time.sleep(1)
+            while True:
+                try:
+                    self.pull_books()
+                except Exception as e:
+                    logger.error('❌ Error syncing books: %s', e)
+                time.sleep(self.sync_interval)
+
+        thread = threading.Thread(target=sync_loop)
+        thread.daemon = True
+        thread.start()
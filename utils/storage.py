@@ -0,0 +1,170 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+BOOK_FIELDS = ['id', 'title', 'author', 'price', 'condition', 'isbn',
+               'description', 'category', 'status', 'stock_quantity', 'timestamp', 'image_url']
+
+USER_FIELDS = ['user_id', 'email', 'name', 'phone', 'address_line1',
+               'address_line2', 'city', 'state', 'zip_code', 'created_at', 'updated_at']
+
+# Profile fields a checkout can change; a save with none of them changed is skipped
+PROFILE_FIELDS = ['name', 'phone', 'address_line1', 'address_line2', 'city', 'state', 'zip_code']
+
+ORDER_FIELDS = ['order_id', 'user_id', 'user_email', 'book_id', 'book_title',
+                'quantity', 'total_price', 'full_name', 'phone', 'address_line1',
+                'address_line2', 'city', 'state', 'zip_code', 'payment_method',
+                'status', 'created_at']
+
+# Checkout failures caused by storage trouble rather than by the book; retrying may succeed
+TRANSIENT_FAILURES = {'could not be verified', 'could not be reserved', 'could not be saved'}
+
+
+def is_transient_failure(reason):
+    return reason in TRANSIENT_FAILURES
+
+
+class StorageBackend:
+    """Interface shared by the storage engines behind `db`.
+
+    Backends implement the primitives; the composite operations below
+    are written in terms of them and can be overridden where an engine
+    can do better (e.g. a single transaction).
+    """
+
+    name = 'base'
+
+    # Lifecycle
+    def start(self, wait=False, timeout=None):
+        """Begin any background connection/warm-up; backends are usable before it ends"""
+        return self
+
+    def readiness(self):
+        """{'ready', 'writable', 'state', 'storage'} for the /readyz probe"""
+        return {'ready': True, 'writable': self.accepts_writes(), 'state': 'ready', 'storage': self.name}
+
+    def accepts_writes(self):
+        """False while a write would not reach the backend's durable storage"""
+        return True
+
+    # Books
+    def get_all_books(self):
+        raise NotImplementedError
+
+    def get_book_by_id(self, book_id):
+        raise NotImplementedError
+
+    def update_book_status(self, book_id, new_status):
+        raise NotImplementedError
+
+    def add_books(self, books):
+        """Store new listings, assigning ids to books without one; returns success"""
+        raise NotImplementedError
+
+    def decrease_books_stock(self, items):
+        raise NotImplementedError
+
+    def reserve_stock(self, items):
+        raise NotImplementedError
+
+    def release_stock(self, reserved):
+        raise NotImplementedError
+
+    # Users
+    def save_user_info(self, user_data):
+        raise NotImplementedError
+
+    def get_user_info(self, user_email):
+        raise NotImplementedError
+
+    # Orders
+    def add_orders(self, orders):
+        raise NotImplementedError
+
+    def get_user_orders_page(self, user_email, limit=None, cursor=None):
+        """Newest-first orders for a user plus the cursor of the next page"""
+        raise NotImplementedError
+
+    def get_cache_stats(self):
+        return {'storage': self.name}
+
+    def _same_profile(self, existing, user_data):
+        """True when saving `user_data` would not change the stored profile"""
+        return all(str(existing.get(f, '') or '') == str(user_data.get(f, '') or '')
+                   for f in PROFILE_FIELDS)
+
+    def catalog_version(self):
+        """Counter that changes whenever any book changes"""
+        raise NotImplementedError
+
+    def book_version(self, book_id):
+        """Counter that changes whenever `book_id` changes (and maybe more often)"""
+        return self.catalog_version()
+
+    def add_book_listener(self, listener):
+        """Register `listener(event, books, version)`; see `BookCatalog.add_listener`"""
+        if not hasattr(self, '_book_listeners'):
+            self._book_listeners = []
+        self._book_listeners.append(listener)
+
+    def _notify_books(self, event, books, version):
+        for listener in getattr(self, '_book_listeners', []):
+            try:
+                listener(event, books, version)
+            except Exception as e:
+                logger.warning('⚠️  Book listener failed: %s', e)
+
+    def get_available_books(self):
+        """Get only available books"""
+        return [book for book in self.get_all_books()
+                if book.get('status', '').lower() == 'available'
+                and book.get('stock_quantity', 0) > 0]
+
+    def decrease_book_stock(self, book_id, quantity=1):
+        """Decrease book stock"""
+        return self.decrease_books_stock([(book_id, quantity)])
+
+    def get_user_orders(self, user_email):
+        """Get orders by user email, newest first"""
+        return self.get_user_orders_page(user_email)[0]
+
+    def add_order(self, order_data):
+        """Add a new order"""
+        return self.add_orders([order_data])
+
+    def place_orders(self, orders):
+        """Record a checkout: reserve stock, then append the orders.
+
+        Stock is reserved first so two buyers can't both get the last copy;
+        if the orders can't be saved the reservation is rolled back.
+        Returns `(placed, failed)` where `failed` is a list of
+        (order, reason) pairs.
+        """
+        reserved, failures = self.reserve_stock(
+            [(o.get('book_id'), o.get('quantity', 1)) for o in orders])
+
+        placed = [o for o in orders if str(o.get('book_id')).strip() in reserved]
+        failed = [(o, failures.get(str(o.get('book_id')).strip(), 'could not be reserved'))
+                  for o in orders if str(o.get('book_id')).strip() not in reserved]
+
+        if placed and not self.add_orders(placed):
+            if not self.release_stock(reserved):
+                logger.warning('⚠️  Failed to roll back stock reservation')
+            failed.extend((o, 'could not be saved') for o in placed)
+            placed = []
+
+        return placed, failed
+
+    def add_book(self, book):
+        """List a single book; returns it with its new id, or None"""
+        return book if self.add_books([book]) else None
+
+    def _sum_quantities(self, items):
+        """Merge (book_id, quantity) pairs into a book id -> quantity dict"""
+        if isinstance(items, dict):
+            items = items.items()
+        wanted = {}
+        for book_id, quantity in items:
+            book_id = str(book_id).strip()
+            wanted[book_id] = wanted.get(book_id, 0) + int(quantity)
+        return wanted
@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+class UserProfileIndex:
+    """User profiles keyed by email, with the users sheet row of each.
+
+    Lets `get_user_info` answer from memory and `save_user_info` overwrite
+    exactly one row range instead of downloading the users sheet to find
+    it. Reloaded from the sheet after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.profiles = {}
+        self.rows = {}
+        self.loaded_at = None
+        self.lock = threading.RLock()
+
+    def is_fresh(self):
+        if self.loaded_at is None:
+            return False
+        return (time.monotonic() - self.loaded_at) < self.ttl
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def load(self, entries):
+        """Replace the index from (profile, row) pairs"""
+        with self.lock:
+            self.profiles = {}
+            self.rows = {}
+            for profile, row_index in entries:
+                self.put(profile, row_index)
+            self.loaded_at = time.monotonic()
+
+    def get(self, email):
+        return self.profiles.get(email)
+
+    def entries(self):
+        """(profile, row) pairs, as taken by `load`"""
+        with self.lock:
+            return [(profile, self.rows.get(email)) for email, profile in self.profiles.items()]
+
+    def row_of(self, email):
+        return self.rows.get(email)
+
+    def put(self, profile, row_index=None):
+        """Store a profile; keeps the known row when `row_index` is None"""
+        email = profile.get('email')
+        if not email:
+            return
+        with self.lock:
+            self.profiles[email] = profile
+            if row_index:
+                self.rows[email] = row_index
@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_queue_kind_key ON queue (kind, key);
+"""
+
+
+class TokenBucket:
+    """Simple rate limiter: `rate` tokens per `per` seconds, bursts of up to `burst` (default `rate`)"""
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.fill_rate = float(rate) / per
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens=1, timeout=None):
+        """Block until `tokens` are available; False if that takes over `timeout` seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.fill_rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class WriteBehindQueue:
+    """Durable queue of pending Sheets mutations, flushed in the background.
+
+    Entries live in a small SQLite file so they survive restarts and can be
+    shared by several workers; a worker claims a batch before flushing it,
+    so each entry is written once. Entries enqueued with a `key` are
+    coalesced: a newer payload for the same (kind, key) is merged into the
+    pending one instead of adding another write.
+
+    `handlers` maps each kind to a function taking a list of payloads and
+    writing them in one go; raising or returning False counts as a failed
+    flush and the batch is retried with jittered exponential backoff.
+    `locks` maps a kind to a function returning a context manager for a
+    batch's payloads, held while the batch is written and dequeued, so
+    readers holding the same locks see each entry either pending or
+    written, never both.
+    """
+
+    def __init__(self, path, handlers, ready=None, flush_interval=1.0,
+                 batch_size=200, writes_per_minute=60, locks=None):
+        self.path = path
+        self.handlers = handlers
+        self.locks = locks or {}
+        self.ready = ready or (lambda: True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(writes_per_minute, per=60.0)
+        self.worker_id = f"{os.getpid()}-{id(self)}"
+        self.claim_timeout = 120
+        self.max_backoff = 300
+
+        self.flushed = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_flush_at = None
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._conn().executescript(SCHEMA)
+        self._start_worker()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind, payload, key=None, add=()):
+        """Queue a mutation; merges into a pending entry with the same key.
+
+        Fields named in `add` are summed with the pending entry's instead
+        of replacing them.
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = None
+            if key is not None:
+                row = conn.execute(
+                    'SELECT id, payload FROM queue WHERE kind = ? AND key = ? AND claimed_by IS NULL '
+                    'ORDER BY id DESC LIMIT 1', (kind, str(key))).fetchone()
+            if row:
+                merged = json.loads(row[1])
+                for field in add:
+                    if field in merged and field in payload:
+                        payload = dict(payload, **{field: merged[field] + payload[field]})
+                merged.update(payload)
+                conn.execute('UPDATE queue SET payload = ? WHERE id = ?', (json.dumps(merged), row[0]))
+            else:
+                conn.execute('INSERT INTO queue (kind, key, payload, created_at) VALUES (?, ?, ?, ?)',
+                             (kind, None if key is None else str(key), json.dumps(payload), time.time()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._wakeup.set()
+
+    def pending(self, kind):
+        """Payloads of `kind` not yet written, oldest first"""
+        rows = self._conn().execute('SELECT payload FROM queue WHERE kind = ? ORDER BY id',
+                                    (kind,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _claim(self):
+        """Claim the next batch; skips keys with an older entry still in flight"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE queue SET claimed_by = NULL, claimed_at = NULL '
+                         'WHERE claimed_by IS NOT NULL AND claimed_at < ?', (now - self.claim_timeout,))
+            rows = conn.execute(
+                'SELECT id, kind, payload FROM queue q WHERE claimed_by IS NULL '
+                'AND NOT EXISTS (SELECT 1 FROM queue o WHERE o.kind = q.kind AND o.key = q.key '
+                'AND o.id < q.id AND o.claimed_by IS NOT NULL) '
+                'ORDER BY id LIMIT ?', (self.batch_size,)).fetchall()
+            if rows:
+                conn.executemany('UPDATE queue SET claimed_by = ?, claimed_at = ? WHERE id = ?',
+                                 [(self.worker_id, now, row[0]) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def flush(self):
+        """Write one claimed batch; returns False if any kind failed"""
+        rows = self._claim()
+        if not rows:
+            return True
+
+        batches = {}
+        for row_id, kind, payload in rows:
+            batches.setdefault(kind, []).append((row_id, json.loads(payload)))
+
+        conn = self._conn()
+        ok = True
+        for kind, entries in batches.items():
+            ids = [(row_id,) for row_id, _ in entries]
+            payloads = [payload for _, payload in entries]
+            handler = self.handlers.get(kind)
+            try:
+                if handler is None:
+                    raise ValueError(f"no handler for '{kind}'")
+                self.bucket.take()
+                with self.locks.get(kind, lambda payloads: nullcontext())(payloads):
+                    if handler(payloads) is False:
+                        raise RuntimeError(f"{kind} flush returned False")
+                    conn.executemany('DELETE FROM queue WHERE id = ?', ids)
+            except Exception as e:
+                ok = False
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning('⚠️  Write-behind flush failed for %s: %s', kind, e)
+                conn.executemany('UPDATE queue SET claimed_by = NULL, claimed_at = NULL, '
+                                 'attempts = attempts + 1 WHERE id = ?', ids)
+                continue
+
+            self.flushed += len(entries)
+            self.last_flush_at = time.time()
+        return ok
+
+    def _start_worker(self):
+        def worker():
+            failures_in_a_row = 0
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                # Give writes arriving together a moment to coalesce
+                time.sleep(min(0.2, self.flush_interval))
+                if not self.ready():
+                    continue
+                try:
+                    ok = self.flush()
+                except Exception as e:
+                    ok = False
+                    self.last_error = str(e)
+                    logger.error('❌ Write-behind worker error: %s', e)
+
+                if ok:
+                    failures_in_a_row = 0
+                    if self.depth():
+                        self._wakeup.set()
+                else:
+                    failures_in_a_row += 1
+                    backoff = min(self.max_backoff, 2 ** failures_in_a_row)
+                    time.sleep(random.uniform(backoff / 2, backoff))
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    def depth(self):
+        return self._conn().execute('SELECT count(*) FROM queue').fetchone()[0]
+
+    def stats(self):
+        conn = self._conn()
+        depth, oldest = conn.execute('SELECT count(*), min(created_at) FROM queue').fetchone()
+        return {
+            'depth': depth,
+            'flush_lag_seconds': round(time.time() - oldest, 2) if oldest else 0.0,
+            'flushed': self.flushed,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_flush_at': self.last_flush_at
+        }